@@ -0,0 +1,220 @@
+"""
+Text-only ALFWorld-style household env for testing the "alfworld" trajectory format
+without the ALFWorld / TextWorld stack. Each idx is a seeded random room (receptacles,
+objects, one pick-and-place task: put / clean / heat / cool) driven by ALFWorld commands
+("go to cabinet 1", "open fridge 1", "take apple 1 from countertop 1", "clean apple 1 with
+sinkbasin 1", "put apple 1 in/on diningtable 1", "think: ...") with ALFWorld-like messages.
+"""
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import gym
+
+from wikienv import textSpace
+
+# receptacle type -> (max count, openable)
+RECEPTACLES = {
+    "cabinet": (8, True),
+    "drawer": (5, True),
+    "countertop": (2, False),
+    "shelf": (3, False),
+    "diningtable": (1, False),
+    "sidetable": (1, False),
+    "garbagecan": (1, False),
+    "sinkbasin": (1, False),
+    "fridge": (1, True),
+    "microwave": (1, True),
+    "stoveburner": (2, False),
+}
+OBJECTS = [
+    "apple", "bread", "butterknife", "cup", "dishsponge", "egg", "fork", "kettle", "knife", "ladle", "lettuce", "mug",
+    "pan", "peppershaker", "plate", "pot", "potato", "saltshaker", "spatula", "spoon", "tomato", "soapbottle",
+    "spraybottle", "soapbar", "cloth", "book", "candle", "keychain", "pen", "pencil",
+]
+# task type -> (required object state, appliance, prompt key stem in prompts/alfworld.json)
+TASKS = {
+    "put": (None, None, "put"),
+    "clean": ("clean", "sinkbasin", "clean"),
+    "heat": ("hot", "microwave", "heat"),
+    "cool": ("cool", "fridge", "cool"),
+}
+_TASK_TEXT = {"put": "put some {o} on {r}.", "clean": "put a clean {o} in {r}.", "heat": "put a hot {o} in {r}.", "cool": "put a cool {o} in {r}."}
+_VERBS = ("clean", "heat", "cool")
+NOTHING = "Nothing happens."
+
+
+def _listing(objs: List[str]) -> str:
+    if not objs:
+        return "nothing"
+    items = [f"a {o}" for o in objs]
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + f", and {items[-1]}"
+
+
+class AlfworldTextEnv(gym.Env):
+    def __init__(self, n_games: int = 1000, seed: int = 0) -> None:
+        super().__init__()
+        self.n_games = n_games
+        self.seed_base = seed
+        self.observation_space = self.action_space = textSpace()
+        self.data_idx = 0
+        self._new_game(0)
+
+    def __len__(self) -> int:
+        return self.n_games
+
+    def _new_game(self, idx: int) -> None:
+        rng = random.Random(self.seed_base * 1_000_003 + idx)
+        self.receptacles: List[str] = []
+        self.openable: Set[str] = set()
+        for rtype, (max_n, openable) in RECEPTACLES.items():
+            n = max_n if max_n == 1 else rng.randint(1, max_n)
+            for i in range(n, 0, -1):
+                name = f"{rtype} {i}"
+                self.receptacles.append(name)
+                if openable:
+                    self.openable.add(name)
+        self.contents: Dict[str, List[str]] = {r: [] for r in self.receptacles}
+        holders = [r for r in self.receptacles if not r.startswith(("sinkbasin", "microwave", "garbagecan"))]
+        counts: Dict[str, int] = {}
+        surfaces = [r for r in holders if r.startswith(("countertop", "diningtable", "sidetable"))]
+        for _ in range(rng.randint(30, 60)):  # cluttered tables make for verbose observations, as in ALFWorld
+            otype = rng.choice(OBJECTS)
+            counts[otype] = counts.get(otype, 0) + 1
+            where = rng.choice(surfaces if rng.random() < 0.5 else holders)
+            self.contents[where].append(f"{otype} {counts[otype]}")
+        self.task_type = rng.choice(sorted(TASKS))
+        target_obj = rng.choice(sorted(counts))
+        targets = sorted({r.split()[0] for r in holders if not r.startswith("fridge")})
+        self.target = (target_obj, rng.choice(targets))
+        self.task = "Your task is to: " + _TASK_TEXT[self.task_type].format(o=self.target[0], r=self.target[1])
+        self.opened: Set[str] = set()
+        self.location: Optional[str] = None
+        self.holding: Optional[str] = None
+        self.states: Dict[str, Set[str]] = {}
+        self.steps = 0
+        self.won = False
+
+    def _intro(self) -> str:
+        return (
+            f"You are in the middle of a room. Looking quickly around you, you see {_listing(self.receptacles)}.\n"
+            f"{self.task}"
+        )
+
+    def reset(self, seed: Optional[int] = None, return_info: bool = False, options: Optional[Dict] = None, idx: Optional[int] = None) -> Any:
+        self.data_idx = random.randrange(self.n_games) if idx is None else idx
+        self._new_game(self.data_idx)
+        obs = self._intro()
+        return (obs, self._get_info()) if return_info else obs
+
+    def _get_info(self) -> Dict[str, Any]:
+        return {"steps": self.steps, "won": self.won, "task": self.task, "task_type": self.task_type, "game_idx": self.data_idx}
+
+    def _accessible(self, r: str) -> bool:
+        return self.location == r and (r not in self.openable or r in self.opened)
+
+    def _describe(self, r: str) -> str:
+        if r in self.openable:
+            if r not in self.opened:
+                return f"The {r} is closed."
+            return f"The {r} is open. In it, you see {_listing(self.contents[r])}."
+        return f"On the {r}, you see {_listing(self.contents[r])}."
+
+    def _act(self, action: str) -> str:
+        words = action.split()
+        if action.startswith("think:"):
+            return "OK."
+        if action.startswith("go to "):
+            r = action[len("go to ") :]
+            if r not in self.contents:
+                return NOTHING
+            self.location = r
+            return self._describe(r)
+        if words[:1] in (["open"], ["close"]):
+            r = action.split(" ", 1)[1] if len(words) > 1 else ""
+            if self.location != r or r not in self.openable:
+                return NOTHING
+            if words[0] == "open":
+                self.opened.add(r)
+                return f"You open the {r}. " + self._describe(r)
+            self.opened.discard(r)
+            return f"You close the {r}."
+        if words[:1] == ["take"] and " from " in action:
+            obj, r = action[len("take ") :].split(" from ", 1)
+            if self.holding or not self._accessible(r) or obj not in self.contents[r]:
+                return NOTHING
+            self.contents[r].remove(obj)
+            self.holding = obj
+            return f"You pick up the {obj} from the {r}."
+        if words[:1] == ["put"] and " in/on " in action:
+            obj, r = action[len("put ") :].split(" in/on ", 1)
+            if self.holding != obj or not self._accessible(r):
+                return NOTHING
+            self.contents[r].append(obj)
+            self.holding = None
+            self._check_goal(obj, r)
+            return f"You put the {obj} in/on the {r}."
+        if words[:1] and words[0] in _VERBS and " with " in action:
+            verb = words[0]
+            obj, r = action[len(verb) + 1 :].split(" with ", 1)
+            state, appliance, _ = TASKS[verb]
+            if self.holding != obj or self.location != r or not r.startswith(appliance):
+                return NOTHING
+            self.states.setdefault(obj, set()).add(state)
+            return f"You {verb} the {obj} using the {r}."
+        if action == "inventory":
+            return f"You are carrying: a {self.holding}." if self.holding else "You are not carrying anything."
+        if action == "look":
+            if self.location is None:
+                return self._intro().split("\n")[0]
+            return f"You are facing the {self.location}. Next to it, you see nothing."
+        if words[:1] == ["examine"]:
+            r = action[len("examine ") :]
+            return self._describe(r) if self.location == r else NOTHING
+        return NOTHING
+
+    def _check_goal(self, obj: str, r: str) -> None:
+        state = TASKS[self.task_type][0]
+        if obj.split()[0] == self.target[0] and r.split()[0] == self.target[1]:
+            if state is None or state in self.states.get(obj, set()):
+                self.won = True
+
+    def step(self, action: str) -> Tuple[str, float, bool, Dict[str, Any]]:
+        action = action.strip()
+        if action.startswith(">"):
+            action = action[1:].strip()
+        self.steps += 1
+        obs = self._act(action)
+        reward = 1.0 if self.won else 0.0
+        return obs, reward, self.won, self._get_info()
+
+    def solution(self) -> List[str]:
+        """A winning command sequence for the current game (for tests and demos)."""
+        obj_type, target_type = self.target
+        state, appliance, _ = TASKS[self.task_type]
+        src, obj = next((r, o) for r in self.receptacles for o in self.contents[r] if o.split()[0] == obj_type)
+        cmds = [f"go to {src}"] + ([f"open {src}"] if src in self.openable else []) + [f"take {obj} from {src}"]
+        if appliance:
+            app = next(r for r in self.receptacles if r.startswith(appliance))
+            cmds += [f"go to {app}", f"{self.task_type} {obj} with {app}"]
+        dst = next(r for r in self.receptacles if r.split()[0] == target_type)
+        cmds += [f"go to {dst}"] + ([f"open {dst}"] if dst in self.openable else []) + [f"put {obj} in/on {dst}"]
+        return cmds
+
+    def prompt_key(self, n: int = 0) -> str:
+        """Few-shot key in prompts/alfworld.json for the current task type."""
+        return f"react_{TASKS[self.task_type][2]}_{n}"
+
+
+def few_shot_instruction(task_type: str, prompt_file: str = "alfworld.json") -> str:
+    """ReAct ALFWorld instruction with the two few-shot examples for task_type."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", prompt_file)) as f:
+        prompts = json.load(f)
+    stem = TASKS[task_type][2]
+    return (
+        "Interact with a household to solve a task. Here are two examples.\n"
+        + prompts[f"react_{stem}_1"]
+        + prompts[f"react_{stem}_0"]
+        + "\nHere is the task.\n"
+    )
@@ -0,0 +1,92 @@
+"""
+Record/replay cassette for WikiEnv search results, so benchmark runs see identical
+observations without touching the network. File format: gzip JSONL, one
+{"q": entity, "r": [kind, payload]} record per searched entity.
+"""
+import gzip
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in strict replay when a search is not on the cassette."""
+
+
+class Cassette:
+    """
+    - mode="record": look up nothing, append every new search result to path.
+    - mode="replay": serve results from path; on a miss either raise (on_miss="error")
+      or let the env fetch live (on_miss="live").
+    """
+
+    def __init__(self, path: str, mode: str = "replay", on_miss: str = "error") -> None:
+        assert mode in ["record", "replay"]
+        assert on_miss in ["error", "live"]
+        self.path = path
+        self.mode = mode
+        self.on_miss = on_miss
+        self.entries: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self._file = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self.entries = self.load(path)
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+        if mode == "record":
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._file = gzip.open(path, "at", encoding="utf-8")
+
+    @staticmethod
+    def load(path: str) -> Dict[str, Any]:
+        entries = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        entries[rec["q"]] = rec["r"]
+            except (EOFError, json.JSONDecodeError):
+                pass  # truncated tail from an interrupted recording
+        return entries
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def get(self, entity: str) -> Optional[Any]:
+        """Replay lookup. Returns None on a miss when on_miss="live"; raises otherwise."""
+        result = self.entries.get(entity)
+        with self._lock:  # shared by --workers threads and run_matrix arms
+            if result is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result is not None:
+            return result
+        if self.on_miss == "error":
+            raise CassetteMissError(f"Cassette miss for search[{entity}] in {self.path}")
+        return None
+
+    def record(self, entity: str, result: Any) -> None:
+        with self._lock:
+            if self._file is None or entity in self.entries:
+                return
+            self.entries[entity] = result
+            self._file.write(json.dumps({"q": entity, "r": result}, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "entries": len(self.entries), "hits": self.hits, "misses": self.misses}
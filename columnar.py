@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Columnar trajectory store for cross-run analytics.
+One row per ReAct step (episode, step, action type, prompt chars before / after
+tokenization, observation chars, LLM / env latency, reward) plus one row per episode;
+thought/action/observation text lives in a shared, deduplicated string heap referenced by id.
+Saved as uncompressed .npz; to_arrow() hands the step table to pyarrow when it is installed.
+Usage:
+  python columnar.py export trajs/ steps.npz
+  python columnar.py summary steps.npz
+"""
+import argparse
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ACTION_TYPES = ["other", "search", "lookup", "finish", "think"]
+_ACTION_CODE = {name: code for code, name in enumerate(ACTION_TYPES)}
+
+STEP_COLUMNS = {
+    "episode": np.int32,
+    "step": np.int16,
+    "action_type": np.int8,
+    "prompt_chars": np.int32,
+    "context_chars": np.int32,
+    "obs_chars": np.int32,
+    "llm_time": np.float32,
+    "env_time": np.float32,
+    "reward": np.float32,
+    "thought_id": np.int32,
+    "action_id": np.int32,
+    "obs_id": np.int32,
+}
+EPISODE_COLUMNS = {
+    "episode": np.int32,
+    "question_idx": np.int32,
+    "n_steps": np.int16,
+    "em": np.float32,
+    "f1": np.float32,
+}
+
+
+def action_type(action: str) -> int:
+    return _ACTION_CODE.get(action.split("[", 1)[0].strip().lower(), 0)
+
+
+class StringHeap:
+    """Deduplicated strings stored as one UTF-8 byte array plus offsets."""
+
+    def __init__(self, data: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None) -> None:
+        self._ids: Dict[str, int] = {}
+        self._chunks: List[bytes] = []
+        self.data = data if data is not None else np.zeros(0, dtype=np.uint8)
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+
+    def add(self, s: str) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = self._ids[s] = len(self._ids)
+            self._chunks.append(s.encode("utf-8"))
+        return sid
+
+    def freeze(self) -> None:
+        lengths = np.fromiter((len(c) for c in self._chunks), dtype=np.int64, count=len(self._chunks))
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.data = np.frombuffer(b"".join(self._chunks), dtype=np.uint8)
+        self._chunks = []
+
+    def __getitem__(self, sid: int) -> str:
+        return self.data[self.offsets[sid] : self.offsets[sid + 1]].tobytes().decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class ColumnarStore:
+    def __init__(self, steps: Dict[str, np.ndarray], episodes: Dict[str, np.ndarray], heap: StringHeap) -> None:
+        self.steps = steps
+        self.episodes = episodes
+        self.heap = heap
+
+    def __len__(self) -> int:
+        return len(self.steps["episode"])
+
+    @classmethod
+    def from_episodes(cls, episodes: Iterable[Dict[str, Any]]) -> "ColumnarStore":
+        """
+        Build from run_react infos (with "step_log") or LoggingWrapper records
+        (observations/actions only; tokenization and latency columns are then -1).
+        """
+        heap = StringHeap()
+        steps: Dict[str, List] = {k: [] for k in STEP_COLUMNS}
+        eps: Dict[str, List] = {k: [] for k in EPISODE_COLUMNS}
+        for ep, info in enumerate(episodes):
+            step_log = info.get("step_log")
+            if step_log is None:
+                obs_list = info.get("observations", [])[1:]
+                step_log = [
+                    {"step": i, "thought": "", "action": str(a), "obs": str(o)}
+                    for i, (a, o) in enumerate(zip(info.get("actions", []), obs_list), 1)
+                ]
+            for s in step_log:
+                steps["episode"].append(ep)
+                steps["step"].append(s["step"])
+                steps["action_type"].append(action_type(s["action"]))
+                steps["prompt_chars"].append(s.get("prompt_chars", -1))
+                steps["context_chars"].append(s.get("context_chars", -1))
+                steps["obs_chars"].append(len(s["obs"]))
+                steps["llm_time"].append(s.get("llm_time", -1.0))
+                steps["env_time"].append(s.get("env_time", -1.0))
+                steps["reward"].append(s.get("reward", 0.0))
+                steps["thought_id"].append(heap.add(s.get("thought", "")))
+                steps["action_id"].append(heap.add(s["action"]))
+                steps["obs_id"].append(heap.add(s["obs"]))
+            eps["episode"].append(ep)
+            eps["question_idx"].append(info.get("question_idx", -1))
+            eps["n_steps"].append(len(step_log))
+            eps["em"].append(float(info.get("em", 0) or 0))
+            eps["f1"].append(float(info.get("f1", 0.0) or 0.0))
+        heap.freeze()
+        return cls(
+            {k: np.asarray(v, dtype=STEP_COLUMNS[k]) for k, v in steps.items()},
+            {k: np.asarray(v, dtype=EPISODE_COLUMNS[k]) for k, v in eps.items()},
+            heap,
+        )
+
+    def save(self, path: str) -> None:
+        """Write steps, episodes and the string heap to one .npz that load() reads back unchanged."""
+        if not path.endswith(".npz"):
+            raise ValueError(f"Columnar stores are saved as .npz, got {path}")
+        arrays = {f"step.{k}": v for k, v in self.steps.items()}
+        arrays.update({f"episode.{k}": v for k, v in self.episodes.items()})
+        np.savez(path, heap_data=self.heap.data, heap_offsets=self.heap.offsets, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnarStore":
+        with np.load(path) as z:
+            steps = {k[len("step."):]: z[k] for k in z.files if k.startswith("step.")}
+            eps = {k[len("episode."):]: z[k] for k in z.files if k.startswith("episode.")}
+            heap = StringHeap(z["heap_data"], z["heap_offsets"])
+        return cls(steps, eps, heap)
+
+    def to_arrow(self):
+        """Step table as a pyarrow Table with text columns resolved (per-episode metrics joined)."""
+        if pyarrow is None:
+            raise ValueError("pyarrow is not installed")
+        cols = dict(self.steps)
+        for k in ("em", "f1"):
+            cols[k] = self.episodes[k][self.steps["episode"]]
+        return pyarrow.table(cols)
+
+    def text(self, column: str, row: int) -> str:
+        """Text of step row for column "thought", "action" or "obs"."""
+        return self.heap[int(self.steps[f"{column}_id"][row])]
+
+    def compression_by_step(self) -> Dict[str, np.ndarray]:
+        """Mean context_chars / prompt_chars per step index (steps with tokenization stats only)."""
+        s = self.steps
+        mask = s["prompt_chars"] > 0
+        step = s["step"][mask].astype(np.int64)
+        ratio = s["context_chars"][mask] / s["prompt_chars"][mask]
+        n = np.bincount(step)
+        total = np.bincount(step, weights=ratio, minlength=len(n))
+        idx = np.flatnonzero(n)
+        return {"step": idx, "n": n[idx], "ratio": total[idx] / n[idx]}
+
+    def em_by_length(self) -> Dict[str, np.ndarray]:
+        """Mean EM per trajectory length (number of steps)."""
+        length = self.episodes["n_steps"].astype(np.int64)
+        n = np.bincount(length)
+        total = np.bincount(length, weights=self.episodes["em"], minlength=len(n))
+        idx = np.flatnonzero(n)
+        return {"n_steps": idx, "n": n[idx], "em": total[idx] / n[idx]}
+
+
+def main():
+    from trajlog import iter_records
+
+    parser = argparse.ArgumentParser(description="Columnar trajectory store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_export = sub.add_parser("export", help="Convert trajectory logs into a columnar file")
+    p_export.add_argument("logs", help="Log file, folder or glob pattern")
+    p_export.add_argument("out", help="Output .npz")
+    p_summary = sub.add_parser("summary", help="Print compression ratio by step and EM by length")
+    p_summary.add_argument("path")
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        store = ColumnarStore.from_episodes(iter_records(args.logs))
+        store.save(args.out)
+        print(f"Wrote {len(store)} steps / {len(store.episodes['episode'])} episodes to {args.out}")
+        return
+    t0 = time.time()
+    store = ColumnarStore.load(args.path)
+    comp = store.compression_by_step()
+    em = store.em_by_length()
+    print(f"{len(store)} steps, {len(store.episodes['episode'])} episodes (aggregated in {time.time() - t0:.2f}s)")
+    print("%6s %10s %10s" % ("step", "n", "ctx/full"))
+    for row in zip(comp["step"], comp["n"], comp["ratio"]):
+        print("%6d %10d %10.3f" % row)
+    print("%6s %10s %10s" % ("len", "n", "EM"))
+    for row in zip(em["n_steps"], em["n"], em["em"]):
+        print("%6d %10d %10.4f" % row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Lazy, memory-mapped access to dataset splits (HotpotQA .json, FEVER .jsonl).
+The first load parses the data file once and writes a compact columnar index next
+to it (<data_file>.idx): a header, the field names, a uint64 offset table and a
+UTF-8 string heap holding only the requested fields. Later loads just mmap that file,
+so startup is near-instant and worker processes share the same read-only pages. Within
+a process, loads of an unchanged file return the same IndexedDataset.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from profiling import profiled
+
+MAGIC = b"TTIDX002"
+# magic, n_rows, n_fields, source size, source mtime_ns, size of the JSON field-name list that follows
+HEADER = struct.Struct("<8sQQQQQ")
+
+
+def index_path(data_file: str) -> str:
+    return data_file + ".idx"
+
+
+def iter_rows(data_file: str) -> Iterator[dict]:
+    """Yield raw examples from a JSON array (.json) or JSON-lines (.jsonl) file."""
+    with open(data_file) as f:
+        if data_file.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def build_index(data_file: str, fields: Sequence[str]) -> bytes:
+    """Parse data_file once and return the index bytes for the given fields."""
+    st = os.stat(data_file)
+    offsets: List[int] = [0]
+    heap = bytearray()
+    n_rows = 0
+    for row in iter_rows(data_file):
+        for field in fields:
+            heap += str(row[field]).encode("utf-8")
+            offsets.append(len(heap))
+        n_rows += 1
+    names = json.dumps(list(fields)).encode("utf-8")
+    header = HEADER.pack(MAGIC, n_rows, len(fields), st.st_size, st.st_mtime_ns, len(names))
+    return header + names + struct.pack(f"<{len(offsets)}Q", *offsets) + bytes(heap)
+
+
+def _is_fresh(buf, data_file: str, fields: Sequence[str]) -> bool:
+    if len(buf) < HEADER.size:
+        return False
+    magic, _, nf, size, mtime_ns, names_size = HEADER.unpack_from(buf, 0)
+    st = os.stat(data_file)
+    if magic != MAGIC or nf != len(fields) or size != st.st_size or mtime_ns != st.st_mtime_ns:
+        return False
+    return json.loads(bytes(buf[HEADER.size : HEADER.size + names_size])) == list(fields)
+
+
+class IndexedDataset(Sequence):
+    """Read-only sequence of field tuples backed by an index buffer (mmap or bytes)."""
+
+    def __init__(self, buf) -> None:
+        self._buf = buf
+        _, self.n_rows, self.n_fields, _, _, names_size = HEADER.unpack_from(buf, 0)
+        self.fields: Tuple[str, ...] = tuple(json.loads(bytes(buf[HEADER.size : HEADER.size + names_size])))
+        self._offsets_start = HEADER.size + names_size
+        self._heap_start = self._offsets_start + 8 * (self.n_rows * self.n_fields + 1)
+        self._row = struct.Struct(f"<{self.n_fields + 1}Q")
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __getitem__(self, idx: int) -> Tuple[str, ...]:
+        if idx < 0:
+            idx += self.n_rows
+        if not 0 <= idx < self.n_rows:
+            raise IndexError(f"index {idx} out of range for {self.n_rows} examples")
+        offs = self._row.unpack_from(self._buf, self._offsets_start + 8 * idx * self.n_fields)
+        h = self._heap_start
+        return tuple(bytes(self._buf[h + a : h + b]).decode("utf-8") for a, b in zip(offs, offs[1:]))
+
+    def close(self) -> None:
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+
+_loaded: Dict[Tuple[str, Tuple[str, ...], int, int], IndexedDataset] = {}
+_loaded_lock = threading.Lock()
+
+
+@profiled("dataset_load")
+def load_dataset(data_file: str, fields: Sequence[str]) -> IndexedDataset:
+    """
+    Return an IndexedDataset of fields for data_file, building <data_file>.idx if it is
+    missing or stale. Falls back to an in-memory index if the data folder is read-only.
+    """
+    st = os.stat(data_file)
+    key = (os.path.abspath(data_file), tuple(fields), st.st_size, st.st_mtime_ns)
+    with _loaded_lock:
+        data = _loaded.get(key)
+        if data is None:
+            for old in [k for k in _loaded if k[:2] == key[:2]]:
+                del _loaded[old]  # superseded by a newer file; the old mapping closes once unreferenced
+            data = _loaded[key] = _load_dataset(data_file, fields)
+        return data
+
+
+def _load_dataset(data_file: str, fields: Sequence[str]) -> IndexedDataset:
+    path = index_path(data_file)
+    if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if _is_fresh(buf, data_file, fields):
+            return IndexedDataset(buf)
+        buf.close()
+    data = build_index(data_file, fields)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        return IndexedDataset(data)
+    with open(path, "rb") as f:
+        return IndexedDataset(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,164 @@
+"""
+Per-call deadlines and hedged requests for blocking calls (LLM completions, Wikipedia
+searches). HedgedCaller runs each call on a daemon thread and stops waiting for it at the
+deadline (DeadlineExceeded); the abandoned attempt is left to its transport timeout, and its
+result is discarded. With hedging, a call still running after the recent p<hedge_percentile>
+latency gets one duplicate attempt and the first success wins; duplicates are capped at
+max_extra of all calls so a slow backend is not hit with double load.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """A call did not finish before its deadline."""
+
+
+def percentile(values: List[float], p: float) -> float:
+    v = sorted(values)
+    return v[min(len(v) - 1, int(p / 100 * len(v)))] if v else 0.0
+
+
+class HedgedCaller:
+    """
+    - timeout: deadline per call in seconds, covering every attempt (None = wait forever).
+    - hedge: send a duplicate attempt once a call outlives the hedge delay.
+    - hedge_percentile: hedge delay = this percentile of the last `window` successful calls
+      (no hedging until min_samples calls have succeeded), never below hedge_min_delay.
+    - max_extra: cap on hedges as a fraction of calls (0.1 = at most 10% extra load).
+    Thread-safe; pickles as its settings (fresh stats) for process workers.
+    """
+
+    def __init__(
+        self,
+        name: str = "call",
+        timeout: Optional[float] = None,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 0.01,
+        max_extra: float = 0.1,
+        min_samples: int = 20,
+        window: int = 500,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.window = window
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=100_000)
+        self._lock = threading.Lock()
+        self.calls = self.errors = self.timeouts = self.hedges = self.hedge_wins = 0
+
+    def __reduce__(self):
+        return (
+            HedgedCaller,
+            (self.name, self.timeout, self.hedge, self.hedge_percentile, self.hedge_min_delay,
+             self.max_extra, self.min_samples, self.window),
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging the next call, or None while there is too little history."""
+        with self._lock:
+            if len(self._recent) < self.min_samples:
+                return None
+            recent = list(self._recent)
+        return max(self.hedge_min_delay, percentile(recent, self.hedge_percentile))
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_extra * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    @staticmethod
+    def _start(fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any], results: "queue.SimpleQueue", attempt: int) -> None:
+        def run() -> None:
+            try:
+                results.put((attempt, True, fn(*args, **kwargs)))
+            except BaseException as e:  # handed to the caller, never raised on this thread
+                results.put((attempt, False, e))
+
+        threading.Thread(target=run, name=f"hedged-{attempt}", daemon=True).start()
+
+    def __call__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """fn(*args, **kwargs) under the deadline / hedging policy."""
+        with self._lock:
+            self.calls += 1
+        t0 = time.perf_counter()
+        deadline = t0 + self.timeout if self.timeout else None
+        hedge_at = None
+        if self.hedge:
+            delay = self.hedge_delay()
+            hedge_at = t0 + delay if delay is not None else None
+        results: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._start(fn, args, kwargs, results, 0)
+        running = 1
+        while True:
+            wake = min((t for t in (deadline, hedge_at) if t is not None), default=None)
+            try:
+                attempt, ok, value = results.get(timeout=None if wake is None else max(0.0, wake - time.perf_counter()))
+            except queue.Empty:
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise DeadlineExceeded(f"{self.name} call exceeded its {self.timeout:g}s deadline") from None
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None  # at most one duplicate per call
+                    if self._take_hedge():
+                        self._start(fn, args, kwargs, results, 1)
+                        running += 1
+                continue
+            running -= 1
+            if ok:
+                latency = time.perf_counter() - t0
+                with self._lock:
+                    self._recent.append(latency)
+                    self._latencies.append(latency)
+                    self.hedge_wins += attempt == 1
+                return value
+            if running == 0:
+                with self._lock:
+                    self.errors += 1
+                raise value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            out: Dict[str, Any] = {
+                "calls": self.calls, "errors": self.errors, "timeouts": self.timeouts,
+                "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+            }
+        for p in (50, 90, 99):
+            out[f"p{p}"] = percentile(latencies, p)
+        out["max"] = max(latencies, default=0.0)
+        return out
+
+    def summary(self) -> str:
+        s = self.stats()
+        line = (
+            f"{self.name}: {s['calls']} calls, p50 {s['p50']:.2f}s | p90 {s['p90']:.2f}s | p99 {s['p99']:.2f}s | "
+            f"max {s['max']:.2f}s, {s['timeouts']} timeouts, {s['errors']} errors"
+        )
+        if self.hedge:
+            line += f", {s['hedges']} hedged ({s['hedge_wins']} won)"
+        return line
+
+
+class Guarded:
+    """fn wrapped in a HedgedCaller, e.g. Guarded(partial(react_loop.llm, timeout=30), caller) as an llm_fn."""
+
+    def __init__(self, fn: Callable[..., Any], caller: HedgedCaller) -> None:
+        self.fn = fn
+        self.caller = caller
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.caller(self.fn, *args, **kwargs)
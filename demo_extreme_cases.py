@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 极端长轨迹对比：35k / 50k / 65k / 80k+ 上下文、多步数（阈值 32k）。
-对比「完整 ReAct」与「Trajectory Tokenization」的字数、结构与可读性。
+对比「完整 ReAct」与「Trajectory Tokenization」的字数、结构与可读性；
+另对比默认摘要格式与紧凑格式（fmt="react_compact"）在同一上限及更紧上限（12k）下的长度。
 """
 import os
 import sys
@@ -52,7 +53,8 @@ def build_long_trajectory(num_steps: int, thought_len: int = 120, obs_len: int =
     return "\n".join(parts)
 
 
-def run_extreme_case(name: str, num_steps: int, target_full_chars: int, max_raw_steps: int = 3, max_context_chars: int = 32000):
+def run_extreme_case(name: str, num_steps: int, target_full_chars: int, max_raw_steps: int = 3, max_context_chars: int = 32000,
+                     tight_chars: int = 12000):
     """生成接近 target_full_chars 字数的轨迹，然后做 full vs tokenized 对比。"""
     # 每步大约 40 + thought + obs，反推 thought_len 和 obs_len
     per_step = target_full_chars // num_steps
@@ -74,6 +76,15 @@ def run_extreme_case(name: str, num_steps: int, target_full_chars: int, max_raw_
         max_obs=100,
     )
 
+    # 紧凑格式与更紧上限：同样预算下能保留多少历史
+    lengths = {}
+    for fmt in ("react", "react_compact"):
+        for budget in (max_context_chars, tight_chars):
+            lengths[fmt, budget] = len(tokenize_trajectory(
+                full_prompt, instruction_prefix, max_raw_steps=max_raw_steps, max_total_chars=budget,
+                max_thought=60, max_obs=100, fmt=fmt,
+            ))
+
     n_full = count_steps_in_prompt(full_prompt)
     len_full = len(full_prompt)
     len_tok = len(tokenized)
@@ -87,6 +98,10 @@ def run_extreme_case(name: str, num_steps: int, target_full_chars: int, max_raw_
         "len_tok": len_tok,
         "saved": len_full - len_tok,
         "ratio": len_tok / len_full if len_full else 0,
+        "len_compact": lengths["react_compact", max_context_chars],
+        "tight_chars": tight_chars,
+        "len_tok_tight": lengths["react", tight_chars],
+        "len_compact_tight": lengths["react_compact", tight_chars],
         "full_prompt": full_prompt,
         "tokenized_prompt": tokenized,
         "over_threshold_full": len_full > max_context_chars,
@@ -133,6 +148,18 @@ def main():
             c["name"][:28], c["len_full"], c["len_tok"], c["saved"], (1 - c["ratio"]) * 100))
     print("=" * 72)
 
+    # 紧凑格式：同一上限下更短；12k 上限下默认格式会超限，紧凑格式仍能放下
+    print()
+    print("%-28s %10s %10s %8s %12s %12s" % ("Case", "Token", "Compact", "节省", "Token@12k", "Compact@12k"))
+    print("-" * 84)
+    for c in results:
+        print("%-28s %10d %10d %7.1f%% %11d%s %11d%s" % (
+            c["name"][:28], c["len_tok"], c["len_compact"], (1 - c["len_compact"] / c["len_tok"]) * 100,
+            c["len_tok_tight"], "!" if c["len_tok_tight"] > c["tight_chars"] else " ",
+            c["len_compact_tight"], "!" if c["len_compact_tight"] > c["tight_chars"] else " "))
+    print("(! = 超过上限)")
+    print("=" * 72)
+
     # 展示 50k case 的结构片段：完整版中间 vs 压缩版整体结构
     c50 = results[1]
     print()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Long-lived local evaluation worker. The daemon imports gym / bs4 / requests once, keeps
+datasets (dataset_index), prompts, a page cache and an LLM cache warm across jobs, and
+runs evaluation jobs submitted over a Unix socket; run_hotpotqa.py / run_fever.py with
+--daemon only parse their arguments and stream the job's output back.
+Protocol: one JSON request line ({"cmd": "run", "task", "argv"} | {"cmd": "stats"} |
+{"cmd": "stop"}), answered by {"stream": "stdout"|"stderr", "data"} lines and a final
+{"done": true, "exit", "result" | "error"} line.
+Usage:
+  python eval_daemon.py serve [--socket PATH] [--page_cache_mb 256]
+  python run_hotpotqa.py --daemon --max_examples 50 --tokenize
+  python eval_daemon.py run fever --max_examples 20
+  python eval_daemon.py stats | stop
+"""
+import argparse
+import contextvars
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+DEFAULT_SOCKET = os.environ.get("TRAJTOK_DAEMON_SOCKET") or os.path.join(
+    tempfile.gettempdir(), f"trajtok-eval-{os.getuid()}.sock"
+)
+TASKS = {"hotpotqa": "run_hotpotqa", "fever": "run_fever"}
+
+
+def daemon_arg(argv: List[str]) -> Tuple[Optional[str], List[str]]:
+    """Split --daemon [PATH] off a task script's argv. Returns (socket path or None, remaining argv)."""
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_SOCKET, default=None)
+    ns, rest = parser.parse_known_args(argv)
+    return ns.daemon, rest
+
+
+def request(
+    socket_path: str,
+    message: Dict[str, Any],
+    out: Optional[TextIO] = None,
+    err: Optional[TextIO] = None,
+) -> Dict[str, Any]:
+    """Send one request and relay streamed output to out / err. Returns the final reply."""
+    out = out or sys.stdout
+    err = err or sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        raise ConnectionError(f"No eval daemon on {socket_path}; start one with: python eval_daemon.py serve")
+    with sock, sock.makefile("rwb") as f:
+        f.write(json.dumps(message).encode("utf-8") + b"\n")
+        f.flush()
+        for line in f:
+            reply = json.loads(line)
+            if reply.get("done"):
+                return reply
+            (err if reply["stream"] == "stderr" else out).write(reply["data"])
+    raise ConnectionError("Eval daemon closed the connection before the job finished")
+
+
+def submit(socket_path: str, task: str, argv: List[str]) -> Any:
+    """Thin-client entry point for the task scripts: run the job remotely, exit non-zero on failure."""
+    reply = request(socket_path, {"cmd": "run", "task": task, "argv": list(argv)})
+    if reply["exit"]:
+        if reply.get("error"):
+            print(reply["error"], file=sys.stderr, end="")
+        sys.exit(reply["exit"])
+    return reply.get("result")
+
+
+class _ThreadOutput:
+    """
+    sys.stdout / sys.stderr stand-in that sends each job's output to its own sink. The sink is
+    a context variable, so executor.execute worker threads (which run in a copy of the submitting
+    context) write to the job that started them.
+    """
+
+    def __init__(self, default: TextIO) -> None:
+        self.default = default
+        self.sink: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("sink", default=None)
+
+    def write(self, s: str) -> int:
+        return (self.sink.get() or self.default).write(s)
+
+    def flush(self) -> None:
+        (self.sink.get() or self.default).flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.default, name)
+
+
+class _StreamSink:
+    def __init__(self, send, stream: str) -> None:
+        self.send = send
+        self.stream = stream
+
+    def write(self, s: str) -> int:
+        if s:
+            self.send({"stream": self.stream, "data": s})
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+class EvalDaemon:
+    """Warm state shared by all jobs plus the job runner."""
+
+    def __init__(self, page_cache_mb: int = 256, llm_cache: bool = True) -> None:
+        import importlib
+
+        import react_loop
+        from llm_cache import LLMCache
+        from page_store import PageStore
+
+        self.tasks = {name: importlib.import_module(module) for name, module in TASKS.items()}
+        self.page_store = PageStore(page_cache_mb * 1024 * 1024) if page_cache_mb else None
+        self.llm = LLMCache(react_loop.llm) if llm_cache else None
+        self.started = time.time()
+        self.jobs = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        """Load the default split and prompts of every task (builds missing dataset indexes)."""
+        for name, task in self.tasks.items():
+            args = task.build_parser().parse_args([])
+            try:
+                env = task.build_env(args, log=False)
+            except OSError as e:
+                print(f"Not warming {name}: {e}", file=sys.stderr)
+                continue
+            task.build_instruction(args)
+            env.close()
+
+    def run_job(self, task_name: str, argv: List[str]) -> Any:
+        task = self.tasks[task_name]
+        args = task.build_parser().parse_args(argv)
+        # LLMCache holds locks and cannot be pickled into process workers.
+        llm_fn = self.llm if args.workers <= 1 or args.backend == "thread" else None
+        return task.run_eval(args, page_store=self.page_store, llm_fn=llm_fn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"uptime": time.time() - self.started, "jobs": self.jobs, "failed": self.failed}
+        if self.page_store is not None:
+            out["page_store"] = self.page_store.stats()
+        if self.llm is not None:
+            out["llm_cache"] = self.llm.stats()
+        return out
+
+    def handle(self, message: Dict[str, Any], send) -> Dict[str, Any]:
+        if message.get("cmd") == "stats":
+            return {"done": True, "exit": 0, "result": self.stats()}
+        if message.get("cmd") != "run" or message.get("task") not in self.tasks:
+            return {"done": True, "exit": 2, "error": f"Bad request {message!r}; tasks: {sorted(self.tasks)}\n"}
+        out_token = sys.stdout.sink.set(_StreamSink(send, "stdout"))
+        err_token = sys.stderr.sink.set(_StreamSink(send, "stderr"))
+        try:
+            result = self.run_job(message["task"], message.get("argv", []))
+            reply = {"done": True, "exit": 0, "result": result}
+        except SystemExit as e:  # argparse errors and --help
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 2)
+            reply = {"done": True, "exit": code}
+        except Exception:
+            reply = {"done": True, "exit": 1, "error": traceback.format_exc()}
+        finally:
+            sys.stdout.sink.reset(out_token)
+            sys.stderr.sink.reset(err_token)
+        with self._lock:
+            self.jobs += 1
+            self.failed += reply["exit"] != 0
+        return reply
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        message = json.loads(line)
+        send_lock = threading.Lock()
+
+        def send(obj: Dict[str, Any]) -> None:
+            with send_lock:
+                try:
+                    self.wfile.write(json.dumps(obj).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    pass  # client went away; the job still runs to completion
+
+        if message.get("cmd") == "stop":
+            send({"done": True, "exit": 0, "result": "stopping"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        send(self.server.daemon.handle(message, send))
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, daemon: EvalDaemon) -> None:
+        self.daemon = daemon
+        super().__init__(socket_path, _Handler)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, page_cache_mb: int = 256, llm_cache: bool = True, warm: bool = True) -> None:
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            raise RuntimeError(f"An eval daemon is already listening on {socket_path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(socket_path)  # left behind by a daemon that did not shut down cleanly
+        finally:
+            probe.close()
+    t0 = time.time()
+    daemon = EvalDaemon(page_cache_mb=page_cache_mb, llm_cache=llm_cache)
+    if warm:
+        daemon.warm()
+    sys.stdout = _ThreadOutput(sys.stdout)
+    sys.stderr = _ThreadOutput(sys.stderr)
+    server = _Server(socket_path, daemon)
+    print(f"Eval daemon ready on {socket_path} (started in {time.time() - t0:.1f}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        sys.stdout, sys.stderr = sys.stdout.default, sys.stderr.default
+        print(f"Eval daemon stopped after {daemon.jobs} jobs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm evaluation worker daemon")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="Start the daemon in the foreground")
+    p_serve.add_argument("--page_cache_mb", type=int, default=256, help="Page cache shared by all jobs (0 = off)")
+    p_serve.add_argument("--no_llm_cache", action="store_true", help="Do not memoize LLM calls across jobs")
+    p_serve.add_argument("--no_warm", action="store_true", help="Skip preloading datasets and prompts")
+    p_run = sub.add_parser("run", help="Submit a job: run TASK [task script options]")
+    p_run.add_argument("task", choices=sorted(TASKS))
+    p_run.add_argument("argv", nargs=argparse.REMAINDER)
+    sub.add_parser("stats", help="Print daemon uptime, job counts and cache stats")
+    sub.add_parser("stop", help="Shut the daemon down")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.socket, args.page_cache_mb, llm_cache=not args.no_llm_cache, warm=not args.no_warm)
+    elif args.cmd == "run":
+        result = submit(args.socket, args.task, args.argv)
+        print(f"Result: {result}")
+    else:
+        print(json.dumps(request(args.socket, {"cmd": args.cmd}).get("result"), indent=2))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import _bootstrap
+    _bootstrap.setup(__file__)
+    main()
@@ -0,0 +1,83 @@
+"""
+Parallel episode executor for the evaluation runners.
+Every worker builds its own env stack once (make_env) and pulls the next index from a
+shared queue, so a long episode only occupies its own worker. Results are handed to
+on_result and returned in input order, so output matches a serial run.
+Every env built by make_env is closed once its worker is done.
+"""
+import contextvars
+import multiprocessing.util
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional
+
+_worker = threading.local()
+
+
+def _init_thread_worker(make_env: Callable[[], Any], envs: List[Any]) -> None:
+    _worker.env = make_env()
+    envs.append(_worker.env)  # closed by execute() once the pool has shut down
+
+
+def _init_process_worker(make_env: Callable[[], Any]) -> None:
+    _worker.env = make_env()
+    # pool processes exit through multiprocessing's exit hook, which skips atexit but runs finalizers
+    multiprocessing.util.Finalize(None, _worker.env.close, exitpriority=0)
+
+
+def _run_item(run_one: Callable[[Any, Any], Any], item: Any) -> Any:
+    return run_one(_worker.env, item)
+
+
+def execute(
+    items: Iterable[Any],
+    make_env: Callable[[], Any],
+    run_one: Callable[[Any, Any], Any],
+    workers: int = 1,
+    backend: str = "thread",
+    on_result: Optional[Callable[[Any, Any], None]] = None,
+) -> List[Any]:
+    """
+    Run run_one(env, item) for every item; returns results in input order.
+    - workers <= 1 runs inline in the calling thread with a single make_env() env.
+    - envs from make_env are closed when the run ends; envs must not close resources they share.
+    - backend="process" needs picklable make_env / run_one (module-level functions or partials).
+    - on_result(item, result) is called in input order as soon as each prefix is complete.
+    """
+    items = list(items)
+    results: List[Any] = []
+    if workers <= 1:
+        env = make_env()
+        try:
+            for item in items:
+                result = run_one(env, item)
+                results.append(result)
+                if on_result is not None:
+                    on_result(item, result)
+        finally:
+            env.close()
+        return results
+
+    assert backend in ["thread", "process"]
+    envs: List[Any] = []  # this call's thread worker envs (process workers close their own)
+    pool: Executor
+    if backend == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers, initializer=partial(_init_thread_worker, make_env, envs))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker, initargs=(make_env,))
+    try:
+        if backend == "thread":  # workers see the caller's context variables (e.g. eval_daemon's output sinks)
+            futures = [pool.submit(contextvars.copy_context().run, _run_item, run_one, item) for item in items]
+        else:
+            futures = [pool.submit(_run_item, run_one, item) for item in items]
+        for item, future in zip(items, futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(item, result)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for env in envs:
+            env.close()
+    return results
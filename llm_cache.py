@@ -0,0 +1,70 @@
+"""
+Thread-safe memo cache around an llm_fn(prompt, stop) callable. Keys are SHA-1 digests of
+(prompt, stop), so memory is bounded by max_entries short completions, not prompts.
+Concurrent identical calls are coalesced: one goes to the model, the others wait for it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+class LLMCache:
+    def __init__(self, llm_fn: Callable[..., str], max_entries: int = 100_000) -> None:
+        self.llm_fn = llm_fn
+        self.max_entries = max_entries
+        self._items: "OrderedDict[bytes, str]" = OrderedDict()
+        self._inflight: Dict[bytes, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(prompt: str, stop: List[str]) -> bytes:
+        h = hashlib.sha1(prompt.encode("utf-8"))
+        h.update("\0".join(stop or []).encode("utf-8"))
+        return h.digest()
+
+    def __call__(self, prompt: str, stop: List[str]) -> str:
+        key = self.key(prompt, stop)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            out = self.llm_fn(prompt, stop=stop)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._items[key] = out
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        future.set_result(out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / calls if calls else 0.0,
+            }
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Offline load generator for the ReAct pipeline: run_react driven by a scripted mock LLM
+(latency distribution, thought length, parse-failure rate, episode length) against a
+synthetic env (observation size and latency distributions), at a chosen concurrency.
+Reports throughput, episode / call latency percentiles, framework overhead and CPU time
+per step, and peak RSS. No API key or network needed.
+Distributions are "const:X", "uniform:A,B" or "lognormal:MEDIAN,SIGMA" (ms for latencies,
+characters for sizes, words for thoughts).
+Usage:
+  python loadgen.py --episodes 2000 --workers 64 --llm_latency lognormal:800,0.6 --env_latency uniform:50,400
+  python loadgen.py --episodes 500 --workers 8 --llm_latency 0 --tokenize --max_context_chars 8000
+  python loadgen.py --episodes 1000 --workers 32 --llm_latency lognormal:300,1.0 --hedge --llm_timeout 5
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import resource
+import sys
+import time
+import zlib
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gym
+
+from deadline import DeadlineExceeded, Guarded, HedgedCaller
+from executor import execute
+from react_loop import run_react
+from wikienv import textSpace
+
+_WORDS = (
+    "the film was directed by an American born in river county album released band member "
+    "station city known for its large early second world war university president novel"
+).split()
+
+_STEP_RE = re.compile(r"(Thought|Action) (\d+):$")
+
+
+def parse_dist(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a distribution spec; a bare number means const."""
+    spec = str(spec)
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "const", kind
+    values = [float(v) for v in params.split(",")]
+    if kind == "const":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1]) if values[0] > 0 else 0.0
+    raise ValueError(f"Unknown distribution {spec!r}: use const:X, uniform:A,B or lognormal:MEDIAN,SIGMA")
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(max(1, n)))
+
+
+class MockLLM:
+    """
+    Scripted llm_fn(prompt, stop). Each answer is seeded by the prompt tail, so runs are
+    reproducible whatever the scheduling; latencies are drawn independently per call, so a
+    hedged duplicate (deadline.HedgedCaller) sees a fresh latency. A parse failure answers
+    without the "\\nAction i: " part, which makes react_step issue its retry call.
+    """
+
+    def __init__(
+        self,
+        latency: str = "0",
+        thought_words: str = "uniform:8,30",
+        parse_failure_rate: float = 0.0,
+        finish_prob: float = 0.15,
+        n_answers: int = 7,
+        max_steps: int = 12,
+        seed: int = 0,
+    ) -> None:
+        self.latency_spec, self.thought_spec = latency, thought_words
+        self.latency = parse_dist(latency)
+        self.thought_words = parse_dist(thought_words)
+        self.parse_failure_rate = parse_failure_rate
+        self.finish_prob = finish_prob
+        self.n_answers = n_answers
+        self.max_steps = max_steps
+        self.seed = seed
+        self.latency_rng = random.Random(seed)
+
+    def __getstate__(self) -> Dict[str, Any]:  # samplers are lambdas; rebuild them after pickling
+        return {k: v for k, v in self.__dict__.items() if k not in ("latency", "thought_words")}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.latency = parse_dist(self.latency_spec)
+        self.thought_words = parse_dist(self.thought_spec)
+
+    def __call__(self, prompt: str, stop: List[str]) -> str:
+        tail = prompt[-400:]
+        rng = random.Random(zlib.crc32(tail.encode("utf-8")) ^ self.seed)
+        delay = self.latency(self.latency_rng) / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+        m = _STEP_RE.search(tail)
+        step = int(m.group(2)) if m else 1
+        if rng.random() < self.finish_prob or step >= self.max_steps:
+            action = f"Finish[answer {rng.randrange(self.n_answers)}]"
+        elif rng.random() < 0.3:
+            action = f"Lookup[{rng.choice(_WORDS)}]"
+        else:
+            action = f"Search[{_words(rng, 2).title()}]"
+        if m and m.group(1) == "Action":  # retry after a parse failure: action only
+            return " " + action
+        thought = " " + _words(rng, int(self.thought_words(rng)))
+        if rng.random() < self.parse_failure_rate:
+            return thought
+        return f"{thought}\nAction {step}: {action}"
+
+
+class SyntheticEnv(gym.Env):
+    """Question-answering env with synthetic observations of configurable size and latency."""
+
+    def __init__(self, n_data: int = 100_000, obs_chars: str = "uniform:200,1500", latency: str = "0", seed: int = 0) -> None:
+        super().__init__()
+        self.n_data = n_data
+        self.obs_chars = parse_dist(obs_chars)
+        self.latency = parse_dist(latency)
+        self.seed_base = seed
+        self.observation_space = self.action_space = textSpace()
+        self.data_idx = 0
+        self.steps = 0
+        self.answer: Optional[str] = None
+        self.rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self.n_data
+
+    def reset(self, seed: Optional[int] = None, return_info: bool = False, options: Optional[Dict] = None, idx: Optional[int] = None) -> Any:
+        self.data_idx = random.randrange(self.n_data) if idx is None else idx
+        self.rng = random.Random(self.seed_base * 1_000_003 + self.data_idx)
+        self.steps = 0
+        self.answer = None
+        obs = f"Question: Synthetic question {self.data_idx} about {_words(self.rng, 6)}?"
+        return (obs, {}) if return_info else obs
+
+    def step(self, action: str) -> Tuple[str, float, bool, Dict[str, Any]]:
+        delay = self.latency(self.rng) / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+        self.steps += 1
+        action = action.strip()
+        if action.lower().startswith("finish["):
+            self.answer = action[len("finish[") : -1]
+            gt = f"answer {self.data_idx % 7}"
+            em = int(self.answer == gt)
+            info = {"steps": self.steps, "answer": self.answer, "gt_answer": gt, "question_idx": self.data_idx, "em": em, "f1": float(em), "reward": em}
+            return f"Episode finished, reward = {em}\n", float(em), True, info
+        if action.lower().startswith("lookup["):
+            obs = f"(Result 1 / 1) {_words(self.rng, 12)}."
+        else:
+            obs = _words(self.rng, int(self.obs_chars(self.rng)) // 6)
+        return obs, 0.0, False, {"steps": self.steps, "answer": None}
+
+
+def _run_one(
+    env: Any,
+    idx: int,
+    llm_fn: Callable[[str, List[str]], str],
+    instruction: str,
+    max_steps: int,
+    tokenize: bool,
+    max_raw_steps: int,
+    max_context_chars: Optional[int],
+) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    try:
+        _, info = run_react(
+            env, instruction, "", max_steps=max_steps, llm_fn=llm_fn, use_tokenization=tokenize,
+            max_raw_steps=max_raw_steps, max_context_chars=max_context_chars, to_print=False, idx=idx,
+        )
+    except DeadlineExceeded:
+        info = {"failed": 1}
+    wall = time.perf_counter() - t0
+    steps = info.get("step_log", [])
+    return {
+        "wall": wall,
+        "failed": info.get("failed", 0),
+        "steps": len(steps),
+        "calls": info.get("n_calls", 0),
+        "em": info.get("em", 0),
+        "llm": [s["llm_time"] for s in steps],
+        "env": [s["env_time"] for s in steps],
+        "prompt_chars": [s["prompt_chars"] for s in steps],
+        "context_chars": [s["context_chars"] for s in steps],
+        "overhead": wall - sum(s["llm_time"] + s["env_time"] for s in steps),
+    }
+
+
+def percentiles(values: List[float], ps=(50, 90, 99)) -> Dict[str, float]:
+    v = sorted(values)
+    if not v:
+        return {f"p{p}": 0.0 for p in ps}
+    return {f"p{p}": v[min(len(v) - 1, int(p / 100 * len(v)))] for p in ps}
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb() -> float:
+    kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return kb / (1024 * 1024) if sys.platform == "darwin" else kb / 1024  # bytes on macOS, KiB on Linux
+
+
+def run_load(
+    episodes: int = 1000,
+    workers: int = 16,
+    backend: str = "thread",
+    llm: Optional[MockLLM] = None,
+    env_kwargs: Optional[Dict[str, Any]] = None,
+    instruction_chars: int = 6000,
+    max_steps: int = 8,
+    tokenize: bool = False,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+    seed: int = 0,
+    llm_caller: Optional[HedgedCaller] = None,
+) -> Dict[str, Any]:
+    """
+    Run the load and return the report dict (see print_report). With llm_caller, LLM calls
+    go through its deadline / hedging policy; episodes that miss a deadline count as failed.
+    """
+    llm = llm or MockLLM(seed=seed)
+    rng = random.Random(seed)
+    instruction = "Solve a question answering task. Here are some examples.\n" + _words(rng, instruction_chars // 6) + "\n"
+    make_env = partial(SyntheticEnv, seed=seed, **(env_kwargs or {}))
+    run_one = partial(
+        _run_one, llm_fn=Guarded(llm, llm_caller) if llm_caller else llm, instruction=instruction, max_steps=max_steps, tokenize=tokenize,
+        max_raw_steps=max_raw_steps, max_context_chars=max_context_chars,
+    )
+    idxs = [rng.randrange(100_000) for _ in range(episodes)]
+    cpu0, t0 = _cpu_seconds(), time.perf_counter()
+    results = execute(idxs, make_env, run_one, workers=workers, backend=backend)
+    wall, cpu = time.perf_counter() - t0, _cpu_seconds() - cpu0
+
+    n_steps = sum(r["steps"] for r in results)
+    n_calls = sum(r["calls"] for r in results)
+    return {
+        "episodes": len(results),
+        "failed_episodes": sum(r["failed"] for r in results),
+        "steps": n_steps,
+        "llm_calls": n_calls,
+        "parse_retries": n_calls - n_steps,
+        "em": sum(r["em"] for r in results) / max(len(results), 1),
+        "wall_s": wall,
+        "episodes_per_s": len(results) / wall,
+        "steps_per_s": n_steps / wall,
+        "episode_latency_s": percentiles([r["wall"] for r in results]),
+        "llm_latency_s": percentiles([t for r in results for t in r["llm"]]),
+        "env_latency_s": percentiles([t for r in results for t in r["env"]]),
+        "overhead_per_step_ms": percentiles([1000 * r["overhead"] / r["steps"] for r in results if r["steps"]]),
+        "cpu_ms_per_step": 1000 * cpu / max(n_steps, 1),
+        "prompt_chars": percentiles([c for r in results for c in r["prompt_chars"]]),
+        "context_chars": percentiles([c for r in results for c in r["context_chars"]]),
+        "peak_rss_mb": _peak_rss_mb(),
+        # Process workers keep their own copy of the caller, so its counters are only seen with threads.
+        "llm_caller": llm_caller.stats() if llm_caller and (workers <= 1 or backend == "thread") else None,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['episodes']} episodes, {report['steps']} steps, {report['llm_calls']} LLM calls "
+          f"({report['parse_retries']} parse retries), EM {report['em']:.3f}")
+    print(f"wall {report['wall_s']:.1f}s | {report['episodes_per_s']:.1f} episodes/s | {report['steps_per_s']:.1f} steps/s")
+    for key, unit in [("episode_latency_s", "s"), ("llm_latency_s", "s"), ("env_latency_s", "s"),
+                      ("overhead_per_step_ms", "ms"), ("prompt_chars", ""), ("context_chars", "")]:
+        p = report[key]
+        print(f"  {key:22s} p50 {p['p50']:10.4g} | p90 {p['p90']:10.4g} | p99 {p['p99']:10.4g} {unit}")
+    print(f"CPU {report['cpu_ms_per_step']:.2f} ms/step | peak RSS {report['peak_rss_mb']:.0f} MB")
+    caller = report.get("llm_caller")
+    if caller:
+        print(f"LLM deadline / hedging: {caller['calls']} calls, {caller['timeouts']} timeouts "
+              f"({report['failed_episodes']} failed episodes), {caller['hedges']} hedged ({caller['hedge_wins']} won)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic ReAct load generator (mock LLM + synthetic env)")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent episodes")
+    parser.add_argument("--backend", type=str, default="thread", choices=["thread", "process"])
+    parser.add_argument("--llm_latency", type=str, default="lognormal:500,0.5", help="LLM call latency (ms)")
+    parser.add_argument("--thought_words", type=str, default="uniform:8,30", help="Words per generated thought")
+    parser.add_argument("--parse_failure_rate", type=float, default=0.05)
+    parser.add_argument("--finish_prob", type=float, default=0.15, help="Chance to answer at each step")
+    parser.add_argument("--obs_chars", type=str, default="uniform:200,1500", help="Search observation size (chars)")
+    parser.add_argument("--env_latency", type=str, default="uniform:20,200", help="Env step latency (ms)")
+    parser.add_argument("--instruction_chars", type=int, default=6000, help="Size of the synthetic few-shot instruction")
+    parser.add_argument("--max_steps", type=int, default=8)
+    parser.add_argument("--tokenize", action="store_true")
+    parser.add_argument("--max_raw_steps", type=int, default=3)
+    parser.add_argument("--max_context_chars", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm_timeout", type=float, default=None, help="Deadline per LLM call in seconds")
+    parser.add_argument("--hedge", action="store_true", help="Hedge LLM calls slower than the recent --hedge_percentile")
+    parser.add_argument("--hedge_percentile", type=float, default=95.0)
+    parser.add_argument("--hedge_max_extra", type=float, default=0.1, help="Cap on hedged calls as a fraction of calls")
+    parser.add_argument("--json", type=str, default=None, help="Also write the report here")
+    args = parser.parse_args()
+
+    llm = MockLLM(args.llm_latency, args.thought_words, args.parse_failure_rate, args.finish_prob, seed=args.seed)
+    report = run_load(
+        episodes=args.episodes, workers=args.workers, backend=args.backend, llm=llm,
+        env_kwargs={"obs_chars": args.obs_chars, "latency": args.env_latency},
+        instruction_chars=args.instruction_chars, max_steps=args.max_steps, tokenize=args.tokenize,
+        max_raw_steps=args.max_raw_steps, max_context_chars=args.max_context_chars, seed=args.seed,
+        llm_caller=HedgedCaller(
+            "llm", timeout=args.llm_timeout, hedge=args.hedge, hedge_percentile=args.hedge_percentile,
+            max_extra=args.hedge_max_extra,
+        ) if args.llm_timeout or args.hedge else None,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import _bootstrap
+    _bootstrap.setup(__file__)
+    main()
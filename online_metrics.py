@@ -0,0 +1,147 @@
+"""
+Streaming evaluation metrics: running EM / F1 with 95% confidence intervals, and a paired
+baseline-vs-tokenized comparison with an anytime-valid sequential stop rule.
+The stop rule looks only at discordant pairs (one arm right, the other wrong). Under "no
+difference" each of them favours the tokenized arm with probability 1/2. The e-value is
+the Beta(1, 1)-mixture likelihood ratio against that null,
+    E = B(c + 1, b + 1) * 2^(b + c),
+where b = baseline-only wins and c = tokenized-only wins. By Ville's inequality, stopping
+the first time E >= 1/alpha keeps the false-stop rate at most alpha, however often it
+is checked. So a comparison can be checked after every example and stopped as soon as
+the difference is settled.
+"""
+import math
+from typing import Any, Dict, Optional, Tuple
+
+Z95 = 1.959963984540054
+
+
+class RunningMean:
+    """Welford mean / variance of a stream of numbers."""
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def var(self) -> float:
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def ci(self, z: float = Z95) -> Tuple[float, float]:
+        """Normal-approximation interval for the mean."""
+        half = z * math.sqrt(self.var / self.n) if self.n > 1 else float("inf")
+        return self.mean - half, self.mean + half
+
+
+def wilson_interval(successes: float, n: int, z: float = Z95) -> Tuple[float, float]:
+    """Wilson score interval for a proportion (well behaved near 0 / 1 and for small n)."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class MetricAggregator:
+    """Running EM (Wilson CI) and F1 (normal CI) over episode infos as they arrive."""
+
+    def __init__(self) -> None:
+        self.em = RunningMean()
+        self.f1 = RunningMean()
+
+    def add(self, em: float, f1: Optional[float] = None) -> None:
+        self.em.add(float(em))
+        self.f1.add(float(em if f1 is None else f1))
+
+    def add_info(self, info: Dict[str, Any], reward: Any = 0) -> None:
+        em = info.get("em", reward)
+        self.add(em, info.get("f1", em))
+
+    @property
+    def n(self) -> int:
+        return self.em.n
+
+    def summary(self) -> str:
+        if not self.n:
+            return "EM n/a"
+        lo, hi = wilson_interval(self.em.mean * self.n, self.n)
+        f_lo, f_hi = self.f1.ci()
+        f_ci = f" [{max(0.0, f_lo):.3f}, {min(1.0, f_hi):.3f}]" if self.n > 1 else ""
+        return f"EM {self.em.mean:.4f} [{lo:.3f}, {hi:.3f}] | F1 {self.f1.mean:.4f}{f_ci}"
+
+
+def _log_e_value(b: int, c: int) -> float:
+    return math.lgamma(b + 1) + math.lgamma(c + 1) - math.lgamma(b + c + 2) + (b + c) * math.log(2)
+
+
+def sign_test_p(b: int, c: int) -> float:
+    """Exact two-sided McNemar (sign test) p-value on the discordant pairs."""
+    n = b + c
+    if n == 0:
+        return 1.0
+    k = min(b, c)
+    tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+    return min(1.0, 2 * tail)
+
+
+class PairedComparison:
+    """
+    Baseline vs tokenized results on the same examples, paired by example idx as they
+    arrive from either arm in any order. settled() is the sequential stop rule (module
+    docstring): the difference is decided once E >= 1/alpha after at least min_pairs pairs.
+    """
+
+    def __init__(self, name: str = "", alpha: float = 0.05, min_pairs: int = 20) -> None:
+        self.name = name
+        self.alpha = alpha
+        self.min_pairs = min_pairs
+        self.arms = {"base": MetricAggregator(), "tok": MetricAggregator()}
+        self.diff = RunningMean()
+        self.b = self.c = 0  # discordant pairs: only baseline right / only tokenized right
+        self._pending: Dict[Tuple[str, Any], float] = {}
+        self.stopped_at: Optional[int] = None
+
+    def add(self, arm: str, idx: Any, em: float, f1: Optional[float] = None) -> None:
+        """Record arm ("base" or "tok") on example idx; pairs complete when both arms have it."""
+        self.arms[arm].add(em, f1)
+        other = "tok" if arm == "base" else "base"
+        if (other, idx) not in self._pending:
+            self._pending[(arm, idx)] = float(em)
+            return
+        other_em = self._pending.pop((other, idx))
+        base, tok = (float(em), other_em) if arm == "base" else (other_em, float(em))
+        self.diff.add(tok - base)
+        self.b += base > tok
+        self.c += tok > base
+
+    @property
+    def n_pairs(self) -> int:
+        return self.diff.n
+
+    def e_value(self) -> float:
+        return math.exp(_log_e_value(self.b, self.c))
+
+    def settled(self) -> bool:
+        if self.stopped_at is None and self.n_pairs >= self.min_pairs and _log_e_value(self.b, self.c) >= math.log(1 / self.alpha):
+            self.stopped_at = self.n_pairs
+        return self.stopped_at is not None
+
+    def summary(self) -> str:
+        lo, hi = self.diff.ci()
+        verdict = ""
+        if self.stopped_at is not None:
+            verdict = f" | settled after {self.stopped_at} pairs ({'tokenized' if self.c > self.b else 'baseline'} better)"
+        return (
+            f"{self.name} | pairs={self.n_pairs} | EM diff (tok - base) {self.diff.mean:+.4f} "
+            f"[{lo:+.3f}, {hi:+.3f}] | discordant {self.b} base-only / {self.c} tok-only | "
+            f"McNemar p={sign_test_p(self.b, self.c):.4f} | e-value {self.e_value():.2f}{verdict}"
+        )
@@ -0,0 +1,114 @@
+"""
+Byte-bounded, compressed in-memory LRU store for parsed Wikipedia search results.
+Values are JSON-encoded and compressed with zstd (if `zstandard` is installed) or zlib;
+the budget counts compressed bytes, so memory stays fixed on long runs.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _make_codec(codec: str, level: Optional[int]):
+    if codec == "auto":
+        codec = "zstd" if zstandard is not None else "zlib"
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("codec='zstd' requires the zstandard package")
+        lvl = 3 if level is None else level
+        return (
+            codec,
+            lambda b: zstandard.ZstdCompressor(level=lvl).compress(b),
+            lambda b: zstandard.ZstdDecompressor().decompress(b),
+        )
+    if codec == "zlib":
+        lvl = 6 if level is None else level
+        return codec, lambda b: zlib.compress(b, lvl), zlib.decompress
+    if codec == "none":
+        return codec, bytes, bytes
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+class PageStore:
+    """LRU of compressed values bounded by max_bytes of compressed payload. Thread-safe."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, codec: str = "auto", level: Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self.codec, self._compress, self._decompress = _make_codec(codec, level)
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._raw_sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.raw_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            blob = self._items.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        return json.loads(self._decompress(blob).decode("utf-8"))
+
+    def put(self, key: str, value: Any) -> bool:
+        """Store value (JSON-serializable). Returns False if it alone exceeds the budget."""
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        blob = self._compress(raw)
+        if len(blob) > self.max_bytes:
+            return False
+        with self._lock:
+            self._discard(key)
+            self._items[key] = blob
+            self._raw_sizes[key] = len(raw)
+            self.nbytes += len(blob)
+            self.raw_nbytes += len(raw)
+            while self.nbytes > self.max_bytes:
+                old_key = next(iter(self._items))
+                self._discard(old_key)
+                self.evictions += 1
+        return True
+
+    def _discard(self, key: str) -> None:
+        blob = self._items.pop(key, None)
+        if blob is not None:
+            self.nbytes -= len(blob)
+            self.raw_nbytes -= self._raw_sizes.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._raw_sizes.clear()
+            self.nbytes = self.raw_nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "codec": self.codec,
+                "entries": len(self._items),
+                "bytes": self.nbytes,
+                "raw_bytes": self.raw_nbytes,
+                "max_bytes": self.max_bytes,
+                "compression_ratio": self.raw_nbytes / self.nbytes if self.nbytes else 0.0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,212 @@
+"""
+Named-span profiler behind --profile. Code marks phases with `with span("llm"):` or
+@profiled("parse_react_steps"); with no profiler running a span is one global check.
+A running Profiler aggregates per-phase calls / total / self time (spans nest per thread)
+and writes <out>.phases.txt / .json plus <out>.folded, a folded-stacks file for
+flamegraph.pl, speedscope or inferno. mode="sample" additionally samples every thread's
+Python stack every interval_ms, and the .folded file then holds those samples
+(prefixed with the enclosing span names) instead of span self times.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+_ACTIVE: Optional["Profiler"] = None
+
+
+class _NullSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "t0", "child")
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.child = 0.0
+
+    def __enter__(self) -> None:
+        self.profiler._stack().append(self)
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.t0
+        stack = self.profiler._stack()
+        path = tuple(s.name for s in stack)
+        stack.pop()
+        if stack:
+            stack[-1].child += elapsed
+        self.profiler._record(path, elapsed, elapsed - self.child)
+
+
+def span(name: str):
+    """Context manager timing the named phase under the running profiler (no-op otherwise)."""
+    profiler = _ACTIVE
+    return _NULL_SPAN if profiler is None else _Span(profiler, name)
+
+
+def profiled(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: run the function inside span(name)."""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profiler = _ACTIVE
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with _Span(profiler, name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class Profiler:
+    """
+    - mode: "spans" (phase timings only) or "sample" (also a sampling profiler thread).
+    - interval_ms: sampling period in sample mode.
+    Spans from process workers are not seen; profile with thread workers or serially.
+    """
+
+    def __init__(self, mode: str = "spans", interval_ms: float = 5.0) -> None:
+        if mode not in ("spans", "sample"):
+            raise ValueError(f"Unknown profile mode {mode!r}: use spans or sample")
+        self.mode = mode
+        self.interval = interval_ms / 1000.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stacks: Dict[int, List[_Span]] = {}
+        self.phases: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0])  # calls, total, self, max
+        self.paths: Dict[Tuple[str, ...], float] = defaultdict(float)  # span path -> self seconds
+        self.samples: Dict[str, int] = defaultdict(int)
+        self.n_samples = 0
+        self.wall = 0.0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+            with self._lock:
+                self._stacks[threading.get_ident()] = stack
+        return stack
+
+    def _record(self, path: Tuple[str, ...], elapsed: float, self_time: float) -> None:
+        with self._lock:
+            phase = self.phases[path[-1]]
+            phase[0] += 1
+            phase[1] += elapsed
+            phase[2] += self_time
+            phase[3] = max(phase[3], elapsed)
+            self.paths[path] += self_time
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                stacks = {tid: [s.name for s in stack] for tid, stack in self._stacks.items()}
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(stacks.get(tid, []) + names[::-1])
+                with self._lock:
+                    self.samples[key] += 1
+            self.n_samples += 1
+
+    def start(self) -> "Profiler":
+        global _ACTIVE
+        if _ACTIVE is not None:
+            raise RuntimeError("A profiler is already running")
+        _ACTIVE = self
+        self._t0 = time.perf_counter()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        global _ACTIVE
+        if _ACTIVE is self:
+            _ACTIVE = None
+        self.wall = time.perf_counter() - self._t0
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Phase -> calls, total_s, self_s, mean_ms, max_ms, share (self time / wall time)."""
+        with self._lock:
+            phases = {k: list(v) for k, v in self.phases.items()}
+        return {
+            name: {
+                "calls": calls, "total_s": total, "self_s": own, "mean_ms": 1000 * total / calls if calls else 0.0,
+                "max_ms": 1000 * peak, "share": own / self.wall if self.wall else 0.0,
+            }
+            for name, (calls, total, own, peak) in sorted(phases.items(), key=lambda kv: -kv[1][2])
+        }
+
+    def report(self) -> str:
+        lines = [f"Profile ({self.mode}): {self.wall:.2f}s wall" + (f", {self.n_samples} samples" if self.n_samples else "")]
+        lines.append(f"{'phase':24s} {'calls':>8s} {'total s':>9s} {'self s':>9s} {'mean ms':>9s} {'max ms':>9s} {'self %':>7s}")
+        for name, s in self.stats().items():
+            lines.append(
+                f"{name:24s} {s['calls']:8d} {s['total_s']:9.3f} {s['self_s']:9.3f} {s['mean_ms']:9.2f} {s['max_ms']:9.1f} {100 * s['share']:6.1f}%"
+            )
+        return "\n".join(lines)
+
+    def folded(self) -> List[str]:
+        """Folded stacks ("a;b;c value"): sample counts in sample mode, else span self time in microseconds."""
+        with self._lock:
+            if self.mode == "sample":
+                return [f"{key} {n}" for key, n in sorted(self.samples.items())]
+            return [f"{';'.join(path)} {round(t * 1e6)}" for path, t in sorted(self.paths.items()) if t > 0]
+
+    def write(self, out: str) -> List[str]:
+        """Write <out>.phases.txt, <out>.phases.json and <out>.folded; returns the paths."""
+        if os.path.dirname(out):
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+        paths = [out + ".phases.txt", out + ".phases.json", out + ".folded"]
+        with open(paths[0], "w") as f:
+            f.write(self.report() + "\n")
+        with open(paths[1], "w") as f:
+            json.dump({"mode": self.mode, "wall_s": self.wall, "samples": self.n_samples, "phases": self.stats()}, f, indent=2)
+        with open(paths[2], "w") as f:
+            f.write("\n".join(self.folded()) + "\n")
+        return paths
+
+
+@contextmanager
+def profile(mode: Optional[str], out: str, interval_ms: float = 5.0) -> Iterator[Optional[Profiler]]:
+    """Profile the block when mode is set (and no profiler is running yet), then print and write the report."""
+    if not mode or _ACTIVE is not None:
+        yield None
+        return
+    profiler = Profiler(mode, interval_ms).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        print(profiler.report())
+        print("Profile written to " + ", ".join(profiler.write(out)))
@@ -5,17 +5,42 @@ Works with HotpotQA and FEVER (Wikipedia env); same interface for both.
 import json
 import os
 import re
+import time
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from profiling import span
+from trajlog import Trajectory
+
 # Optional: use tokenization when enabled
 try:
-    from trajectory_tokenizer import tokenize_trajectory
+    from trajectory_tokenizer import expand_steps, tokenize_trajectory
 except ImportError:
     def tokenize_trajectory(*args, **kwargs):
         return args[0] if args else ""
 
+    def expand_steps(*args, **kwargs):
+        return None
+
+# Prepended to the instruction by run_react(expandable=True).
+EXPAND_HINT = (
+    "When earlier steps are shown only as [Step k] (or #k) summaries, the action Expand[Step k] "
+    "(or Expand[Steps a-b]) returns those steps in full.\n"
+)
+
 
-def llm(prompt: str, stop: List[str], api_key: Optional[str] = None, model: str = "gpt-4o-mini") -> str:
+def episode_instruction(instruction: str, expandable: bool = False) -> str:
+    """The shared prefix run_react puts in front of every episode's question (and in info["traj"])."""
+    return EXPAND_HINT + instruction if expandable else instruction
+
+
+def llm(
+    prompt: str,
+    stop: List[str],
+    api_key: Optional[str] = None,
+    model: str = "gpt-4o-mini",
+    timeout: Optional[float] = None,
+) -> str:
+    """One completion; timeout (seconds) bounds the HTTP request (None = the client's default)."""
     try:
         from openai import OpenAI
         key = api_key or os.environ.get("OPENAI_API_KEY", "")
@@ -31,12 +56,206 @@ def llm(prompt: str, stop: List[str], api_key: Optional[str] = None, model: str
             frequency_penalty=0.0,
             presence_penalty=0.0,
             stop=stop,
+            **({"timeout": timeout} if timeout else {}),
         )
         return response.choices[0].message.content or ""
     except Exception as e:
         raise RuntimeError(f"LLM call failed: {e}") from e
 
 
+class Episode:
+    """
+    Mutable state of one ReAct episode (prompt, counters, per-step log); copy() forks it.
+    shared_prefix is the part of instruction_prefix common to every episode of a run (the
+    instruction and few-shot examples); info["traj"] keeps it once per process, see trajlog.Trajectory.
+    """
+
+    def __init__(self, instruction_prefix: str, fmt: str = "react", shared_prefix: str = "") -> None:
+        self.instruction_prefix = instruction_prefix
+        self.fmt = fmt
+        self.shared_prefix = shared_prefix
+        self.full_prompt = instruction_prefix
+        self.n_calls = 0
+        self.n_badcalls = 0
+        self.step_log: List[Dict[str, Any]] = []
+        self.reward: Any = 0
+        self.done = False
+        self.info: Dict[str, Any] = {}
+
+    def copy(self) -> "Episode":
+        ep = Episode(self.instruction_prefix, self.fmt, self.shared_prefix)
+        ep.full_prompt = self.full_prompt
+        ep.n_calls, ep.n_badcalls = self.n_calls, self.n_badcalls
+        ep.step_log = list(self.step_log)
+        ep.reward, ep.done, ep.info = self.reward, self.done, dict(self.info)
+        return ep
+
+
+def start_episode(env: Any, instruction: str, idx: Optional[int] = None, to_print: bool = True, fmt: str = "react") -> Episode:
+    with span("env_reset"):
+        try:
+            obs = env.reset(idx=idx if idx is not None else getattr(env, "data_idx", None))
+        except TypeError:
+            obs = env.reset()
+    if to_print:
+        print(obs[:200] + "..." if len(obs) > 200 else obs)
+    return Episode(instruction + obs.strip() + "\n", fmt=fmt, shared_prefix=instruction)
+
+
+def compress_prompt(
+    ep: Episode,
+    use_tokenization: bool,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+) -> str:
+    """Prompt to send for the next step: ep.full_prompt, tokenized once it exceeds max_context_chars."""
+    if use_tokenization and len(ep.full_prompt) > (max_context_chars or 32000):
+        return tokenize_trajectory(
+            ep.full_prompt,
+            ep.instruction_prefix,
+            max_raw_steps=max_raw_steps,
+            max_total_chars=max_context_chars,
+            fmt=ep.fmt,
+        )
+    return ep.full_prompt
+
+
+def react_step(
+    env: Any,
+    ep: Episode,
+    i: int,
+    llm_fn: Callable[[str, List[str]], str],
+    use_tokenization: bool = False,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+    to_print: bool = True,
+    expandable: bool = False,
+) -> None:
+    """
+    Run step i (Thought / Action / Observation) of ep against env. With expandable, an
+    expand[Step k] action is answered from ep.step_log (the full steps that compression
+    summarized) instead of going to env.
+    """
+    prompt_chars = len(ep.full_prompt)
+    ep.full_prompt = compress_prompt(ep, use_tokenization, max_raw_steps, max_context_chars)
+    t_llm = time.time()
+    ep.n_calls += 1
+    with span("llm"):
+        thought_action = llm_fn(ep.full_prompt + f"Thought {i}:", stop=[f"\nObservation {i}:"])
+    try:
+        thought, action = thought_action.strip().split(f"\nAction {i}: ", 1)
+    except ValueError:
+        if to_print:
+            print("parse retry:", thought_action[:150])
+        ep.n_calls += 1
+        thought = thought_action.strip().split("\n")[0]
+        with span("llm"):
+            action = llm_fn(ep.full_prompt + f"Thought {i}: {thought}\nAction {i}:", stop=["\n"]).strip()
+    # Normalize action: first letter lower (Search -> search) for env; safe for empty/single-char
+    action = (action[0].lower() + action[1:]) if len(action) > 1 else (action.lower() if action else "")
+    t_env = time.time()
+    expanded = expand_steps({s["step"]: (s["thought"], s["action"], s["obs"]) for s in ep.step_log}, action) if expandable else None
+    if expanded is not None:
+        obs = expanded
+    else:
+        with span("env_step"):
+            obs, ep.reward, ep.done, ep.info = env.step(action)
+    env_time = time.time() - t_env
+    obs = obs.replace("\\n", "")
+    ep.step_log.append({
+        "step": i,
+        "thought": thought,
+        "action": action,
+        "obs": obs,
+        "prompt_chars": prompt_chars,
+        "context_chars": len(ep.full_prompt),
+        "llm_time": t_env - t_llm,
+        "env_time": env_time,
+        "reward": ep.reward,
+    })
+    step_str = f"Thought {i}: {thought}\nAction {i}: {action}\nObservation {i}: {obs}\n"
+    ep.full_prompt += step_str
+    if to_print:
+        print(step_str[:300] + "..." if len(step_str) > 300 else step_str)
+
+
+def finish_episode(env: Any, ep: Episode, to_print: bool = True) -> Tuple[int, Dict[str, Any]]:
+    if not ep.done and ep.fmt != "alfworld":
+        _, ep.reward, ep.done, ep.info = env.step("finish[]")
+    info = ep.info
+    if to_print:
+        print(info, "\n")
+    info["n_calls"] = ep.n_calls
+    info["n_badcalls"] = ep.n_badcalls
+    info["traj"] = Trajectory(ep.full_prompt, ep.shared_prefix)
+    info["step_log"] = ep.step_log
+    return ep.reward, info
+
+
+def alfworld_step(
+    env: Any,
+    ep: Episode,
+    i: int,
+    llm_fn: Callable[[str, List[str]], str],
+    use_tokenization: bool = False,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+    to_print: bool = True,
+) -> None:
+    """Run command i of an ALFWorld-format episode: one "> ..." line from the LLM, then the env's reply."""
+    prompt_chars = len(ep.full_prompt)
+    ep.full_prompt = compress_prompt(ep, use_tokenization, max_raw_steps, max_context_chars)
+    t_llm = time.time()
+    ep.n_calls += 1
+    with span("llm"):
+        action = llm_fn(ep.full_prompt + ">", stop=["\n"]).strip()
+    t_env = time.time()
+    with span("env_step"):
+        obs, ep.reward, ep.done, ep.info = env.step(action)
+    env_time = time.time() - t_env
+    ep.step_log.append({
+        "step": i,
+        "thought": "",
+        "action": action,
+        "obs": obs,
+        "prompt_chars": prompt_chars,
+        "context_chars": len(ep.full_prompt),
+        "llm_time": t_env - t_llm,
+        "env_time": env_time,
+        "reward": ep.reward,
+    })
+    step_str = f"> {action}\n{obs}\n"
+    ep.full_prompt += step_str
+    if to_print:
+        print(step_str, end="")
+
+
+def run_react_alfworld(
+    env: Any,
+    instruction: str,
+    max_steps: int = 50,
+    llm_fn: Optional[Callable[[str, List[str]], str]] = None,
+    use_tokenization: bool = False,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+    to_print: bool = True,
+    idx: Optional[int] = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Run one ALFWorld-style episode ("> think: ..." / "> go to ..." lines, see alfworld_env.py);
+    tokenization uses the "alfworld" trajectory format. Returns (reward, info) like run_react.
+    """
+    if llm_fn is None:
+        llm_fn = llm
+    ep = start_episode(env, instruction, idx=idx, to_print=to_print)
+    ep.fmt = "alfworld"
+    for i in range(1, max_steps + 1):
+        alfworld_step(env, ep, i, llm_fn, use_tokenization, max_raw_steps, max_context_chars, to_print)
+        if ep.done:
+            break
+    return finish_episode(env, ep, to_print)
+
+
 def run_react(
     env: Any,
     instruction: str,
@@ -48,6 +267,8 @@ def run_react(
     max_context_chars: Optional[int] = None,
     to_print: bool = True,
     idx: Optional[int] = None,
+    expandable: bool = False,
+    fmt: str = "react",
 ) -> Tuple[int, Dict[str, Any]]:
     """
     Run one ReAct episode. Returns (reward, info).
@@ -55,52 +276,70 @@ def run_react(
     - instruction: ReAct instruction + few-shot examples (no trailing question).
     - question: current question/claim (e.g. "Question: ..." or "Claim: ...").
     - use_tokenization: if True, compress older steps into tokens when building prompt.
+    - expandable: tell the agent about Expand[Step k] (EXPAND_HINT) and answer it with the
+      full text of step k, so a small raw window loses no detail for good.
+    - fmt: summary encoding once tokenized, "react" or the denser "react_compact".
+    info["step_log"] holds one dict per step: step, thought, action, obs, prompt_chars /
+    context_chars (prompt length before / after tokenization), llm_time, env_time, reward.
+    info["traj"] is the final prompt as a trajlog.Trajectory (str() rebuilds the text).
     """
     if llm_fn is None:
         llm_fn = llm
-    obs, reward, done, info = None, 0, False, {}
-    try:
-        obs = env.reset(idx=idx if idx is not None else getattr(env, "data_idx", None))
-    except TypeError:
-        obs = env.reset()
-    if to_print:
-        print(obs[:200] + "..." if len(obs) > 200 else obs)
-    instruction_prefix = instruction + obs.strip() + "\n"
-    full_prompt = instruction_prefix
-    n_calls, n_badcalls = 0, 0
+    instruction = episode_instruction(instruction, expandable)
+    ep = start_episode(env, instruction, idx=idx, to_print=to_print, fmt=fmt)
     for i in range(1, max_steps + 1):
-        if use_tokenization and len(full_prompt) > (max_context_chars or 32000):
-            full_prompt = tokenize_trajectory(
-                full_prompt,
-                instruction_prefix,
-                max_raw_steps=max_raw_steps,
-                max_total_chars=max_context_chars,
-            )
-        n_calls += 1
-        thought_action = llm_fn(full_prompt + f"Thought {i}:", stop=[f"\nObservation {i}:"])
-        try:
-            thought, action = thought_action.strip().split(f"\nAction {i}: ", 1)
-        except ValueError:
-            if to_print:
-                print("parse retry:", thought_action[:150])
-            n_calls += 1
-            thought = thought_action.strip().split("\n")[0]
-            action = llm_fn(full_prompt + f"Thought {i}: {thought}\nAction {i}:", stop=["\n"]).strip()
-        # Normalize action: first letter lower (Search -> search) for env; safe for empty/single-char
-        action = (action[0].lower() + action[1:]) if len(action) > 1 else (action.lower() if action else "")
-        obs, reward, done, info = env.step(action)
-        obs = obs.replace("\\n", "")
-        step_str = f"Thought {i}: {thought}\nAction {i}: {action}\nObservation {i}: {obs}\n"
-        full_prompt += step_str
-        if to_print:
-            print(step_str[:300] + "..." if len(step_str) > 300 else step_str)
-        if done:
+        react_step(env, ep, i, llm_fn, use_tokenization, max_raw_steps, max_context_chars, to_print, expandable)
+        if ep.done:
             break
-    if not done:
-        obs, reward, done, info = env.step("finish[]")
-    if to_print:
-        print(info, "\n")
-    info["n_calls"] = n_calls
-    info["n_badcalls"] = n_badcalls
-    info["traj"] = full_prompt
-    return reward, info
+    return finish_episode(env, ep, to_print)
+
+
+def run_react_paired(
+    env: Any,
+    instruction: str,
+    max_steps: int = 8,
+    llm_fn: Optional[Callable[[str, List[str]], str]] = None,
+    max_raw_steps: int = 3,
+    max_context_chars: Optional[int] = None,
+    to_print: bool = True,
+    idx: Optional[int] = None,
+) -> Tuple[Tuple[int, Dict[str, Any]], Tuple[int, Dict[str, Any]], Optional[int]]:
+    """
+    Run the baseline and tokenized arms of one episode, sharing every step until tokenization
+    first changes the prompt. At that step the episode state is forked (env.snapshot() /
+    env.restore() of the env and its wrappers, prompt and counters copied) and each arm
+    continues on its own.
+    Returns ((reward, info) baseline, (reward, info) tokenized, fork step or None).
+    Each arm's info counts the shared prefix's LLM calls; info["shared_calls"] says how many.
+    """
+    if llm_fn is None:
+        llm_fn = llm
+    ep = start_episode(env, instruction, idx=idx, to_print=to_print)
+    fork_step = None
+    for i in range(1, max_steps + 1):
+        if compress_prompt(ep, True, max_raw_steps, max_context_chars) != ep.full_prompt:
+            fork_step = i
+            break
+        react_step(env, ep, i, llm_fn, False, max_raw_steps, max_context_chars, to_print)
+        if ep.done:
+            break
+    shared_calls = ep.n_calls
+    if fork_step is None:
+        reward, info = finish_episode(env, ep, to_print)
+        info["shared_calls"] = shared_calls
+        return (reward, info), (reward, dict(info)), None
+
+    snapshot = env.snapshot()
+    ep_tok = ep.copy()
+    arms = []
+    for arm_ep, use_tokenization in ((ep, False), (ep_tok, True)):
+        if use_tokenization:
+            env.restore(snapshot)
+        for i in range(fork_step, max_steps + 1):
+            react_step(env, arm_ep, i, llm_fn, use_tokenization, max_raw_steps, max_context_chars, to_print)
+            if arm_ep.done:
+                break
+        reward, info = finish_episode(env, arm_ep, to_print)
+        info["shared_calls"] = shared_calls
+        arms.append((reward, info))
+    return arms[0], arms[1], fork_step
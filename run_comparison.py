@@ -4,11 +4,13 @@ Comparison: ReAct (baseline) vs ReAct + trajectory tokenization.
 Runs HotpotQA and FEVER each with and without tokenization, prints EM table.
 Usage:
   export OPENAI_API_KEY=your_key
-  python run_comparison.py [--max_examples 5]
+  python run_comparison.py [--max_examples 5] [--paired | --interleave --concurrency 8]
+  python run_comparison.py --max_examples 500 --paired --early_stop [--alpha 0.05 --min_pairs 20]
 """
 import argparse
 import os
 import sys
+import time
 from types import SimpleNamespace
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -17,6 +19,150 @@ _bootstrap.setup(__file__)
 
 import run_hotpotqa
 import run_fever
+import react_loop
+import runner_common
+from executor import execute
+from llm_cache import LLMCache
+from online_metrics import MetricAggregator, PairedComparison
+from page_store import PageStore
+from react_loop import run_react_paired
+from trajlog import TrajectoryLogWriter
+
+
+def run_paired(task, args, name, early_stop=False, alpha=0.05, min_pairs=20):
+    """
+    Paired comparison on one env: both arms share every step until tokenization first changes
+    the prompt, then fork. With early_stop, examples stop once the difference is settled
+    (online_metrics.PairedComparison). Returns (baseline EM, tokenized EM, examples run).
+    """
+    env = task.build_env(args, log=False)
+    instruction = task.build_instruction(args)
+    idxs = runner_common.select_idxs(len(env), args)
+    stats = PairedComparison(name, alpha=alpha, min_pairs=min_pairs)
+    base_em, tok_em = [], []
+    n_forks = paired_calls = separate_calls = 0
+    for idx in idxs:
+        try:
+            (rb, ib), (rt, it), fork_step = run_react_paired(
+                env,
+                instruction,
+                max_steps=args.max_steps,
+                max_raw_steps=args.max_raw_steps,
+                max_context_chars=args.max_context_chars,
+                to_print=args.verbose,
+                idx=idx,
+            )
+        except Exception as e:
+            print(f"Error idx={idx}: {e}", file=sys.stderr)
+            rb, ib, rt, it, fork_step = 0, {"n_calls": 0, "shared_calls": 0}, 0, {"n_calls": 0}, None
+        base_em.append(ib.get("em", rb))
+        tok_em.append(it.get("em", rt))
+        stats.add("base", idx, base_em[-1], ib.get("f1"))
+        stats.add("tok", idx, tok_em[-1], it.get("f1"))
+        n_forks += fork_step is not None
+        separate_calls += ib["n_calls"] + it["n_calls"]
+        paired_calls += ib["n_calls"] + it["n_calls"] - ib["shared_calls"]
+        n = len(base_em)
+        print(f"Done {n}/{len(idxs)} | EM ReAct {sum(base_em)}/{n} | EM ReAct+Token {sum(tok_em)}/{n} | forked {n_forks} | "
+              f"diff {stats.diff.mean:+.3f}, e-value {stats.e_value():.2f}")
+        if early_stop and stats.settled():
+            print(f"Stopping early: difference settled (e-value >= {1 / alpha:g}); skipping {len(idxs) - n} examples")
+            break
+    env.close()
+    n = max(len(base_em), 1)
+    print(f"{name} | forked {n_forks}/{len(base_em)} episodes | LLM calls {paired_calls} (vs {separate_calls} unpaired)")
+    print(stats.summary())
+    return sum(base_em) / n, sum(tok_em) / n, len(base_em)
+
+
+class _TaskEnvs(dict):
+    """One worker's env per task, built on first use."""
+
+    def close(self):
+        for env in self.values():
+            env.close()
+
+
+def run_matrix(arms, concurrency=4, page_cache_mb=64, log_dir="trajs", early_stop=False, alpha=0.05, min_pairs=20, llm_fn=None):
+    """
+    Run every (arm, idx) episode of a (task, arm, params) matrix from one shared queue on
+    `concurrency` threads. All arms share one page cache and one LLM cache, so steps that are
+    identical across arms hit the model once. Each arm is a dict with "name", "task" (run_hotpotqa
+    or run_fever) and "args"; EM per arm is streamed as results arrive and returned by name.
+    Arms with a "pair" entry (comparison name, "base" or "tok") are paired by idx; with
+    early_stop, a comparison's remaining episodes are skipped once its difference is settled.
+    llm_fn defaults to react_loop.llm. Worker envs are closed when the run ends, even on error.
+    Logs go to log_dir/<arm>_<run id>.*.jsonl, so a later run never appends to an earlier one.
+    """
+    page_store = PageStore(page_cache_mb * 1024 * 1024) if page_cache_mb else None
+    llm_fn = LLMCache(llm_fn or react_loop.llm)
+    run_id = f"{int(time.time() * 1000)}-{os.getpid()}"
+    for arm in arms:
+        arm["instruction"] = arm["task"].build_instruction(arm["args"])
+        env = arm["task"].build_env(arm["args"], page_store=page_store, log=False)
+        arm["idxs"] = runner_common.select_idxs(len(env), arm["args"])
+        env.close()
+        arm["em"] = []
+        arm["metrics"] = MetricAggregator()
+        arm["writer"] = TrajectoryLogWriter(log_dir, f"{arm['name'].replace(' ', '_').replace('+', '_')}_{run_id}")
+    comparisons = {}
+    for arm in arms:
+        if arm.get("pair"):
+            group = arm["pair"][0]
+            comparisons.setdefault(group, PairedComparison(group, alpha=alpha, min_pairs=min_pairs))
+    stopped = set()
+    # Interleave arms so every arm's running EM fills in at the same pace.
+    jobs = []
+    for k in range(max(len(arm["idxs"]) for arm in arms)):
+        jobs += [(a, arm["idxs"][k]) for a, arm in enumerate(arms) if k < len(arm["idxs"])]
+
+    def run_job(envs, job):
+        a, idx = job
+        arm = arms[a]
+        if arm.get("pair") and arm["pair"][0] in stopped:
+            return None
+        key = (arm["task"].__name__, arm["args"].split)
+        if key not in envs:
+            envs[key] = arm["task"].build_env(arm["args"], page_store=page_store, log=False)
+        return runner_common.run_episode(envs[key], idx, arm["instruction"], arm["args"], llm_fn=llm_fn)
+
+    t0 = time.time()
+
+    def on_result(job, result):
+        if result is None:
+            return
+        arm = arms[job[0]]
+        r, info, record = result
+        arm["em"].append(info.get("em", r))
+        arm["metrics"].add_info(info, r)
+        if record is not None:
+            arm["writer"].write(record)
+        if arm.get("pair"):
+            group, side = arm["pair"]
+            stats = comparisons[group]
+            stats.add(side, job[1], arm["em"][-1], info.get("f1"))
+            if early_stop and group not in stopped and stats.settled():
+                stopped.add(group)
+                print(f"Stopping {group} early: difference settled after {stats.n_pairs} pairs")
+        progress = " | ".join(
+            "%s %d/%d EM=%.3f" % (a["name"], len(a["em"]), len(a["idxs"]), sum(a["em"]) / max(len(a["em"]), 1))
+            for a in arms
+        )
+        print(f"[{time.time() - t0:.0f}s] {progress}")
+
+    try:
+        execute(jobs, _TaskEnvs, run_job, workers=concurrency, on_result=on_result)  # closes every _TaskEnvs
+    finally:
+        for arm in arms:
+            arm["writer"].close()
+    for arm in arms:
+        print(f"{arm['name']} | n={len(arm['em'])} | {arm['metrics'].summary()} (95% CI)")
+    for stats in comparisons.values():
+        print(stats.summary())
+    print(f"LLM cache: {llm_fn.stats()}")
+    if page_store is not None:
+        print(f"Page cache: {page_store.stats()}")
+    return {arm["name"]: sum(arm["em"]) / len(arm["em"]) if arm["em"] else 0.0 for arm in arms}
 
 
 def main():
@@ -24,12 +170,30 @@ def main():
     parser.add_argument("--max_examples", type=int, default=5, help="Examples per task (use 500 for paper setting)")
     parser.add_argument("--seed", type=int, default=233)
     parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--paired", action="store_true",
+                        help="Share each episode between arms until tokenization changes the prompt, then fork")
+    parser.add_argument("--interleave", action="store_true",
+                        help="Run all four arms from one shared queue with shared page / LLM caches")
+    parser.add_argument("--concurrency", type=int, default=4, help="Global episode concurrency for --interleave")
+    parser.add_argument("--page_cache_mb", type=int, default=64, help="Shared page cache for --interleave (0 = off)")
+    parser.add_argument("--early_stop", action="store_true",
+                        help="With --paired / --interleave: stop a task once the EM difference is settled (sequential e-value test)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="False-stop rate of --early_stop")
+    parser.add_argument("--min_pairs", type=int, default=20, help="Never stop --early_stop before this many paired examples")
+    runner_common.add_profile_args(parser)
     args = parser.parse_args()
+    if args.early_stop and not (args.paired or args.interleave):
+        parser.error("--early_stop needs --paired or --interleave (the arms must run side by side)")
 
     if not (os.environ.get("OPENAI_API_KEY") or "").strip():
         print("Error: OPENAI_API_KEY is not set or empty. Set it to run comparison.", file=sys.stderr)
         sys.exit(1)
+    with runner_common.profile_run(args):
+        compare(args)
+
 
+def compare(args):
+    """Run the four arms for args (see main) and print the EM table."""
     base = SimpleNamespace(
         split="dev",
         max_examples=args.max_examples,
@@ -57,24 +221,46 @@ def main():
     print("ReAct vs ReAct + trajectory tokenization")
     print("=" * 60)
 
-    print("\n--- HotpotQA dev: ReAct (baseline) ---")
-    hotpot_baseline = run_hotpotqa.run_eval(base)
-    print("\n--- HotpotQA dev: ReAct + tokenization ---")
-    base.tokenize = True
-    hotpot_tokenize = run_hotpotqa.run_eval(base)
+    if args.interleave:
+        arms = [
+            {"name": "HotpotQA ReAct", "task": run_hotpotqa, "args": base, "pair": ("HotpotQA dev", "base")},
+            {"name": "HotpotQA ReAct+Token", "task": run_hotpotqa, "args": SimpleNamespace(**{**vars(base), "tokenize": True}),
+             "pair": ("HotpotQA dev", "tok")},
+            {"name": "FEVER ReAct", "task": run_fever, "args": fever_base, "pair": ("FEVER dev", "base")},
+            {"name": "FEVER ReAct+Token", "task": run_fever, "args": SimpleNamespace(**{**vars(fever_base), "tokenize": True}),
+             "pair": ("FEVER dev", "tok")},
+        ]
+        em = run_matrix(arms, concurrency=args.concurrency, page_cache_mb=args.page_cache_mb,
+                        early_stop=args.early_stop, alpha=args.alpha, min_pairs=args.min_pairs)
+        hotpot_baseline, hotpot_tokenize = em["HotpotQA ReAct"], em["HotpotQA ReAct+Token"]
+        fever_baseline, fever_tokenize = em["FEVER ReAct"], em["FEVER ReAct+Token"]
+        hotpot_n, fever_n = len(arms[0]["em"]), len(arms[2]["em"])
+    elif args.paired:
+        stop = dict(early_stop=args.early_stop, alpha=args.alpha, min_pairs=args.min_pairs)
+        print("\n--- HotpotQA dev: ReAct vs ReAct + tokenization (paired) ---")
+        hotpot_baseline, hotpot_tokenize, hotpot_n = run_paired(run_hotpotqa, base, "HotpotQA dev", **stop)
+        print("\n--- FEVER dev: ReAct vs ReAct + tokenization (paired) ---")
+        fever_baseline, fever_tokenize, fever_n = run_paired(run_fever, fever_base, "FEVER dev", **stop)
+    else:
+        hotpot_n = fever_n = args.max_examples
+        print("\n--- HotpotQA dev: ReAct (baseline) ---")
+        hotpot_baseline = run_hotpotqa.run_eval(base)
+        print("\n--- HotpotQA dev: ReAct + tokenization ---")
+        base.tokenize = True
+        hotpot_tokenize = run_hotpotqa.run_eval(base)
 
-    print("\n--- FEVER dev: ReAct (baseline) ---")
-    fever_baseline = run_fever.run_eval(fever_base)
-    print("\n--- FEVER dev: ReAct + tokenization ---")
-    fever_base.tokenize = True
-    fever_tokenize = run_fever.run_eval(fever_base)
+        print("\n--- FEVER dev: ReAct (baseline) ---")
+        fever_baseline = run_fever.run_eval(fever_base)
+        print("\n--- FEVER dev: ReAct + tokenization ---")
+        fever_base.tokenize = True
+        fever_tokenize = run_fever.run_eval(fever_base)
 
     print("\n" + "=" * 60)
-    print("Comparison (EM, n=%d per task)" % args.max_examples)
+    print("Comparison (EM, up to n=%d per task)" % args.max_examples)
     print("=" * 60)
-    print("%-25s %10s %10s" % ("", "ReAct", "ReAct+Token"))
-    print("%-25s %10.4f %10.4f" % ("HotpotQA dev", hotpot_baseline, hotpot_tokenize))
-    print("%-25s %10.4f %10.4f" % ("FEVER dev", fever_baseline, fever_tokenize))
+    print("%-25s %10s %10s %6s" % ("", "ReAct", "ReAct+Token", "n"))
+    print("%-25s %10.4f %10.4f %6d" % ("HotpotQA dev", hotpot_baseline, hotpot_tokenize, hotpot_n))
+    print("%-25s %10.4f %10.4f %6d" % ("FEVER dev", fever_baseline, fever_tokenize, fever_n))
     print("=" * 60)
 
 
@@ -5,30 +5,33 @@ Usage:
   python run_hotpotqa.py [--max_examples 500] [--tokenize] [--max_raw_steps 3] [--max_context_chars 32000]
 """
 import argparse
-import json
 import os
-import random
 import sys
-import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import _bootstrap
 _bootstrap.setup(__file__)
 
-import wikienv
-import wrappers
-from react_loop import run_react
+# runner_common / wrappers (gym, numpy, ...) are imported inside the functions below,
+# so a run submitted to eval_daemon.py with --daemon never pays for them.
+import eval_daemon
 
 
-def run_eval(args):
-    """Run evaluation; returns EM (float). Used by run_comparison.py."""
-    env = wikienv.WikiEnv()
+def build_env(args, page_store=None, cassette=None, log=True):
+    """WikiEnv -> HotPotQAWrapper -> LoggingWrapper for args (shared page_store / cassette optional)."""
+    import runner_common
+    import wrappers
+
+    env = runner_common.make_wiki_env(args, page_store=page_store, cassette=cassette)
     env = wrappers.HotPotQAWrapper(env, split=args.split)
-    env = wrappers.LoggingWrapper(env)
+    return runner_common.wrap_logging(env, args, log=log)
+
+
+def build_instruction(args):
+    """Instruction + few-shot examples for args.prompt_key."""
+    import runner_common
 
-    folder = os.path.join(os.path.dirname(__file__), "prompts")
-    with open(os.path.join(folder, "prompts_naive.json"), "r") as f:
-        prompt_dict = json.load(f)
+    prompt_dict = runner_common.load_prompts("prompts_naive.json")
     if args.prompt_key not in prompt_dict:
         args.prompt_key = "webthink_simple6"
     webthink_examples = prompt_dict[args.prompt_key]
@@ -42,55 +45,51 @@ def run_eval(args):
         "Here are some examples.\n"
     )
     instruction += webthink_examples
+    return instruction
+
+
+def run_eval(args, page_store=None, llm_fn=None):
+    """Run evaluation; returns EM (float). Used by run_comparison.py and eval_daemon.py."""
+    import runner_common
+
+    with runner_common.profile_run(args):
+        env = build_env(args, page_store=page_store)
+        instruction = build_instruction(args)
 
-    n_data = len(env)
-    idxs = list(range(n_data))
-    random.Random(args.seed).shuffle(idxs)
-    idxs = idxs[: args.max_examples]
-
-    results = []
-    infos = []
-    t0 = time.time()
-    for idx in idxs:
-        try:
-            r, info = run_react(
-                env,
-                instruction=instruction,
-                question="",
-                max_steps=args.max_steps,
-                use_tokenization=args.tokenize,
-                max_raw_steps=args.max_raw_steps,
-                max_context_chars=args.max_context_chars,
-                to_print=args.verbose,
-                idx=idx,
-            )
-        except Exception as e:
-            print(f"Error idx={idx}: {e}", file=sys.stderr)
-            r, info = 0, {"em": 0, "question_idx": idx}
-        results.append(info.get("em", r))
-        infos.append(info)
-        n_done = len(results)
-        em_sum = sum(results)
-        print(f"Done {n_done}/{len(idxs)} | EM so far: {em_sum}/{n_done} = {em_sum / n_done:.4f} | time: {(time.time() - t0) / n_done:.1f}s/sample")
+        idxs = runner_common.select_idxs(len(env), args)
+
+        results, _ = runner_common.evaluate(env, build_env, idxs, instruction, args, name=f"HotpotQA {args.split}", llm_fn=llm_fn)
+        env.close()
     total_em = sum(results)
-    print(f"\nHotpotQA {args.split} | n={len(results)} | EM = {total_em}/{len(results)} = {total_em / len(results):.4f}")
-    if args.tokenize:
-        print("(ReAct + trajectory tokenization)")
     return total_em / len(results) if results else 0.0
 
 
-def main():
-    parser = argparse.ArgumentParser(description="ReAct HotpotQA (baseline or + tokenization)")
+def build_parser():
+    import runner_common
+
+    parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description="ReAct HotpotQA (baseline or + tokenization)")
     parser.add_argument("--split", type=str, default="dev", choices=["dev", "train", "test"])
     parser.add_argument("--max_examples", type=int, default=500, help="Max dev examples to run")
     parser.add_argument("--tokenize", action="store_true", help="ReAct + trajectory tokenization")
     parser.add_argument("--max_raw_steps", type=int, default=3)
     parser.add_argument("--max_context_chars", type=int, default=32000)
+    parser.add_argument("--expandable", action="store_true",
+                        help="Let the agent fetch summarized steps in full with Expand[Step k] (use with a small --max_raw_steps)")
+    parser.add_argument("--compact_tokens", action="store_true",
+                        help="Denser summary tokens (#k thought|S:entity|obs, entity aliases, one-line legend)")
     parser.add_argument("--max_steps", type=int, default=8)
     parser.add_argument("--seed", type=int, default=233)
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--prompt_key", type=str, default="webthink_simple6")
-    args = parser.parse_args()
+    runner_common.add_env_args(parser)
+    return parser
+
+
+def main():
+    socket_path, argv = eval_daemon.daemon_arg(sys.argv[1:])
+    if socket_path:
+        return eval_daemon.submit(socket_path, "hotpotqa", argv)
+    args = build_parser().parse_args(argv)
     return run_eval(args)
 
 
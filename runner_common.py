@@ -0,0 +1,295 @@
+"""
+Shared pieces of run_hotpotqa.py / run_fever.py: env options, env construction,
+one-episode runner and the evaluation loop (serial or --workers N).
+Each task script provides build_env(args, page_store=None, cassette=None, log=True)
+and build_instruction(args) on top of these.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import wikienv
+import wrappers
+from cassette import Cassette, CassetteMissError
+from deadline import Guarded, HedgedCaller
+from executor import execute
+from online_metrics import MetricAggregator
+from profiling import profile, span
+from page_store import PageStore
+import react_loop
+from react_loop import run_react
+from eval_daemon import DEFAULT_SOCKET
+from sharding import default_results_path, parse_shard, shard_idxs, write_shard_results
+from trajlog import intern_prefix
+
+
+def add_env_args(parser: argparse.ArgumentParser) -> None:
+    """CLI options shared by the task runners (caching, logging, parallelism)."""
+    parser.add_argument("--prefetch_k", type=int, default=0, help="Prefetch top-k 'Similar:' titles on a search miss (0 = off)")
+    parser.add_argument("--prefetch_workers", type=int, default=2, help="Max concurrent prefetch requests")
+    parser.add_argument("--page_cache_mb", type=int, default=0, help="Compressed in-memory page cache budget in MB (0 = off)")
+    parser.add_argument("--log_dir", type=str, default="trajs", help="Folder for per-episode JSONL trajectory logs")
+    parser.add_argument("--log_compress", action="store_true", help="gzip trajectory log segments")
+    parser.add_argument("--log_max_mb", type=int, default=0, help="Rotate log segments at this size in MB (0 = never)")
+    parser.add_argument("--log_prompts", action="store_true",
+                        help="Also log each episode's final prompt (the shared instruction is stored once per log segment)")
+    parser.add_argument("--columnar", type=str, default=None, help="Write per-step columns to this .npz (see columnar.py)")
+    parser.add_argument("--cassette", type=str, default=None, help="Search cassette file (.jsonl.gz) to record to or replay from")
+    parser.add_argument("--cassette_mode", type=str, default="replay", choices=["record", "replay", "replay_live"],
+                        help="replay fails on a miss; replay_live falls back to live search")
+    parser.add_argument("--workers", type=int, default=1, help="Run episodes in parallel, one env stack per worker")
+    parser.add_argument("--backend", type=str, default="thread", choices=["thread", "process"])
+    parser.add_argument("--shard", type=str, default=None, help="Run only shard i/N of the shuffled idxs (merge with sharding.py)")
+    parser.add_argument("--results", type=str, default=None,
+                        help="Write per-example results JSON here (default with --shard: <log_dir>/shards/results_<task>_shard<i>of<N>.json)")
+    parser.add_argument("--daemon", type=str, nargs="?", const=DEFAULT_SOCKET, default=None,
+                        help="Submit the run to a warm eval_daemon.py on this Unix socket instead of running here")
+    parser.add_argument("--llm_timeout", type=float, default=None,
+                        help="Deadline per LLM call in seconds; a call that misses it ends the episode (scored 0)")
+    parser.add_argument("--search_timeout", type=float, default=None,
+                        help="Deadline per search in seconds; a miss is returned to the agent as a 'timed out' observation")
+    parser.add_argument("--hedge", type=str, nargs="+", default=[], choices=["llm", "search"],
+                        help="Send one duplicate request when a call outlives the recent --hedge_percentile latency")
+    parser.add_argument("--hedge_percentile", type=float, default=95.0)
+    parser.add_argument("--hedge_max_extra", type=float, default=0.1, help="Cap on hedged requests as a fraction of calls")
+    add_profile_args(parser)
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile", type=str, nargs="?", const="spans", default=None, choices=["spans", "sample"],
+                        help="Time named phases (dataset load, env reset/step, HTML parse, tokenization, LLM); "
+                             "'sample' also samples Python stacks. Process workers are not profiled")
+    parser.add_argument("--profile_out", type=str, default=None,
+                        help="Output prefix for .phases.txt/.phases.json/.folded (default <log_dir>/profile/profile)")
+    parser.add_argument("--profile_interval_ms", type=float, default=5.0, help="Sampling period for --profile sample")
+
+
+def profile_run(args):
+    """profiling.profile() context for --profile / --profile_out / --profile_interval_ms (no-op without --profile)."""
+    # a subfolder, so scoring / sweep / columnar never read the report as trajectory records
+    out = getattr(args, "profile_out", None) or os.path.join(getattr(args, "log_dir", "trajs"), "profile", "profile")
+    return profile(getattr(args, "profile", None), out, getattr(args, "profile_interval_ms", 5.0))
+
+
+@lru_cache(maxsize=None)
+def load_prompts(name: str) -> Dict[str, str]:
+    """prompts/<name> as a dict, read once per process."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", name), "r") as f:
+        return json.load(f)
+
+
+def make_cassette(args) -> Optional[Cassette]:
+    """Build the Cassette for --cassette/--cassette_mode, or None."""
+    path = getattr(args, "cassette", None)
+    if not path:
+        return None
+    mode = getattr(args, "cassette_mode", "replay")
+    if mode == "record":
+        return Cassette(path, mode="record")
+    return Cassette(path, mode="replay", on_miss="live" if mode == "replay_live" else "error")
+
+
+def make_page_store(args) -> Optional[PageStore]:
+    mb = getattr(args, "page_cache_mb", 0)
+    return PageStore(mb * 1024 * 1024) if mb else None
+
+
+def make_caller(name: str, args) -> Optional[HedgedCaller]:
+    """HedgedCaller for --<name>_timeout / --hedge <name>, or None when neither is set."""
+    timeout = getattr(args, f"{name}_timeout", None)
+    hedge = name in (getattr(args, "hedge", None) or [])
+    if not (timeout or hedge):
+        return None
+    return HedgedCaller(
+        name,
+        timeout=timeout,
+        hedge=hedge,
+        hedge_percentile=getattr(args, "hedge_percentile", 95.0),
+        max_extra=getattr(args, "hedge_max_extra", 0.1),
+    )
+
+
+def make_llm_fn(args, llm_fn: Optional[Callable[[str, List[str]], str]] = None) -> Optional[Callable[[str, List[str]], str]]:
+    """llm_fn (default react_loop.llm) under the --llm_timeout / --hedge llm policy; unchanged without them."""
+    caller = make_caller("llm", args)
+    if caller is None:
+        return llm_fn
+    if llm_fn is None:
+        llm_fn = partial(react_loop.llm, timeout=caller.timeout)
+    return Guarded(llm_fn, caller)
+
+
+def make_wiki_env(args, page_store: Optional[PageStore] = None, cassette: Optional[Cassette] = None) -> wikienv.WikiEnv:
+    """WikiEnv for args; page_store / cassette are built from args unless shared ones are passed."""
+    return wikienv.WikiEnv(
+        prefetch_k=getattr(args, "prefetch_k", 0),
+        prefetch_workers=getattr(args, "prefetch_workers", 2),
+        page_store=page_store if page_store is not None else make_page_store(args),
+        cassette=cassette if cassette is not None else make_cassette(args),
+        search_timeout=getattr(args, "search_timeout", None),
+        search_caller=make_caller("search", args),
+        owns_cassette=cassette is None,
+    )
+
+
+def wrap_logging(env: Any, args, log: bool = True) -> wrappers.LoggingWrapper:
+    """LoggingWrapper for args; log=False keeps per-episode records in memory only (worker envs)."""
+    return wrappers.LoggingWrapper(
+        env,
+        folder=getattr(args, "log_dir", "trajs") if log else None,
+        compress=getattr(args, "log_compress", False),
+        max_bytes=getattr(args, "log_max_mb", 0) * 1024 * 1024 or None,
+        record_on_done=not getattr(args, "log_prompts", False),
+    )
+
+
+def select_idxs(n_data: int, args) -> List[int]:
+    """The first args.max_examples indices of range(n_data) shuffled with args.seed (only shard i of N with --shard i/N)."""
+    idxs = list(range(n_data))
+    random.Random(args.seed).shuffle(idxs)
+    idxs = idxs[: args.max_examples]
+    shard = parse_shard(getattr(args, "shard", None))
+    return shard_idxs(idxs, *shard) if shard else idxs
+
+
+def run_episode(
+    env: Any,
+    idx: int,
+    instruction: str,
+    args,
+    llm_fn: Optional[Callable[[str, List[str]], str]] = None,
+) -> Tuple[Any, Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Run one episode; returns (reward, info, log record). Errors other than cassette misses score 0."""
+    try:
+        with span("episode"):
+            r, info = run_react(
+                env,
+                instruction=instruction,
+                question="",
+                max_steps=args.max_steps,
+                llm_fn=llm_fn,
+                use_tokenization=args.tokenize,
+                max_raw_steps=args.max_raw_steps,
+                max_context_chars=args.max_context_chars,
+                to_print=args.verbose,
+                idx=idx,
+                expandable=getattr(args, "expandable", False),
+                fmt="react_compact" if getattr(args, "compact_tokens", False) else "react",
+            )
+    except CassetteMissError:
+        raise
+    except Exception as e:
+        print(f"Error idx={idx}: {e}", file=sys.stderr)
+        r, info = 0, {"em": 0, "question_idx": idx}
+    record = None
+    if isinstance(env, wrappers.LoggingWrapper):
+        if getattr(args, "log_prompts", False) and "traj" in info:
+            env.traj["traj"] = info["traj"]
+        env.update_record()
+        record = env.last_record
+    return r, info, record
+
+
+def print_env_stats(env: Any) -> None:
+    wiki = env.unwrapped
+    if wiki.prefetch_issued:
+        t = wiki.get_time_info()
+        print(f"Prefetch: used {t['prefetch_used']}/{t['prefetch_issued']} = {t['prefetch_hit_rate']:.2%}")
+    if wiki.cassette is not None:
+        cs = wiki.cassette.stats()
+        print(f"Cassette ({cs['mode']}): {cs['entries']} entries, {cs['hits']} hits, {cs['misses']} misses")
+    if wiki.search_caller is not None:
+        print(wiki.search_caller.summary())
+    if wiki.page_store is not None:
+        ps = wiki.page_store.stats()
+        print(f"Page cache: {ps['entries']} pages, {ps['bytes'] / 2**20:.1f}/{ps['max_bytes'] / 2**20:.0f} MB, hit rate {ps['hit_rate']:.2%}")
+
+
+def _share_caller(build: Callable[[], Any], search_caller: Optional[HedgedCaller]) -> Any:
+    """Thread workers' envs share the main env's search deadline / hedging state and stats."""
+    env = build()
+    if search_caller is not None:
+        env.unwrapped.search_caller = search_caller
+    return env
+
+
+def evaluate(
+    env: Any,
+    build_env: Callable[..., Any],
+    idxs: List[int],
+    instruction: str,
+    args,
+    name: str,
+    llm_fn: Optional[Callable[[str, List[str]], str]] = None,
+) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Run idxs on env (or on --workers parallel env stacks built with build_env), printing
+    progress in idx order. Worker records are written through env's log in idx order.
+    llm_fn defaults to react_loop.llm (it must be picklable with --backend process).
+    Returns (per-episode EM list, infos).
+    """
+    workers = getattr(args, "workers", 1)
+    backend = getattr(args, "backend", "thread")
+    if getattr(args, "columnar", None) and not args.columnar.endswith(".npz"):
+        raise ValueError(f"--columnar must be a .npz path, got {args.columnar}")
+    wiki = env.unwrapped
+    if workers > 1 and backend == "process":
+        if wiki.cassette is not None and not wiki.cassette.replaying:
+            raise ValueError("--cassette_mode record needs --backend thread (one shared cassette file)")
+        make_env = partial(build_env, args, log=False)
+    else:
+        make_env = partial(_share_caller, partial(build_env, args, page_store=wiki.page_store, cassette=wiki.cassette, log=False), wiki.search_caller)
+    llm_fn = make_llm_fn(args, llm_fn)
+
+    results: List[Any] = []
+    infos: List[Dict[str, Any]] = []
+    metrics = MetricAggregator()
+    # process workers send back info["traj"] by prefix hash only, so intern the exact prefix episodes use
+    intern_prefix(react_loop.episode_instruction(instruction, getattr(args, "expandable", False)))
+    t0 = time.time()
+
+    def on_result(idx: int, result: Tuple[Any, Dict[str, Any], Optional[Dict[str, Any]]]) -> None:
+        r, info, record = result
+        if workers > 1 and record is not None:
+            env.log_record(record)
+        results.append(info.get("em", r))
+        infos.append(info)
+        metrics.add_info(info, r)
+        n_done = len(results)
+        print(f"Done {n_done}/{len(idxs)} | EM so far: {sum(results)}/{n_done} | {metrics.summary()} | time: {(time.time() - t0) / n_done:.1f}s/sample")
+
+    run_one = partial(run_episode, instruction=instruction, args=args, llm_fn=llm_fn)
+    if workers > 1:
+        execute(idxs, make_env, run_one, workers=workers, backend=backend, on_result=on_result)
+    else:
+        for idx in idxs:
+            on_result(idx, run_one(env, idx))
+
+    total_em, n = sum(results), len(results)
+    print(f"\n{name} | n={n} | EM = {total_em}/{n} = {f'{total_em / n:.4f}' if n else 'n/a'}")  # a shard may get no examples
+    print(f"{name} | {metrics.summary()} (95% CI)")
+    if args.tokenize:
+        print("(ReAct + trajectory tokenization)")
+    if isinstance(llm_fn, Guarded):
+        print(llm_fn.caller.summary())
+    if getattr(args, "columnar", None):
+        from columnar import ColumnarStore  # numpy / pyarrow only when columns are requested
+
+        ColumnarStore.from_episodes(infos).save(args.columnar)
+        print(f"Saved per-step columns to {args.columnar}")
+    print_env_stats(env)
+    shard = parse_shard(getattr(args, "shard", None))
+    results_path = getattr(args, "results", None)
+    if shard and not results_path:
+        results_path = default_results_path(getattr(args, "log_dir", "trajs"), name, shard)
+    if results_path:
+        env.write()
+        log_files = env.writer.paths if getattr(env, "writer", None) is not None else []
+        write_shard_results(results_path, name, args, len(env), idxs, infos, log_files, instruction=instruction)
+        print(f"Saved results to {results_path}")
+    return results, infos
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Answer normalization and EM/F1 scoring, per example and in batch.
+Also re-scores logged trajectories (LoggingWrapper JSONL) without re-running episodes.
+Usage:
+  python scoring.py trajs/ [--normalizer squad lower exact]
+"""
+import argparse
+import re
+import string
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+_ARTICLES = re.compile(r"\b(a|an|the)\b")
+_SPECIAL = ("yes", "no", "noanswer")
+ZERO_METRIC = (0.0, 0.0, 0.0)
+
+
+def normalize_answer(s: str) -> str:
+    """HotpotQA/SQuAD normalization: lowercase, drop punctuation and articles, squeeze whitespace."""
+    return " ".join(_ARTICLES.sub(" ", s.lower().translate(_PUNCT_TABLE)).split())
+
+
+def normalize_lower(s: str) -> str:
+    return " ".join(s.lower().split())
+
+
+def normalize_exact(s: str) -> str:
+    return s.strip()
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "squad": normalize_answer,
+    "lower": normalize_lower,
+    "exact": normalize_exact,
+}
+
+
+def f1_normalized(normalized_prediction: str, normalized_ground_truth: str) -> Tuple[float, float, float]:
+    """(f1, precision, recall) for already-normalized strings."""
+    if normalized_prediction in _SPECIAL and normalized_prediction != normalized_ground_truth:
+        return ZERO_METRIC
+    if normalized_ground_truth in _SPECIAL and normalized_prediction != normalized_ground_truth:
+        return ZERO_METRIC
+    prediction_tokens = normalized_prediction.split()
+    ground_truth_tokens = normalized_ground_truth.split()
+    common = Counter(prediction_tokens) & Counter(ground_truth_tokens)
+    num_same = sum(common.values())
+    if num_same == 0:
+        return ZERO_METRIC
+    precision = 1.0 * num_same / len(prediction_tokens)
+    recall = 1.0 * num_same / len(ground_truth_tokens)
+    f1 = (2 * precision * recall) / (precision + recall)
+    return f1, precision, recall
+
+
+def f1_score(prediction: str, ground_truth: str) -> Tuple[float, float, float]:
+    return f1_normalized(normalize_answer(prediction), normalize_answer(ground_truth))
+
+
+def score_batch(
+    predictions: Sequence[Optional[str]],
+    ground_truths: Sequence[str],
+    normalizer: Union[str, Callable[[str], str]] = "squad",
+) -> Dict[str, np.ndarray]:
+    """
+    EM and F1 arrays for aligned predictions / ground truths. Each distinct string is
+    normalized once; EM is one array comparison and F1 is only computed for non-matching
+    pairs. A None prediction (episode never answered) scores 0.
+    """
+    norm = NORMALIZERS[normalizer] if isinstance(normalizer, str) else normalizer
+    cache: Dict[str, str] = {}
+
+    def n(s: str) -> str:
+        out = cache.get(s)
+        if out is None:
+            out = cache[s] = norm(s)
+        return out
+
+    answered = np.array([p is not None for p in predictions], dtype=bool)
+    pred = np.array([n(p) if p is not None else "" for p in predictions], dtype=object)
+    gold = np.array([n(g) for g in ground_truths], dtype=object)
+    em = (pred == gold) & answered
+    f1 = np.where(em & (gold != ""), 1.0, 0.0)
+    for i in np.flatnonzero(answered & ~em):
+        f1[i] = f1_normalized(pred[i], gold[i])[0]
+    return {"em": em.astype(float), "f1": f1}
+
+
+def rescore_records(
+    records: Iterable[Dict[str, Any]],
+    normalizers: Sequence[str] = ("squad",),
+) -> Dict[str, Dict[str, float]]:
+    """Mean EM/F1 of logged episode records (those with a gt_answer) under each normalizer."""
+    preds: List[Optional[str]] = []
+    golds: List[str] = []
+    for rec in records:
+        if rec.get("gt_answer") is None:
+            continue
+        preds.append(rec.get("answer"))
+        golds.append(str(rec["gt_answer"]))
+    summary = {}
+    for name in normalizers:
+        scores = score_batch(preds, golds, normalizer=name)
+        summary[name] = {
+            "n": len(golds),
+            "em": float(scores["em"].mean()) if golds else 0.0,
+            "f1": float(scores["f1"].mean()) if golds else 0.0,
+        }
+    return summary
+
+
+def main():
+    from trajlog import iter_records
+
+    parser = argparse.ArgumentParser(description="Re-score logged trajectories under different normalization rules")
+    parser.add_argument("paths", nargs="+", help="Log files, folders or glob patterns")
+    parser.add_argument("--normalizer", nargs="+", default=["squad"], choices=sorted(NORMALIZERS))
+    args = parser.parse_args()
+    records = (rec for path in args.paths for rec in iter_records(path))
+    summary = rescore_records(records, normalizers=args.normalizer)
+    print("%-10s %8s %8s %8s" % ("normalizer", "n", "EM", "F1"))
+    for name, s in summary.items():
+        print("%-10s %8d %8.4f %8.4f" % (name, s["n"], s["em"], s["f1"]))
+
+
+if __name__ == "__main__":
+    main()
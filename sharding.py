@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Deterministic sharding of an evaluation run across nodes, and merging of shard results.
+A run with --shard i/N takes every N-th example (offset i) of the seeded shuffled idxs and
+writes a self-describing result file (run settings, shard, per-example results, log files).
+Merging checks that the shards cover the full run exactly once and reproduces the
+single-node EM/F1 summary and trajectory log order.
+Usage:
+  python run_hotpotqa.py --shard 0/4 ...   (on each node, i = 0..3)
+  python sharding.py merge trajs/shards/results_*.json --out merged.json --log_dir trajs_merged
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Settings that change episode results; missing ones (other task scripts, older files) are None.
+RESULT_KEYS = (
+    "tokenize", "max_steps", "max_raw_steps", "max_context_chars", "prompt_key",
+    "expandable", "compact_tokens", "llm_timeout", "search_timeout",
+)
+# Run settings that must agree across shards of the same run ("prompt" hashes the instruction text).
+RUN_KEYS = ("task", "split", "seed", "max_examples", "n_data", "num_shards") + RESULT_KEYS + ("prompt",)
+
+
+def parse_shard(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """ "i/N" -> (i, N); None -> None."""
+    if not spec:
+        return None
+    i, n = (int(x) for x in spec.split("/"))
+    if not 0 <= i < n:
+        raise ValueError(f"Bad shard {spec!r}: need 0 <= i < N")
+    return i, n
+
+
+def shard_idxs(idxs: Sequence[int], shard: int, num_shards: int) -> List[int]:
+    """Strided partition: balanced, deterministic, and independent of node count elsewhere."""
+    return list(idxs[shard::num_shards])
+
+
+def default_results_path(log_dir: str, task: str, shard: Tuple[int, int]) -> str:
+    """<log_dir>/shards/...: a subfolder, so trajectory log readers never take it for records."""
+    return os.path.join(log_dir, "shards", f"results_{task.replace(' ', '_')}_shard{shard[0]}of{shard[1]}.json")
+
+
+def write_shard_results(
+    path: str,
+    task: str,
+    args: Any,
+    n_data: int,
+    idxs: Sequence[int],
+    infos: Sequence[Dict[str, Any]],
+    log_files: Sequence[str],
+    instruction: Optional[str] = None,
+) -> None:
+    shard = parse_shard(getattr(args, "shard", None)) or (0, 1)
+    settings = {k: v for k, v in vars(args).items() if isinstance(v, (str, int, float, bool, type(None)))}
+    meta = {
+        "task": task,
+        "split": args.split,
+        "seed": args.seed,
+        "max_examples": args.max_examples,
+        "n_data": n_data,
+        "shard": shard[0],
+        "num_shards": shard[1],
+        "idxs": list(idxs),
+        "args": settings,
+    }
+    meta.update({k: getattr(args, k, None) for k in RESULT_KEYS})
+    meta["prompt"] = hashlib.sha1(instruction.encode("utf-8")).hexdigest()[:16] if instruction is not None else None
+    results = [
+        {
+            "idx": idx,
+            "em": float(info.get("em", 0) or 0),
+            "f1": float(info.get("f1", 0.0) or 0.0),
+            "answer": info.get("answer"),
+            "gt_answer": info.get("gt_answer"),
+            "n_calls": info.get("n_calls", 0),
+        }
+        for idx, info in zip(idxs, infos)
+    ]
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"meta": meta, "results": results, "log_files": list(log_files)}, f)
+    os.replace(tmp, path)
+
+
+def merge_shards(shard_files: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge loaded shard result files. Returns {"meta", "results" (single-node order), "problems", "mismatches"}.
+    Problems list mismatched settings, missing/duplicate shards and missing/duplicate/unexpected idxs;
+    mismatches holds just the settings ones (shards of different runs, never mergeable).
+    """
+    from runner_common import select_idxs
+
+    mismatches: List[str] = []
+    ref = shard_files[0]["meta"]
+    for sf in shard_files[1:]:
+        for k in RUN_KEYS:
+            if sf["meta"].get(k) != ref.get(k):
+                mismatches.append(f"shard {sf['meta']['shard']}: {k}={sf['meta'].get(k)!r} != {ref.get(k)!r}")
+    problems = list(mismatches)
+    shard_counts = Counter(sf["meta"]["shard"] for sf in shard_files)
+    problems += [f"shard {s} given {c} times" for s, c in sorted(shard_counts.items()) if c > 1]
+    problems += [f"shard {s}/{ref['num_shards']} missing" for s in range(ref["num_shards"]) if s not in shard_counts]
+
+    expected = select_idxs(ref["n_data"], SimpleNamespace(seed=ref["seed"], max_examples=ref["max_examples"]))
+    by_idx: Dict[int, Dict[str, Any]] = {}
+    counts: Counter = Counter()
+    for sf in shard_files:
+        for res in sf["results"]:
+            counts[res["idx"]] += 1
+            by_idx.setdefault(res["idx"], res)
+    expected_set = set(expected)
+    missing = [i for i in expected if i not in counts]
+    duplicates = sorted(i for i, c in counts.items() if c > 1)
+    unexpected = sorted(i for i in counts if i not in expected_set)
+    if missing:
+        problems.append(f"{len(missing)} idxs missing, e.g. {missing[:10]}")
+    if duplicates:
+        problems.append(f"{len(duplicates)} idxs duplicated, e.g. {duplicates[:10]}")
+    if unexpected:
+        problems.append(f"{len(unexpected)} idxs not in this run, e.g. {unexpected[:10]}")
+
+    meta = {k: ref.get(k) for k in RUN_KEYS}
+    meta["args"] = {k: v for k, v in ref["args"].items() if k != "shard"}
+    results = [by_idx[i] for i in expected if i in by_idx]
+    return {"meta": meta, "results": results, "problems": problems, "mismatches": mismatches}
+
+
+def merge_logs(shard_files: Sequence[Dict[str, Any]], order: Sequence[int], log_dir: str, file_id: str = "merged") -> int:
+    """Rewrite the shards' trajectory records into log_dir in single-node idx order. Returns count."""
+    from trajlog import TrajectoryLogWriter, iter_records
+
+    position = {idx: k for k, idx in enumerate(order)}
+    records: Dict[int, Dict[str, Any]] = {}
+    for sf in shard_files:
+        for rec in iter_records(sf["log_files"]):
+            idx = rec.get("question_idx")
+            if idx in position and idx not in records:
+                records[idx] = rec
+    writer = TrajectoryLogWriter(log_dir, file_id, flush_every=100)
+    for n, idx in enumerate(sorted(records, key=position.get)):
+        writer.write({**records[idx], "episode": n})
+    writer.close()
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge per-shard evaluation results")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_merge = sub.add_parser("merge")
+    p_merge.add_argument("files", nargs="+", help="Shard result files (results_*_shardIofN.json)")
+    p_merge.add_argument("--out", type=str, default=None, help="Write the merged result file here")
+    p_merge.add_argument("--log_dir", type=str, default=None, help="Write merged trajectory logs here")
+    p_merge.add_argument("--allow_partial", action="store_true",
+                         help="Summarize even if shards or idxs are missing (never with mismatched run settings)")
+    args = parser.parse_args()
+
+    shard_files = []
+    for path in args.files:
+        with open(path) as f:
+            shard_files.append(json.load(f))
+    merged = merge_shards(shard_files)
+    for p in merged["problems"]:
+        print(f"Problem: {p}", file=sys.stderr)
+    if merged["mismatches"] or (merged["problems"] and not args.allow_partial):
+        sys.exit(1)
+
+    results = merged["results"]
+    n = len(results)
+    em = sum(r["em"] for r in results)
+    f1 = sum(r["f1"] for r in results)
+    meta = merged["meta"]
+    print(f"{meta['task']} | n={n} | EM = {em:g}/{n} = {em / n if n else 0.0:.4f} | F1 = {f1 / n if n else 0.0:.4f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "results": results}, f)
+    if args.log_dir:
+        n_logged = merge_logs(shard_files, [r["idx"] for r in results], args.log_dir)
+        print(f"Merged {n_logged} trajectory records into {args.log_dir}")
+
+
+if __name__ == "__main__":
+    main()
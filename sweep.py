@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Offline parameter sweep for trajectory tokenization over recorded episodes.
+Replays every logged episode turn by turn the way react_step builds its prompts
+(compress once the prompt exceeds max_context_chars, then append the step) for each
+point of a max_raw_steps x max_thought x max_obs x max_context_chars x min_repeat_steps
+x fmt (summary encoding) grid, and reports per setting the chars / tokens saved, tokenize time, and how often
+the gold answer is in the episode's observations but missing from the prompt sent
+(the "gold drop" rate). Settings no other setting beats on both tokens saved and gold
+drops are marked as Pareto-optimal. No API key, env or network needed.
+Episodes come from LoggingWrapper logs (trajlog.iter_records); thoughts are recovered
+from the logged prompt (--log_prompts) of untokenized runs and are empty otherwise.
+Usage:
+  python sweep.py trajs/ --max_raw_steps 1,2,3 --max_obs 50,100 --max_context_chars 8000,16000,32000
+  python sweep.py trajs/ --task fever --workers 8 --backend process --out sweep.json
+"""
+import argparse
+import itertools
+import json
+import time
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from executor import execute
+from scoring import normalize_answer
+from trajectory_tokenizer import _SUMMARY_TOKEN, parse_react_steps, steps_to_full_text, tokenize_trajectory
+from trajlog import Trajectory, iter_records
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PARAMS = ("max_raw_steps", "max_thought", "max_obs", "max_context_chars", "min_repeat_steps", "fmt")
+# Gold answers that are labels or too short to locate in an observation.
+_UNLOCATABLE = {"yes", "no", "supports", "refutes", "not enough info"}
+_ENCODING: Any = None
+
+
+def count_tokens(text: str) -> int:
+    """cl100k_base tokens when tiktoken is installed, else about 4 chars per token."""
+    global _ENCODING
+    if tiktoken is not None and _ENCODING is None:
+        try:
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = False
+    if _ENCODING:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _step_text(i: int, step: Tuple[str, str, str]) -> str:
+    return steps_to_full_text([step], start_idx=i)
+
+
+def episode_from_record(record: Dict[str, Any], instruction: str = "") -> Optional[Dict[str, Any]]:
+    """
+    Replay episode {"prefix", "steps", "gold"} from a LoggingWrapper record (or a run_react
+    info with "step_log"); the instruction is taken from the logged prompt when there is one.
+    """
+    traj = record.get("traj")
+    if isinstance(traj, dict):
+        try:
+            traj = Trajectory.from_dict(traj)
+            str(traj)
+        except KeyError:
+            traj = None
+    if isinstance(traj, Trajectory):
+        instruction = traj.prefix
+    observations = [str(o) for o in record.get("observations", [])]
+    if "step_log" in record:
+        steps = [(s["thought"], s["action"], s["obs"]) for s in record["step_log"]]
+        question = str(traj.suffix).split("\n", 1)[0] if isinstance(traj, Trajectory) else (observations[:1] or [""])[0]
+    elif observations:
+        question = observations[0]
+        steps = [("", str(a), o.replace("\\n", "")) for a, o in zip(record.get("actions", []), observations[1:])]
+        if isinstance(traj, Trajectory):
+            body = traj.suffix.split("\n", 1)[1] if "\n" in traj.suffix else ""
+            parsed = [] if _SUMMARY_TOKEN.search(body) else parse_react_steps(body)
+            if len(parsed) == len(steps):
+                steps = [(t, a, o) for (t, _, _), (_, a, o) in zip(parsed, steps)]
+    else:
+        return None
+    if not steps:
+        return None
+    gold = normalize_answer(str(record.get("gt_answer") or ""))
+    return {
+        "prefix": instruction + question.strip() + "\n",
+        "steps": steps,
+        "gold": "" if gold in _UNLOCATABLE else gold,
+    }
+
+
+def load_episodes(records: Iterable[Dict[str, Any]], instruction: str = "") -> List[Dict[str, Any]]:
+    episodes = (episode_from_record(rec, instruction) for rec in records)
+    return [ep for ep in episodes if ep is not None]
+
+
+def _has_gold(text: str, gold: str) -> bool:
+    return f" {gold} " in f" {normalize_answer(text)} "
+
+
+class Replayer:
+    """Per-worker state: the episodes plus their uncompressed prompt lengths per turn (shared by every setting)."""
+
+    def __init__(self, episodes: Sequence[Dict[str, Any]]) -> None:
+        self.episodes = episodes
+        self.full: List[List[Tuple[int, int, bool]]] = []  # per turn: chars, tokens, gold seen so far
+        for ep in episodes:
+            chars, tokens, seen = len(ep["prefix"]), count_tokens(ep["prefix"]), False
+            turns = []
+            for i, step in enumerate(ep["steps"], 1):
+                turns.append((chars, tokens, seen))
+                text = _step_text(i, step)
+                chars += len(text)
+                tokens += count_tokens(text)
+                seen = seen or bool(ep["gold"]) and _has_gold(step[2], ep["gold"])
+            self.full.append(turns)
+
+    def close(self) -> None:
+        pass
+
+
+def replay(replayer: Replayer, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Replay every episode under params; returns totals for one grid point."""
+    out = dict(params)
+    totals = dict.fromkeys(
+        ("turns", "compressed", "full_chars", "sent_chars", "full_tokens", "sent_tokens", "gold_turns", "gold_dropped", "gold_episodes",
+         "drop_episodes"), 0)
+    tokenize_s = 0.0
+    for ep, full in zip(replayer.episodes, replayer.full):
+        prefix, prompt = ep["prefix"], ep["prefix"]
+        dropped = False
+        for i, (step, (full_chars, full_tokens, gold_seen)) in enumerate(zip(ep["steps"], full), 1):
+            sent_tokens = full_tokens
+            if len(prompt) > params["max_context_chars"]:
+                t0 = time.perf_counter()
+                compressed = tokenize_trajectory(
+                    prompt, prefix, max_raw_steps=params["max_raw_steps"], max_total_chars=params["max_context_chars"],
+                    max_thought=params["max_thought"], max_obs=params["max_obs"], min_repeat_steps=params["min_repeat_steps"], fmt=params["fmt"],
+                )
+                tokenize_s += time.perf_counter() - t0
+                if compressed != prompt:
+                    totals["compressed"] += 1
+                    prompt = compressed
+            if len(prompt) != full_chars:
+                sent_tokens = count_tokens(prompt)
+            totals["turns"] += 1
+            totals["full_chars"] += full_chars
+            totals["sent_chars"] += len(prompt)
+            totals["full_tokens"] += full_tokens
+            totals["sent_tokens"] += sent_tokens
+            if gold_seen:
+                totals["gold_turns"] += 1
+                if len(prompt) != full_chars and not _has_gold(prompt[len(prefix):], ep["gold"]):
+                    totals["gold_dropped"] += 1
+                    dropped = True
+            prompt += _step_text(i, step)
+        totals["gold_episodes"] += any(seen for _, _, seen in full)
+        totals["drop_episodes"] += dropped
+    out.update(totals)
+    out["chars_saved"] = 1 - totals["sent_chars"] / totals["full_chars"] if totals["full_chars"] else 0.0
+    out["tokens_saved"] = 1 - totals["sent_tokens"] / totals["full_tokens"] if totals["full_tokens"] else 0.0
+    out["gold_drop_rate"] = totals["gold_dropped"] / totals["gold_turns"] if totals["gold_turns"] else 0.0
+    out["tokenize_s"] = tokenize_s
+    out["tokenize_ms_per_call"] = 1000 * tokenize_s / totals["compressed"] if totals["compressed"] else 0.0
+    return out
+
+
+def pareto(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Mark each result "pareto" when no other result saves more tokens at no higher gold drop rate (or vice versa)."""
+    for r in results:
+        r["pareto"] = not any(
+            o["tokens_saved"] >= r["tokens_saved"] and o["gold_drop_rate"] <= r["gold_drop_rate"]
+            and (o["tokens_saved"] > r["tokens_saved"] or o["gold_drop_rate"] < r["gold_drop_rate"])
+            for o in results
+        )
+    return results
+
+
+def sweep(
+    episodes: Sequence[Dict[str, Any]],
+    grid: Dict[str, Sequence[Any]],
+    workers: int = 1,
+    backend: str = "thread",
+    on_result=None,
+) -> List[Dict[str, Any]]:
+    """Replay episodes at every point of grid (PARAMS -> values), one grid point per work item."""
+    points = [dict(zip(PARAMS, values)) for values in itertools.product(*(grid[p] for p in PARAMS))]
+    return pareto(execute(points, partial(Replayer, episodes), replay, workers=workers, backend=backend, on_result=on_result))
+
+
+def print_report(results: List[Dict[str, Any]], n_episodes: int) -> None:
+    r0 = results[0] if results else {}
+    print(f"{n_episodes} episodes, {r0.get('turns', 0)} turns, gold answer seen in {r0.get('gold_episodes', 0)} episodes "
+          f"({r0.get('gold_turns', 0)} turns); tokens {'cl100k_base' if _ENCODING else '~chars/4'}")
+    print("%1s %4s %5s %5s %7s %4s %-13s %9s %8s %8s %9s %9s %9s" % (
+        "", "raw", "thght", "obs", "ctx", "rep", "fmt", "compress", "chars%", "tokens%", "gold drop", "drop eps", "ms/call"))
+    for r in sorted(results, key=lambda r: (-r["tokens_saved"], r["gold_drop_rate"])):
+        print("%1s %4d %5d %5d %7d %4d %-13s %9d %7.1f%% %7.1f%% %8.1f%% %9d %9.2f" % (
+            "*" if r["pareto"] else "", r["max_raw_steps"], r["max_thought"], r["max_obs"], r["max_context_chars"],
+            r["min_repeat_steps"], r["fmt"], r["compressed"], 100 * r["chars_saved"], 100 * r["tokens_saved"],
+            100 * r["gold_drop_rate"], r["drop_episodes"], r["tokenize_ms_per_call"]))
+    print("* = Pareto-optimal (tokens saved vs gold drop rate)")
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep tokenization settings over logged trajectories (no API)")
+    parser.add_argument("paths", nargs="+", help="Log files, folders or glob patterns")
+    parser.add_argument("--task", default="hotpotqa", choices=["hotpotqa", "fever"],
+                        help="Instruction for logs without --log_prompts prompts")
+    parser.add_argument("--prompt_key", default=None, help="Few-shot prompt key (default: the task's default)")
+    parser.add_argument("--max_raw_steps", type=_ints, default=[1, 2, 3])
+    parser.add_argument("--max_thought", type=_ints, default=[60])
+    parser.add_argument("--max_obs", type=_ints, default=[50, 100])
+    parser.add_argument("--max_context_chars", type=_ints, default=[8000, 16000, 32000])
+    parser.add_argument("--min_repeat_steps", type=_ints, default=[3])
+    parser.add_argument("--fmt", type=lambda s: s.split(","), default=["react"], help="Summary encodings, e.g. react,react_compact")
+    parser.add_argument("--max_episodes", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", default="thread", choices=["thread", "process"])
+    parser.add_argument("--out", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    from types import SimpleNamespace
+
+    if args.task == "hotpotqa":
+        import run_hotpotqa as task
+    else:
+        import run_fever as task
+    instruction = task.build_instruction(SimpleNamespace(prompt_key=args.prompt_key or ""))
+    records = (rec for path in args.paths for rec in iter_records(path))
+    episodes = load_episodes(itertools.islice(records, args.max_episodes), instruction)
+    if not episodes:
+        parser.error("No episodes found in " + " ".join(args.paths))
+    grid = {p: getattr(args, p) for p in PARAMS}
+    n_points = 1
+    for values in grid.values():
+        n_points *= len(values)
+    t0 = time.time()
+    done = []
+
+    def on_result(point, result):
+        done.append(result)
+        print(f"[{time.time() - t0:.1f}s] {len(done)}/{n_points} " + " ".join(f"{k}={point[k]}" for k in PARAMS))
+
+    results = sweep(episodes, grid, workers=args.workers, backend=args.backend, on_result=on_result)
+    print_report(results, len(episodes))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"n_episodes": len(episodes), "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
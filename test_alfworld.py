@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Unit test for the text-only ALFWorld env and the ALFWorld ReAct loop (no API call)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from alfworld_env import NOTHING, AlfworldTextEnv, few_shot_instruction
+from react_loop import run_react_alfworld
+
+
+def scripted_llm(env, detours=20):
+    """LLM stand-in: searches receptacles (long trajectory), thinks, then plays the solution."""
+    plan = []
+    for r in env.receptacles[:detours]:
+        plan += [f"go to {r}"] + ([f"open {r}", f"close {r}"] if r in env.openable else [])
+    plan += ["think: Now I know the room. Next, I solve the task."] + env.solution()
+
+    def llm_fn(prompt, stop):
+        return " " + plan.pop(0)
+
+    return llm_fn
+
+
+class TestAlfworld(unittest.TestCase):
+    """Tests for AlfworldTextEnv and run_react_alfworld with tokenization."""
+
+    def test_solutions_win(self):
+        env = AlfworldTextEnv()
+        for idx in range(50):
+            env.reset(idx=idx)
+            for cmd in env.solution():
+                obs, reward, done, info = env.step(cmd)
+                self.assertNotEqual(obs, NOTHING, (idx, cmd))
+            self.assertTrue(done and info["won"] and reward == 1.0)
+        self.assertEqual(env.step("fly to the moon")[0], NOTHING)
+
+    def test_react_loop_with_tokenization(self):
+        env = AlfworldTextEnv()
+        env.reset(idx=7)
+        instruction = few_shot_instruction(env.task_type)
+        llm_fn = scripted_llm(env)
+        r, info = run_react_alfworld(
+            env, instruction, max_steps=80, llm_fn=llm_fn, use_tokenization=True,
+            max_raw_steps=3, max_context_chars=len(instruction) + 1500, to_print=False, idx=7,
+        )
+        self.assertEqual(r, 1.0)
+        self.assertIn("[Step 1] [go to ", info["traj"])
+        compressed = [s for s in info["step_log"] if s["context_chars"] < s["prompt_chars"]]
+        self.assertTrue(compressed)
+        self.assertTrue(all(s["context_chars"] < s["prompt_chars"] for s in compressed))
+        self.assertIn("[Step 2] [", info["traj"])  # tokens from earlier compressions are kept
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Unit test for search record / replay cassettes (no network)."""
+import gzip
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from cassette import Cassette, CassetteMissError
+from runner_common import make_cassette
+from wikienv import WikiEnv
+
+PAGES = {
+    "Alpha": "<p>Alpha is the first letter of the Greek alphabet. It is used in many fields.</p>",
+    "Beta": '<div class="mw-search-result-heading">Beta decay</div><div class="mw-search-result-heading">Beta (finance)</div>',
+    "Gamma": "<p>Gamma is the third letter of the Greek alphabet. It follows beta.</p>",
+}
+
+
+class StubWiki(WikiEnv):
+    """WikiEnv whose HTTP fetch serves PAGES, or fails when live search is not allowed."""
+
+    def __init__(self, live=True, **kwargs):
+        super().__init__(**kwargs)
+        self.live = live
+        self.fetched = []
+
+    def fetch_search(self, entity):
+        if not self.live:
+            raise AssertionError(f"network access for {entity!r}")
+        self.fetched.append(entity)
+        return PAGES[entity]
+
+
+def search(env, entity):
+    env.reset()
+    return env.step(f"search[{entity}]")[0]
+
+
+class TestCassette(unittest.TestCase):
+    """Tests for record then replay, strict and live misses, the gzip file and stats()."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sub", "searches.jsonl.gz")
+        env = StubWiki(cassette=Cassette(self.path, mode="record"))
+        self.recorded = {entity: search(env, entity) for entity in ("Alpha", "Beta")}
+        env.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_record_then_replay_offline(self):
+        self.assertIn("first letter", self.recorded["Alpha"])
+        self.assertIn("Similar: ['Beta decay', 'Beta (finance)']", self.recorded["Beta"])
+        env = StubWiki(live=False, cassette=Cassette(self.path))
+        for entity, obs in self.recorded.items():
+            self.assertEqual(search(env, entity), obs)
+        self.assertEqual(env.cassette.stats(), {"mode": "replay", "entries": 2, "hits": 2, "misses": 0})
+        self.assertEqual(env.num_searches, 0)
+
+    def test_strict_miss(self):
+        env = StubWiki(live=False, cassette=Cassette(self.path))
+        with self.assertRaises(CassetteMissError):
+            search(env, "Gamma")
+        self.assertEqual(env.cassette.stats()["misses"], 1)
+        with self.assertRaises(FileNotFoundError):
+            Cassette(os.path.join(self.tmp.name, "missing.jsonl.gz"))
+
+    def test_replay_live_fallback(self):
+        cassette = make_cassette(SimpleNamespace(cassette=self.path, cassette_mode="replay_live"))
+        env = StubWiki(cassette=cassette)
+        self.assertEqual(search(env, "Alpha"), self.recorded["Alpha"])
+        self.assertIn("third letter", search(env, "Gamma"))
+        self.assertEqual(env.fetched, ["Gamma"])
+        self.assertEqual(cassette.stats(), {"mode": "replay", "entries": 2, "hits": 1, "misses": 1})  # replay never writes
+
+    def test_gzip_round_trip(self):
+        cassette = Cassette(self.path, mode="record")  # appends to the existing recording
+        cassette.record("Zürich", ["page", "Zürich is a city.\n"])
+        cassette.record("Alpha", ["page", "ignored: already recorded"])
+        cassette.close()
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            self.assertEqual(sum(1 for line in f if line.strip()), 3)
+        entries = Cassette.load(self.path)
+        self.assertEqual(entries["Zürich"], ["page", "Zürich is a city.\n"])
+        self.assertEqual(entries["Alpha"][0], "page")
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:-10])  # interrupted recording
+        self.assertEqual(sorted(Cassette.load(self.path))[:2], ["Alpha", "Beta"])  # the first session survives
+
+    def test_stats_under_concurrent_gets(self):
+        cassette = Cassette(self.path, on_miss="live")
+
+        def lookups():
+            for _ in range(2000):
+                cassette.get("Alpha")
+                cassette.get("Gamma")
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual((cassette.stats()["hits"], cassette.stats()["misses"]), (16000, 16000))
+
+    def test_shared_cassette_outlives_worker_env(self):
+        cassette = Cassette(os.path.join(self.tmp.name, "shared.jsonl.gz"), mode="record")
+        worker = StubWiki(cassette=cassette, owns_cassette=False)
+        search(worker, "Gamma")
+        worker.close()
+        cassette.record("Alpha", ["page", "still recording"])
+        cassette.close()
+        self.assertEqual(sorted(Cassette.load(cassette.path)), ["Alpha", "Gamma"])
+
+
+if __name__ == "__main__":
+    unittest.main()
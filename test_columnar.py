@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Unit test for the columnar trajectory store (no API call)."""
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from columnar import ACTION_TYPES, ColumnarStore
+
+
+def make_infos():
+    step_log = [
+        {"step": 1, "thought": "look it up", "action": "search[Alpha]", "obs": "Alpha is a letter.", "prompt_chars": 100, "context_chars": 100, "llm_time": 0.5, "env_time": 0.1, "reward": 0.0},
+        {"step": 2, "thought": "done", "action": "finish[yes]", "obs": "Episode finished, reward = 1", "prompt_chars": 200, "context_chars": 100, "llm_time": 0.25, "env_time": 0.0, "reward": 1.0},
+    ]
+    return [
+        {"step_log": step_log, "question_idx": 7, "em": 1, "f1": 1.0},
+        # LoggingWrapper record: the first observation is the question
+        {"observations": ["Question: q?", "Alpha is a letter.", "Nothing."], "actions": ["search[Alpha]", "lookup[z]"], "question_idx": 9, "em": 0, "f1": 0.25},
+    ]
+
+
+class TestColumnarStore(unittest.TestCase):
+    """Tests for from_episodes, the .npz round-trip and the aggregations."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ColumnarStore.from_episodes(make_infos())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_from_episodes(self):
+        s = self.store
+        self.assertEqual(len(s), 4)
+        self.assertEqual(s.steps["episode"].tolist(), [0, 0, 1, 1])
+        self.assertEqual([ACTION_TYPES[c] for c in s.steps["action_type"]], ["search", "finish", "search", "lookup"])
+        self.assertEqual(s.steps["prompt_chars"].tolist(), [100, 200, -1, -1])
+        self.assertEqual(s.text("obs", 0), "Alpha is a letter.")
+        self.assertEqual(s.text("thought", 3), "")
+        self.assertEqual(s.steps["obs_id"][0], s.steps["obs_id"][2])  # repeated text is stored once
+        self.assertEqual(s.episodes["question_idx"].tolist(), [7, 9])
+        self.assertEqual(s.episodes["n_steps"].tolist(), [2, 2])
+
+    def test_save_load_round_trip(self):
+        path = os.path.join(self.tmp.name, "steps.npz")
+        self.store.save(path)
+        loaded = ColumnarStore.load(path)
+        for table in ("steps", "episodes"):
+            orig, back = getattr(self.store, table), getattr(loaded, table)
+            self.assertEqual(set(orig), set(back))
+            for k in orig:
+                np.testing.assert_array_equal(orig[k], back[k])
+                self.assertEqual(orig[k].dtype, back[k].dtype)
+        self.assertEqual([loaded.text("action", i) for i in range(len(loaded))], ["search[Alpha]", "finish[yes]", "search[Alpha]", "lookup[z]"])
+        with self.assertRaises(ValueError):
+            self.store.save(os.path.join(self.tmp.name, "steps.feather"))
+
+    def test_aggregations(self):
+        comp = self.store.compression_by_step()
+        self.assertEqual(comp["step"].tolist(), [1, 2])
+        self.assertEqual(comp["n"].tolist(), [1, 1])
+        np.testing.assert_allclose(comp["ratio"], [1.0, 0.5])
+        em = self.store.em_by_length()
+        self.assertEqual(em["n_steps"].tolist(), [2])
+        self.assertEqual(em["n"].tolist(), [2])
+        np.testing.assert_allclose(em["em"], [0.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
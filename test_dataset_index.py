@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Unit test for the memory-mapped dataset index (no API call)."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from dataset_index import index_path, load_dataset
+
+
+class TestDatasetIndex(unittest.TestCase):
+    """Tests for load_dataset on .json / .jsonl files and index rebuilds."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_json_and_jsonl(self):
+        rows = [{"question": "Who is Milhouse named after?", "answer": "Richard Nixon"},
+                {"question": "Ünïcode?", "answer": "yes"}]
+        json_file = os.path.join(self.tmp.name, "dev.json")
+        with open(json_file, "w") as f:
+            json.dump(rows, f)
+        data = load_dataset(json_file, fields=("question", "answer"))
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data[0], ("Who is Milhouse named after?", "Richard Nixon"))
+        self.assertEqual(data[-1], ("Ünïcode?", "yes"))
+        self.assertTrue(os.path.exists(index_path(json_file)))
+
+        jsonl_file = os.path.join(self.tmp.name, "dev.jsonl")
+        with open(jsonl_file, "w") as f:
+            f.write('{"claim": "Nikolaj is Danish.", "label": "SUPPORTS"}\n')
+        self.assertEqual(list(load_dataset(jsonl_file, fields=("claim", "label"))), [("Nikolaj is Danish.", "SUPPORTS")])
+
+    def test_stale_index_is_rebuilt(self):
+        data_file = os.path.join(self.tmp.name, "dev.jsonl")
+        with open(data_file, "w") as f:
+            f.write('{"claim": "a", "label": "SUPPORTS"}\n')
+        self.assertEqual(len(load_dataset(data_file, fields=("claim", "label"))), 1)
+        with open(data_file, "a") as f:
+            f.write('{"claim": "b", "label": "REFUTES"}\n')
+        data = load_dataset(data_file, fields=("claim", "label"))
+        self.assertEqual(data[1], ("b", "REFUTES"))
+        with self.assertRaises(IndexError):
+            data[2]
+
+    def test_index_for_other_fields_is_not_reused(self):
+        """An index built for (question, answer) is rebuilt, not misread, for (claim, label)."""
+        data_file = os.path.join(self.tmp.name, "mixed.jsonl")
+        with open(data_file, "w") as f:
+            f.write('{"question": "q?", "answer": "a", "claim": "c.", "label": "SUPPORTS"}\n')
+        self.assertEqual(load_dataset(data_file, fields=("question", "answer"))[0], ("q?", "a"))
+        data = load_dataset(data_file, fields=("claim", "label"))
+        self.assertEqual((data.fields, data[0]), (("claim", "label"), ("c.", "SUPPORTS")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Unit test for per-call deadlines and hedged requests against a local slow / flaky stub server."""
+import os
+import pickle
+import sys
+import threading
+import time
+import unittest
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from deadline import DeadlineExceeded, Guarded, HedgedCaller, percentile
+from wikienv import WikiEnv
+
+SLOW = 0.3
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Every slow_every-th request takes SLOW seconds; entities starting with "hang" take 3s."""
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get("search", [""])[0]
+        with self.server.lock:
+            self.server.count += 1
+            n = self.server.count
+        if query.startswith("hang"):
+            time.sleep(3)
+        elif self.server.slow_every and n % self.server.slow_every == 0:
+            time.sleep(SLOW)
+        body = f"<p>{query} is a fictional character in The Simpsons.</p>".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDeadline(unittest.TestCase):
+    """Tests for HedgedCaller deadlines / hedging and WikiEnv search timeouts."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.count = 0
+        self.server.slow_every = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/w/index.php?search={{}}"
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def fetch(self, query):
+        with urllib.request.urlopen(self.url.format(urllib.parse.quote(query)), timeout=5) as r:
+            return r.read().decode()
+
+    def test_deadline_and_errors(self):
+        caller = HedgedCaller("llm", timeout=0.2)
+        t0 = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            caller(self.fetch, "hang forever")
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertIn("Milhouse", caller(self.fetch, "Milhouse"))
+        with self.assertRaises(ValueError):
+            caller(int, "not a number")
+        self.assertEqual({k: caller.stats()[k] for k in ("calls", "timeouts", "errors")}, {"calls": 3, "timeouts": 1, "errors": 1})
+        clone = pickle.loads(pickle.dumps(Guarded(int, caller)))
+        self.assertEqual((clone.caller.timeout, clone.caller.calls), (0.2, 0))
+
+    def test_hedging_cuts_tail_within_budget(self):
+        self.server.slow_every = 10
+        plain = HedgedCaller("plain")
+        hedged = HedgedCaller("hedged", hedge=True, hedge_percentile=80, max_extra=0.2, min_samples=10)
+        plain_lat, hedged_lat = [], []
+        for caller, lat in ((plain, plain_lat), (hedged, hedged_lat)):
+            for i in range(60):
+                t0 = time.perf_counter()
+                caller(self.fetch, f"q{i}")
+                lat.append(time.perf_counter() - t0)
+        stats = hedged.stats()
+        self.assertGreaterEqual(percentile(plain_lat, 99), SLOW)
+        self.assertLess(percentile(hedged_lat[20:], 99), SLOW / 2)  # once the latency window is warm
+        self.assertGreater(stats["hedge_wins"], 0)
+        self.assertLessEqual(stats["hedges"], 0.2 * stats["calls"])
+
+    def test_search_timeout_is_an_observation(self):
+        env = WikiEnv(search_timeout=0.3)
+        env.search_url = self.url
+        t0 = time.perf_counter()
+        obs, _, done, _ = env.step("search[hang up]")
+        self.assertLess(time.perf_counter() - t0, 1.5)
+        self.assertIn("timed out", obs)
+        self.assertFalse(done)
+        self.assertEqual(env.get_time_info()["search_timeouts"], 1)
+        obs, _, _, _ = env.step("search[Milhouse]")
+        self.assertTrue(obs.startswith("Milhouse is a fictional character"))
+        env.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
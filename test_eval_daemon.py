@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Unit test for the eval daemon protocol over a Unix socket (no API call)."""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from eval_daemon import EvalDaemon, _Server, _ThreadOutput, request
+from executor import execute
+
+
+class EchoTask:
+    """Task module stand-in whose episodes print from --workers executor threads."""
+
+    @staticmethod
+    def build_parser():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--n", type=int, default=3)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--backend", default="thread")
+        return parser
+
+    @staticmethod
+    def run_eval(args, page_store=None, llm_fn=None):
+        def run_one(env, idx):
+            sys.stdout.write(f"episode {idx}\n")  # one write per line: print() from threads may interleave
+            sys.stderr.write(f"warning {idx}\n")
+            return idx
+
+        results = execute(range(args.n), io.StringIO, run_one, workers=args.workers)
+        print("finished")
+        return sum(results)
+
+
+class TestEvalDaemon(unittest.TestCase):
+    """Tests for submit / stream / result round-trips through _Server."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "eval.sock")
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _ThreadOutput(io.StringIO()), _ThreadOutput(io.StringIO())
+        daemon = EvalDaemon(page_cache_mb=0, llm_cache=False)
+        daemon.tasks = {"echo": EchoTask}
+        self.server = _Server(self.path, daemon)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(5)
+        self.server.server_close()
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        self.tmp.cleanup()
+
+    def run_job(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        reply = request(self.path, {"cmd": "run", "task": "echo", "argv": list(argv)}, out=out, err=err)
+        return reply, out.getvalue(), err.getvalue()
+
+    def test_round_trip(self):
+        for workers in ("1", "3"):
+            reply, out, err = self.run_job("--n", "5", "--workers", workers)
+            self.assertEqual((reply["exit"], reply["result"]), (0, 10))
+            self.assertEqual(sorted(out.splitlines()), sorted([f"episode {i}" for i in range(5)] + ["finished"]))
+            self.assertEqual(sorted(err.splitlines()), [f"warning {i}" for i in range(5)])
+        self.assertEqual(sys.stdout.default.getvalue() + sys.stderr.default.getvalue(), "")  # nothing leaked to the daemon
+
+    def test_errors_and_stats(self):
+        reply, _, err = self.run_job("--bogus")
+        self.assertEqual(reply["exit"], 2)
+        self.assertIn("unrecognized arguments", err)
+        self.assertEqual(request(self.path, {"cmd": "run", "task": "nope"}, out=io.StringIO())["exit"], 2)
+        stats = request(self.path, {"cmd": "stats"})["result"]
+        self.assertEqual((stats["jobs"], stats["failed"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Unit test for the parallel episode executor (no API call)."""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from executor import execute
+
+
+class MarkerEnv:
+    """Env that leaves an .open / .closed marker file per instance, so process workers can be checked too."""
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, f"{os.getpid()}-{threading.get_ident()}-{id(self)}")
+        open(self.path + ".open", "w").close()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        open(self.path + ".closed", "w").close()
+
+
+def run_one(env, item):
+    time.sleep(random.Random(item).random() * 0.01)  # finish out of order
+    assert not env.closed
+    return item * item, os.getpid()
+
+
+class TestExecute(unittest.TestCase):
+    """Tests for result ordering, on_result and env cleanup on every backend."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def markers(self, suffix):
+        return sorted(f[: -len(suffix)] for f in os.listdir(self.tmp.name) if f.endswith(suffix))
+
+    def check(self, workers, backend="thread"):
+        seen = []
+        results = execute(range(20), partial(MarkerEnv, self.tmp.name), run_one, workers=workers, backend=backend,
+                          on_result=lambda item, result: seen.append((item, result[0])))
+        self.assertEqual([r[0] for r in results], [i * i for i in range(20)])
+        self.assertEqual(seen, [(i, i * i) for i in range(20)])
+        opened = self.markers(".open")
+        self.assertTrue(1 <= len(opened) <= max(workers, 1))
+        self.assertEqual(self.markers(".closed"), opened)
+        return results
+
+    def test_serial(self):
+        self.check(1)
+
+    def test_threads(self):
+        self.check(4)
+
+    def test_processes(self):
+        results = self.check(2, backend="process")
+        self.assertNotIn(os.getpid(), {pid for _, pid in results})
+
+    def test_concurrent_calls_keep_their_envs(self):
+        """Two execute() calls at once each close only their own worker envs."""
+        errors = []
+
+        def run(folder):
+            try:
+                execute(range(10), partial(MarkerEnv, folder), run_one, workers=3)
+            except Exception as e:
+                errors.append(e)
+
+        folders = [os.path.join(self.tmp.name, str(i)) for i in range(2)]
+        threads = [threading.Thread(target=run, args=(f,)) for f in folders]
+        for folder, t in zip(folders, threads):
+            os.mkdir(folder)
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(errors, [])
+        for folder in folders:
+            files = os.listdir(folder)
+            self.assertEqual(sorted(f for f in files if f.endswith(".open")), sorted(f.replace(".closed", ".open") for f in files if f.endswith(".closed")))
+
+
+if __name__ == "__main__":
+    unittest.main()
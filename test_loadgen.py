@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Unit test for the synthetic load generator (mock LLM + synthetic env, no API call)."""
+import os
+import pickle
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from loadgen import MockLLM, SyntheticEnv, parse_dist, run_load
+
+
+class TestLoadgen(unittest.TestCase):
+    """Tests for parse_dist, MockLLM, SyntheticEnv and run_load."""
+
+    def test_parse_dist(self):
+        rng = random.Random(0)
+        self.assertEqual(parse_dist("0")(rng), 0.0)
+        self.assertEqual(parse_dist("const:5")(rng), 5.0)
+        self.assertTrue(all(2 <= parse_dist("uniform:2,3")(rng) <= 3 for _ in range(50)))
+        self.assertGreater(parse_dist("lognormal:100,0.5")(rng), 0)
+        with self.assertRaises(ValueError):
+            parse_dist("gamma:1,2")
+
+    def test_mock_llm_is_deterministic_and_picklable(self):
+        llm = MockLLM(parse_failure_rate=1.0, finish_prob=0.0, seed=3)
+        prompt = "Question: q\nThought 2:"
+        out = llm(prompt, ["\nObservation 2:"])
+        self.assertNotIn("\nAction 2: ", out)  # forced parse failure
+        self.assertEqual(out, pickle.loads(pickle.dumps(llm))(prompt, ["\nObservation 2:"]))
+        action = llm(prompt + out + "\nAction 2:", ["\n"])
+        self.assertRegex(action.strip(), r"^(Search|Lookup)\[.+\]$")
+        self.assertIn("Finish[", MockLLM(max_steps=1)("Thought 1:", []))
+
+    def test_synthetic_env_episode(self):
+        env = SyntheticEnv(obs_chars="const:600")
+        self.assertTrue(env.reset(idx=14).startswith("Question:"))
+        obs, _, done, _ = env.step("search[Foo]")
+        self.assertFalse(done)
+        self.assertGreater(len(obs), 300)
+        _, reward, done, info = env.step("finish[answer 0]")
+        self.assertTrue(done)
+        self.assertEqual((info["em"], info["question_idx"]), (1, 14))
+
+    def test_run_load_report(self):
+        report = run_load(
+            episodes=40, workers=4, llm=MockLLM(parse_failure_rate=0.2), instruction_chars=500,
+            tokenize=True, max_context_chars=2000,
+        )
+        self.assertEqual(report["episodes"], 40)
+        self.assertGreater(report["steps"], 40)
+        self.assertGreater(report["parse_retries"], 0)
+        self.assertEqual(report["llm_calls"], report["steps"] + report["parse_retries"])
+        self.assertGreater(report["steps_per_s"], 0)
+        self.assertLessEqual(report["episode_latency_s"]["p50"], report["episode_latency_s"]["p99"])
+        self.assertGreater(report["peak_rss_mb"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Unit test for streaming EM / F1 intervals and the paired early-stop rule (no API call)."""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from online_metrics import MetricAggregator, PairedComparison, RunningMean, sign_test_p, wilson_interval
+
+
+class TestOnlineMetrics(unittest.TestCase):
+    """Tests for Welford / Wilson intervals, pairing by idx and the sequential stop rule."""
+
+    def test_running_mean_and_wilson(self):
+        xs = [0.2, 0.9, 0.4, 0.4, 1.0]
+        m = RunningMean()
+        for x in xs:
+            m.add(x)
+        mean = sum(xs) / len(xs)
+        self.assertAlmostEqual(m.mean, mean)
+        self.assertAlmostEqual(m.var, sum((x - mean) ** 2 for x in xs) / (len(xs) - 1))
+        lo, hi = wilson_interval(0, 10)
+        self.assertEqual(lo, 0.0)
+        self.assertGreater(hi, 0.2)
+        lo, hi = wilson_interval(50, 100)
+        self.assertAlmostEqual(lo + hi, 1.0)
+        self.assertAlmostEqual(hi - lo, 0.19, places=2)
+
+    def test_aggregator_summary(self):
+        agg = MetricAggregator()
+        self.assertEqual(agg.summary(), "EM n/a")
+        agg.add_info({"em": 1, "f1": 1.0})
+        agg.add_info({"em": 0, "f1": 0.5})
+        agg.add_info({}, reward=1)
+        self.assertEqual(agg.n, 3)
+        self.assertAlmostEqual(agg.f1.mean, 2.5 / 3)
+        self.assertTrue(agg.summary().startswith("EM 0.6667 ["))
+
+    def test_pairs_by_idx_in_any_order(self):
+        pc = PairedComparison("t")
+        pc.add("tok", 3, 1)
+        pc.add("base", 1, 1)
+        self.assertEqual(pc.n_pairs, 0)
+        pc.add("base", 3, 0)
+        pc.add("tok", 1, 1)
+        self.assertEqual(pc.n_pairs, 2)
+        self.assertEqual((pc.b, pc.c), (0, 1))
+        self.assertAlmostEqual(pc.diff.mean, 0.5)
+
+    def test_settles_on_strong_difference(self):
+        pc = PairedComparison("t", alpha=0.05, min_pairs=20)
+        for idx in range(200):
+            pc.add("base", idx, int(idx % 4 == 0))
+            pc.add("tok", idx, 1)
+            if pc.settled():
+                break
+        self.assertTrue(pc.settled())
+        self.assertGreaterEqual(pc.stopped_at, 20)
+        self.assertLess(pc.stopped_at, 40)
+        self.assertIn("tokenized better", pc.summary())
+
+    def test_null_rarely_settles(self):
+        rng = random.Random(0)
+        false_stops = 0
+        for _ in range(200):
+            pc = PairedComparison("t", alpha=0.05, min_pairs=20)
+            for idx in range(300):
+                pc.add("base", idx, int(rng.random() < 0.5))
+                pc.add("tok", idx, int(rng.random() < 0.5))
+                if pc.settled():
+                    false_stops += 1
+                    break
+        self.assertLessEqual(false_stops, 10)
+
+    def test_sign_test(self):
+        self.assertEqual(sign_test_p(0, 0), 1.0)
+        self.assertAlmostEqual(sign_test_p(0, 5), 2 / 32)
+        self.assertEqual(sign_test_p(3, 3), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Unit test for the compressed page store (no network)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from page_store import PageStore
+
+
+class TestPageStore(unittest.TestCase):
+    """Tests for PageStore round-trip, LRU order and byte budget."""
+
+    def test_roundtrip_and_stats(self):
+        store = PageStore(max_bytes=10_000, codec="zlib")
+        page = "Milhouse Mussolini Van Houten is a recurring character in The Simpsons.\n" * 20
+        self.assertTrue(store.put("Milhouse", ["page", page]))
+        self.assertEqual(store.get("Milhouse"), ["page", page])
+        self.assertIsNone(store.get("Nixon"))
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertLess(stats["bytes"], stats["raw_bytes"])
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        store = PageStore(max_bytes=200, codec="none")
+        store.put("a", "x" * 80)
+        store.put("b", "y" * 80)
+        store.get("a")
+        store.put("c", "z" * 80)
+        self.assertIn("a", store)
+        self.assertNotIn("b", store)
+        self.assertLessEqual(store.nbytes, 200)
+        self.assertFalse(store.put("huge", "w" * 500))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Unit test for the --profile span / sampling profiler (no API call)."""
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+import profiling
+from loadgen import MockLLM, SyntheticEnv
+from profiling import Profiler, profile, span
+from react_loop import run_react
+
+
+class TestProfiling(unittest.TestCase):
+    """Tests for span nesting, phase stats, folded output and the runner phases."""
+
+    def test_spans_nest_and_fold(self):
+        self.assertIs(span("idle"), profiling._NULL_SPAN)
+        profiler = Profiler().start()
+        try:
+            with span("outer"):
+                time.sleep(0.02)
+                with span("inner"):
+                    time.sleep(0.03)
+        finally:
+            profiler.stop()
+        stats = profiler.stats()
+        self.assertEqual(stats["outer"]["calls"], 1)
+        self.assertGreaterEqual(stats["outer"]["total_s"], 0.05)
+        self.assertLess(stats["outer"]["self_s"], stats["outer"]["total_s"] - 0.025)
+        folded = dict(line.rsplit(" ", 1) for line in profiler.folded())
+        self.assertEqual(set(folded), {"outer", "outer;inner"})
+        self.assertGreaterEqual(int(folded["outer;inner"]), 30000)
+        self.assertIsNone(profiling._ACTIVE)
+
+    def test_runner_phases_and_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "prof", "run")
+            with profile("sample", out, interval_ms=1) as profiler:
+                for idx in range(5):
+                    run_react(SyntheticEnv(obs_chars="const:2000"), "Answer.\n", "", llm_fn=MockLLM(latency="const:2", finish_prob=0.0, max_steps=6),
+                              use_tokenization=True, max_raw_steps=1, max_context_chars=500, to_print=False, idx=idx)
+            phases = json.load(open(out + ".phases.json"))["phases"]
+            for name in ("env_reset", "env_step", "llm", "tokenize", "parse_react_steps", "summarize_steps"):
+                self.assertIn(name, phases)
+            self.assertGreater(profiler.n_samples, 0)
+            with open(out + ".folded") as f:
+                lines = f.read().split("\n")
+            self.assertTrue(any(line.startswith("llm;") and line.rsplit(" ", 1)[1].isdigit() for line in lines))
+            self.assertIn("parse_react_steps", open(out + ".phases.txt").read())
+
+    def test_default_output_stays_out_of_trajectory_logs(self):
+        from types import SimpleNamespace
+
+        from runner_common import profile_run
+        from trajlog import TrajectoryLogWriter, iter_records
+
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = TrajectoryLogWriter(tmp, "run")
+            with profile_run(SimpleNamespace(profile="spans", log_dir=tmp)):
+                writer.write({"episode": 0, "em": 1})
+            writer.close()
+            self.assertTrue(os.path.exists(os.path.join(tmp, "profile", "profile.phases.json")))
+            self.assertEqual(list(iter_records(tmp)), [{"episode": 0, "em": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
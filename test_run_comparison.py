@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Unit test for run_comparison.run_matrix on synthetic episodes (no API call)."""
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+import runner_common
+from loadgen import MockLLM, SyntheticEnv
+from run_comparison import run_matrix
+
+
+class SyntheticTask:
+    """Task module stand-in (build_env / build_instruction) that counts open envs."""
+
+    __name__ = "synthetic"
+
+    def __init__(self):
+        self.open_envs = 0
+
+    def build_env(self, args, page_store=None, log=True):
+        task = self
+
+        class Env(SyntheticEnv):
+            def close(self):
+                task.open_envs -= 1
+
+        self.open_envs += 1
+        return Env(n_data=500, obs_chars="uniform:100,600", seed=3)
+
+    def build_instruction(self, args):
+        return "Solve a synthetic question.\n"
+
+
+def make_args(tokenize):
+    return SimpleNamespace(split="dev", seed=233, max_examples=30, tokenize=tokenize, max_raw_steps=1,
+                           max_context_chars=800, max_steps=6, verbose=False)
+
+
+class TestRunMatrix(unittest.TestCase):
+    """Tests that interleaved arms match arm-by-arm runs and that every env is closed."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def arms(self, task):
+        return [{"name": f"arm {t}", "task": task, "args": make_args(t), "pair": ("synthetic", "tok" if t else "base")} for t in (False, True)]
+
+    def expected_em(self, task, args):
+        env = task.build_env(args)
+        instruction = task.build_instruction(args)
+        ems = []
+        for idx in runner_common.select_idxs(len(env), args):
+            r, info, _ = runner_common.run_episode(env, idx, instruction, args, llm_fn=MockLLM(n_answers=2, seed=1))
+            ems.append(info.get("em", r))
+        env.close()
+        return ems
+
+    def test_matches_non_interleaved(self):
+        task = SyntheticTask()
+        expected = {f"arm {t}": self.expected_em(task, make_args(t)) for t in (False, True)}
+        file_ids = set()
+        for concurrency in (1, 3):
+            arms = self.arms(task)
+            means = run_matrix(arms, concurrency=concurrency, page_cache_mb=0, log_dir=self.tmp.name, llm_fn=MockLLM(n_answers=2, seed=1))
+            for arm in arms:
+                self.assertEqual(arm["em"], expected[arm["name"]])
+                self.assertAlmostEqual(means[arm["name"]], sum(arm["em"]) / len(arm["em"]))
+                file_ids.add(arm["writer"].file_id)
+            self.assertEqual(task.open_envs, 0)
+        self.assertEqual(len(file_ids), 4)  # each run logs to its own files
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Unit test for answer normalization and batch scoring (no API call)."""
+import os
+import re
+import string
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from scoring import f1_score, normalize_answer, rescore_records, score_batch
+
+
+def reference_normalize(s):
+    """Original four-pass HotpotQA normalization."""
+    s = s.lower()
+    s = "".join(ch for ch in s if ch not in set(string.punctuation))
+    s = re.sub(r"\b(a|an|the)\b", " ", s)
+    return " ".join(s.split())
+
+
+class TestScoring(unittest.TestCase):
+    """Tests for normalize_answer, score_batch and rescore_records."""
+
+    def test_normalize_matches_reference(self):
+        for s in ["The Simpsons!", "  An  apple, a DAY ", "Richard M. Nixon", "t-he end", "yes", ""]:
+            self.assertEqual(normalize_answer(s), reference_normalize(s))
+
+    def test_score_batch_matches_per_example(self):
+        preds = ["Richard Nixon", "the Simpsons", "yes", None, "Paris, France", ""]
+        golds = ["Richard M. Nixon", "Simpsons", "no", "Nixon", "Paris", ""]
+        scores = score_batch(preds, golds)
+        for i, (p, g) in enumerate(zip(preds, golds)):
+            em = p is not None and normalize_answer(p) == normalize_answer(g)
+            f1 = f1_score(p, g)[0] if p is not None else 0.0
+            self.assertEqual(scores["em"][i], float(em))
+            self.assertAlmostEqual(scores["f1"][i], f1)
+
+    def test_rescore_records_by_normalizer(self):
+        records = [
+            {"answer": "The Simpsons", "gt_answer": "Simpsons"},
+            {"answer": "SUPPORTS", "gt_answer": "SUPPORTS"},
+            {"actions": ["search[x]"]},
+        ]
+        summary = rescore_records(records, normalizers=("squad", "exact"))
+        self.assertEqual(summary["squad"]["n"], 2)
+        self.assertEqual(summary["squad"]["em"], 1.0)
+        self.assertEqual(summary["exact"]["em"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
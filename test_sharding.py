@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Unit test for --shard partitioning and shard result merging (no API call)."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from runner_common import select_idxs
+from sharding import default_results_path, merge_logs, merge_shards, write_shard_results
+from trajlog import TrajectoryLogWriter, iter_records
+
+
+def make_args(shard=None, **kwargs):
+    return SimpleNamespace(**{"split": "dev", "seed": 233, "max_examples": 20, "shard": shard, "tokenize": False, **kwargs})
+
+
+class TestSharding(unittest.TestCase):
+    """Tests for select_idxs with --shard, merge_shards and merge_logs."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.full = select_idxs(100, make_args())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_shard(self, i, n, drop=(), instruction="Answer.\n", **kwargs):
+        args = make_args(f"{i}/{n}", **kwargs)
+        idxs = [idx for idx in select_idxs(100, args) if idx not in drop]
+        writer = TrajectoryLogWriter(os.path.join(self.tmp.name, f"logs{i}"), i)
+        infos = []
+        for idx in idxs:
+            info = {"em": idx % 2, "f1": (idx % 2) * 0.5, "answer": str(idx), "gt_answer": "x", "question_idx": idx}
+            writer.write({"observations": ["q"], "actions": ["finish[x]"], **info})
+            infos.append(info)
+        writer.close()
+        path = default_results_path(os.path.join(self.tmp.name, f"logs{i}"), "HotpotQA dev", (i, n))
+        write_shard_results(path, "HotpotQA dev", args, 100, idxs, infos, writer.paths, instruction=instruction)
+        with open(path) as f:
+            return json.load(f)
+
+    def test_shards_partition_full_run(self):
+        shards = [select_idxs(100, make_args(f"{i}/3")) for i in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(self.full))
+        self.assertLessEqual(max(map(len, shards)) - min(map(len, shards)), 1)
+
+    def test_merge_matches_single_node(self):
+        files = [self.run_shard(i, 3) for i in (2, 0, 1)]
+        merged = merge_shards(files)
+        self.assertEqual(merged["problems"], [])
+        # the results file sits next to the shard's logs without being read as a record
+        self.assertEqual(len(list(iter_records(os.path.join(self.tmp.name, "logs0")))), len(files[1]["results"]))
+        self.assertEqual([r["idx"] for r in merged["results"]], self.full)
+        self.assertEqual(sum(r["em"] for r in merged["results"]), sum(idx % 2 for idx in self.full))
+
+        out = os.path.join(self.tmp.name, "merged")
+        self.assertEqual(merge_logs(files, self.full, out), len(self.full))
+        records = list(iter_records(out))
+        self.assertEqual([r["question_idx"] for r in records], self.full)
+        self.assertEqual([r["episode"] for r in records], list(range(len(self.full))))
+
+    def test_merge_detects_missing_and_duplicates(self):
+        shard1 = self.run_shard(1, 3)
+        files = [self.run_shard(0, 3, drop=self.full[:1]), shard1, shard1]
+        problems = " | ".join(merge_shards(files)["problems"])
+        self.assertIn("shard 1 given 2 times", problems)
+        self.assertIn("shard 2/3 missing", problems)
+        self.assertIn("idxs missing", problems)
+        self.assertIn("idxs duplicated", problems)
+
+    def test_merge_rejects_mismatched_settings(self):
+        files = [self.run_shard(0, 3), self.run_shard(1, 3, tokenize=True), self.run_shard(2, 3, instruction="Other.\n", max_steps=5)]
+        merged = merge_shards(files)
+        mismatches = " | ".join(merged["mismatches"])
+        self.assertIn("shard 1: tokenize=True != False", mismatches)
+        self.assertIn("shard 2: max_steps=5 != None", mismatches)
+        self.assertIn("shard 2: prompt=", mismatches)
+        self.assertEqual(len(merged["mismatches"]), 3)
+
+    def test_empty_shard_still_writes_results(self):
+        """--shard 7/8 of 5 examples runs nothing but still reports and writes its (empty) results."""
+        import runner_common
+        import wikienv
+
+        class TinyWiki(wikienv.WikiEnv):
+            data = [None] * 5
+
+        args = SimpleNamespace(split="dev", seed=233, max_examples=5, shard="7/8", log_dir=self.tmp.name, tokenize=False,
+                               max_steps=8, max_raw_steps=3, max_context_chars=1000, verbose=False)
+        env = runner_common.wrap_logging(TinyWiki(), args, log=False)
+        idxs = select_idxs(len(env), args)
+        self.assertEqual(idxs, [])
+        self.assertEqual(runner_common.evaluate(env, lambda *a, **k: None, idxs, "Answer.\n", args, name="HotpotQA dev"), ([], []))
+        with open(default_results_path(self.tmp.name, "HotpotQA dev", (7, 8))) as f:
+            shard = json.load(f)
+        self.assertEqual((shard["meta"]["shard"], shard["results"]), (7, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
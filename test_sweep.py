@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Unit test for the offline tokenization sweep over logged trajectories (no API call)."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from sweep import episode_from_record, load_episodes, sweep
+from trajectory_tokenizer import steps_to_full_text
+from trajlog import Trajectory, TrajectoryLogWriter, iter_records
+
+INSTRUCTION = "Solve a question answering task with interleaving Thought, Action, Observation steps.\n"
+
+
+def make_record(i, n_steps=8, gold_step=1, log_prompt=False):
+    """A LoggingWrapper-style record whose gold answer is 40-70 chars into observation gold_step."""
+    question = f"Question: Where was person {i} born?"
+    steps = []
+    for k in range(1, n_steps + 1):
+        obs = f"Entity {i} from source number {k} of many. " + ("He was born in Springfield Ohio. " if k == gold_step else "")
+        obs += f"Paragraph {k} about unrelated facts and dates. " * 15
+        steps.append((f"I should look at source {k} for person {i}.", f"search[Entity {i} {k}]", obs))
+    record = {
+        "observations": [question] + [s[2] for s in steps],
+        "actions": [s[1] for s in steps],
+        "gt_answer": "Springfield, Ohio",
+        "question_idx": i,
+    }
+    if log_prompt:
+        record["traj"] = Trajectory(INSTRUCTION + question + "\n" + steps_to_full_text(steps), INSTRUCTION)
+    return record
+
+
+class TestSweep(unittest.TestCase):
+    """Tests for episode recovery from logs, the replayed metrics and Pareto marking."""
+
+    def test_episode_from_logged_record(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = TrajectoryLogWriter(tmp, "run", flush_every=1)
+            writer.write(make_record(0, log_prompt=True))
+            writer.write(make_record(1))
+            writer.close()
+            episodes = load_episodes(iter_records(tmp), instruction="other instruction\n")
+        self.assertEqual(len(episodes), 2)
+        self.assertEqual(episodes[0]["prefix"], INSTRUCTION + "Question: Where was person 0 born?\n")
+        self.assertEqual(episodes[0]["steps"][2][0], "I should look at source 3 for person 0.")
+        self.assertEqual(episodes[1]["prefix"], "other instruction\nQuestion: Where was person 1 born?\n")
+        self.assertEqual(episodes[1]["steps"][2][0], "")
+        self.assertEqual(episodes[1]["gold"], "springfield ohio")
+        self.assertEqual(episode_from_record({"observations": ["Claim: x"], "actions": [], "gt_answer": "SUPPORTS"}), None)
+        self.assertEqual(episode_from_record({"observations": ["Claim: x", "o"], "actions": ["a"], "gt_answer": "SUPPORTS"})["gold"], "")
+
+    def test_sweep_metrics_and_pareto(self):
+        episodes = [episode_from_record(make_record(i, log_prompt=True)) for i in range(6)]
+        grid = {"max_raw_steps": [1, 3], "max_thought": [60], "max_obs": [50, 100], "max_context_chars": [3000, 10 ** 6],
+                "min_repeat_steps": [3], "fmt": ["react"]}
+        results = sweep(episodes, grid)
+        self.assertEqual(len(results), 8)
+        by_key = {(r["max_raw_steps"], r["max_obs"], r["max_context_chars"]): r for r in results}
+        off = by_key[(1, 50, 10 ** 6)]
+        self.assertEqual((off["compressed"], off["chars_saved"], off["gold_drop_rate"]), (0, 0.0, 0.0))
+        self.assertEqual(off["turns"], 48)
+        self.assertEqual(off["gold_turns"], 42)
+        tight = by_key[(1, 50, 3000)]
+        self.assertGreater(tight["tokens_saved"], 0.4)
+        self.assertGreater(tight["gold_drop_rate"], 0.5)
+        self.assertEqual(tight["drop_episodes"], 6)
+        keep_obs = by_key[(1, 100, 3000)]
+        self.assertEqual(keep_obs["gold_drop_rate"], 0.0)
+        self.assertLess(keep_obs["tokens_saved"], tight["tokens_saved"])
+        self.assertTrue(tight["pareto"] and keep_obs["pareto"])
+        self.assertFalse(off["pareto"])
+        parallel = sweep(episodes, grid, workers=3)
+        strip = lambda rs: [{k: v for k, v in r.items() if not k.startswith("tokenize")} for r in rs]
+        self.assertEqual(strip(parallel), strip(results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,7 +14,25 @@ from trajectory_tokenizer import (
     steps_to_full_text,
     tokenize_trajectory,
     count_steps_in_prompt,
+    format_step_token,
+    TrajectorySession,
+    parse_alfworld_steps,
+    alfworld_steps_to_text,
+    find_repeats,
+    expand_steps,
 )
+from react_loop import run_react
+
+
+def _scripted_llm(prompt, stop):
+    i = int(prompt.rsplit("Thought ", 1)[1].rstrip(":"))
+    return f" step {i}\nAction {i}: " + ("Finish[answer 0]" if i == 2 else f"Search[S{i}]")
+
+
+def _run_expandable(env, idx):
+    """Module-level (picklable) run_one for the process-backend test."""
+    return run_react(env, "Process-backend instruction.\n", "", llm_fn=_scripted_llm, use_tokenization=True,
+                     max_raw_steps=1, to_print=False, idx=idx, expandable=True)[1]
 
 
 class TestTrajectoryTokenizer(unittest.TestCase):
@@ -73,6 +91,167 @@ Observation 3: Episode finished.
         out = tokenize_trajectory(full, instruction, max_raw_steps=3)
         self.assertEqual(out, full)
 
+    def test_format_step_token_matches_tokenize_trajectory(self):
+        instruction = "Q: x?\n"
+        full = instruction + "".join(
+            f"Thought {i}: think {i}\nAction {i}: Search[e{i}]\nObservation {i}: obs {i}\n" for i in range(1, 4)
+        )
+        out = tokenize_trajectory(full, instruction, max_raw_steps=1)
+        self.assertIn(format_step_token(1, "think 1", "Search[e1]", "obs 1") + "\n", out)
+        self.assertIn(format_step_token(2, "think 2", "Search[e2]", "obs 2"), out)
+
+    def test_unreachable_budget_terminates(self):
+        instruction = "Q: x?\n"
+        full = instruction + "".join(
+            f"Thought {i}: {'t' * 200}\nAction {i}: Search[e{i}]\nObservation {i}: {'o' * 500}\n" for i in range(1, 6)
+        )
+        out = tokenize_trajectory(full, instruction, max_raw_steps=3, max_total_chars=10)
+        self.assertIn("Thought 5:", out)
+        self.assertNotIn("Thought 4:", out)
+
+    def test_session_matches_tokenize_trajectory(self):
+        """TrajectorySession renders the same prompt as re-tokenizing the full prompt every step."""
+        instruction = "Q: x?\n"
+        for kwargs in [{"max_raw_steps": 2}, {"max_raw_steps": 3, "max_total_chars": 900}, {"max_raw_steps": 3, "max_total_chars": 10}]:
+            session = TrajectorySession(instruction, **kwargs)
+            steps = []
+            for i in range(1, 9):
+                step = (f"think {i} " + "t" * (20 * i), f"Search[e{i}]", f"obs {i} " + "o" * (40 * i))
+                session.append(*step)
+                steps.append(step)
+                full = instruction + steps_to_full_text(steps)
+                self.assertEqual(session.render(), tokenize_trajectory(full, instruction, **kwargs))
+
+    def test_repeated_steps_collapse(self):
+        """A stuck loop (same action and observation, or a short cycle) becomes one annotated token."""
+        self.assertEqual(find_repeats(list("abbbbcdcdcde")), [(1, 5, 1), (5, 11, 2)])
+        self.assertEqual(find_repeats(list("abbc")), [])
+        self.assertEqual(find_repeats(list("abbbbc"), min_steps=0), [])
+        instruction = "Q: x?\n"
+        steps = [("Find the film.", "Search[Film]", "The Film is a 1999 drama. " * 10)]
+        steps += [(f"Try lookup again {i}.", "Lookup[director]", "No more results.") for i in range(2, 41)]
+        steps += [("Answer.", "Finish[unknown]", "Episode finished, reward = 0")]
+        full = instruction + steps_to_full_text(steps)
+        out = tokenize_trajectory(full, instruction, max_raw_steps=2)
+        self.assertIn("[Steps 2-39] [repeated 38x: Lookup[director] -> No more results.]", out)
+        self.assertIn("Thought 40:", out)
+        self.assertLess(len(out), len(tokenize_trajectory(full, instruction, max_raw_steps=2, min_repeat_steps=0)) / 5)
+        # Re-compressing a prompt that already holds a run token numbers on from its last step.
+        more = out + steps_to_full_text([("x", "Search[Y]", "y"), ("x", "Search[Z]", "z")], start_idx=42)
+        self.assertIn("[Step 42] [x | Search[Y] | y]", tokenize_trajectory(more, instruction, max_raw_steps=1))
+        session = TrajectorySession(instruction, max_raw_steps=2)
+        for step in steps:
+            session.append(*step)
+        self.assertEqual(session.render(), out)
+
+    def test_expand_summarized_step(self):
+        """expand[Step k] returns what compression truncated, on one line; run_react answers it without the env."""
+        store = {1: ("think", "search[A]", "long " * 50), 2: ("t2", "lookup[x]", "No more results.")}
+        self.assertIsNone(expand_steps(store, "search[Step 1]"))
+        self.assertIn("long " * 49, expand_steps(store, "expand[Step 1]"))
+        self.assertEqual(expand_steps(store, "Expand[Steps 1-2]").count("in full]"), 2)
+        self.assertIn("No step 7", expand_steps(store, "expand[step 7]"))
+        self.assertEqual(parse_react_steps("Thought 3: x\nAction 3: expand[Step 1]\nObservation 3: " + expand_steps(store, "expand[Step 1]"))[0][1], "expand[Step 1]")
+
+        from loadgen import SyntheticEnv
+        from react_loop import EXPAND_HINT, run_react
+
+        script = ["Search[Alpha]", "Search[Beta]", "Search[Gamma]", "Expand[Step 1]", "Finish[answer 0]"]
+
+        def llm_fn(prompt, stop):
+            i = int(prompt.rsplit("Thought ", 1)[1].rstrip(":"))
+            return f" step {i}\nAction {i}: {script[i - 1]}"
+
+        env = SyntheticEnv(obs_chars="const:900")
+        _, info = run_react(env, "Answer.\n", "", llm_fn=llm_fn, use_tokenization=True, max_raw_steps=1,
+                            max_context_chars=200, to_print=False, idx=0, expandable=True)
+        log = info["step_log"]
+        self.assertTrue(str(info["traj"]).startswith(EXPAND_HINT))
+        self.assertIn("[Step 1] [step 1 | search[Alpha] |", str(info["traj"]))
+        self.assertTrue(log[3]["obs"].startswith("[Step 1 in full]"))
+        self.assertIn(log[0]["obs"], log[3]["obs"])
+        self.assertEqual(env.steps, 4)  # the expand step never reached the env
+
+    def test_expandable_traj_from_process_workers(self):
+        """Process workers return info["traj"] by prefix hash; the parent interns the hinted prefix they used."""
+        from functools import partial
+
+        from executor import execute
+        from loadgen import SyntheticEnv
+        from react_loop import EXPAND_HINT, episode_instruction
+        from trajlog import intern_prefix
+
+        instruction = "Process-backend instruction.\n"
+        intern_prefix(episode_instruction(instruction, expandable=True))  # what runner_common.evaluate does
+        infos = execute(range(3), partial(SyntheticEnv, obs_chars="const:50"), _run_expandable, workers=2, backend="process")
+        for idx, info in enumerate(infos):
+            text = str(info["traj"])
+            self.assertTrue(text.startswith(EXPAND_HINT + instruction))
+            self.assertIn(f"Synthetic question {idx} ", text)
+
+    def test_alfworld_format(self):
+        """ALFWorld "> ..." transcripts parse into steps (thinks attach to the next command) and render back."""
+        prefix = "Your task is to: put some spraybottle on toilet.\n"
+        traj = (
+            "> think: First I need to find a spraybottle.\nOK.\n"
+            "> go to cabinet 1\nOn the cabinet 1, you see " + ", ".join(f"a cloth {i}" for i in range(1, 20)) + ".\n"
+            ">go to cabinet 2\nThe cabinet 2 is closed.\n"
+            "> open cabinet 2\nYou open the cabinet 2. In it, you see a spraybottle 2.\n"
+            "> take spraybottle 2 from cabinet 2\nYou pick up the spraybottle 2 from the cabinet 2.\n"
+        )
+        steps = parse_alfworld_steps(traj)
+        self.assertEqual(steps[0][:2], ("First I need to find a spraybottle.", "go to cabinet 1"))
+        self.assertEqual(steps[1][:2], ("", "go to cabinet 2"))
+        self.assertEqual(parse_alfworld_steps(alfworld_steps_to_text(steps)), steps)
+        out = tokenize_trajectory(prefix + traj, prefix, max_raw_steps=2, fmt="alfworld")
+        self.assertIn("[Step 1] [First I need to find a spraybottle. | go to cabinet 1 |", out)
+        self.assertIn("[Step 2] [go to cabinet 2 | The cabinet 2 is closed.]", out)
+        self.assertTrue(out.endswith(alfworld_steps_to_text(steps[2:])))
+        self.assertLess(len(out), len(prefix + traj))
+        self.assertEqual(tokenize_trajectory(prefix + traj, prefix, max_raw_steps=2), prefix + traj)  # not ReAct layout
+
+    def test_compact_format(self):
+        """react_compact: legend, action codes, ditto marks and entity aliases that survive re-compression."""
+        instruction = "Q: Where was the director of Blade Runner born?\n"
+        steps = [
+            ("I should search Blade Runner.", "Search[Blade Runner]", "Blade Runner is a 1982 film directed by Ridley Scott. " * 3),
+            ("Blade Runner was directed by Ridley Scott.", "Search[Ridley Scott]", "Sir Ridley Scott (born 1937) is an English director."),
+            ("Find his birthplace.", "Lookup[born]", "(Result 1 / 2) Scott was born in South Shields."),
+            ("Ridley Scott was born in South Shields.", "Lookup[born]", "(Result 1 / 2) Scott was born in South Shields."),
+            ("Done.", "Finish[South Shields]", "Episode finished, reward = 1"),
+        ]
+        full = instruction + steps_to_full_text(steps)
+        out = tokenize_trajectory(full, instruction, max_raw_steps=1, fmt="react_compact")
+        lines = out[len(instruction):].split("\n")
+        self.assertTrue(lines[0].startswith("Legend: "))
+        self.assertTrue(lines[0].endswith("; @1=Blade Runner; @2=Ridley Scott"))
+        self.assertEqual(lines[2], "#2 @1 was directed by @2.|S:@2|Sir @2 (born 1937) is an English director.")
+        self.assertEqual(lines[3], "#3 Find his birthplace.|L:born|(1/2) Scott was born in South Shields.")
+        self.assertEqual(lines[4], '#4 @2 was born in South Shields.|L:born|"')
+        self.assertIn("Thought 5: Done.", out)
+        self.assertLess(len(out), len(tokenize_trajectory(full, instruction, max_raw_steps=1)))
+        # A later pass keeps the legend's aliases, adds new ones and numbers on.
+        more = out + steps_to_full_text([("x", "Search[Gladiator film]", "Gladiator film by @2"), ("Gladiator film", "Search[Gladiator film]", "y")], start_idx=6)
+        again = tokenize_trajectory(more, instruction, max_raw_steps=1, fmt="react_compact")
+        self.assertEqual(again.count("Legend: "), 1)
+        self.assertIn("; @1=Blade Runner; @2=Ridley Scott; @3=Gladiator film\n", again)
+        self.assertIn("#6 x|S:@3|@3 by @2", again)
+        self.assertIn("#5 Done.|F:South Shields|", again)
+        # Entities only match whole words.
+        loop = [(f"t{i}", "Search[entity1]", f"entity1 and entity10 {i} " + "x" * 200) for i in range(3)]
+        compact = tokenize_trajectory("Q\n" + steps_to_full_text(loop), "Q\n", max_raw_steps=1, fmt="react_compact")
+        self.assertIn("#2 t1|S:@1|@1 and entity10 1", compact)
+        session = TrajectorySession(instruction, max_raw_steps=1, fmt="react_compact")
+        for step in steps:
+            session.append(*step)
+        self.assertEqual(session.render(), out)
+        # A legend with no step tokens yet (e.g. written by hand) numbers from 0 instead of failing.
+        legend_only = instruction + "Legend: S=search; @1=Blade Runner\n\n" + steps_to_full_text(steps)
+        fresh = tokenize_trajectory(legend_only, instruction, max_raw_steps=1, fmt="react_compact")
+        self.assertEqual(fresh.count("Legend: "), 1)
+        self.assertIn("#4 ", fresh)
+        self.assertIn("Thought 5: Done.", fresh)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Unit test for the tokenizer service protocol over a Unix socket (no API call)."""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from tokenizer_service import BatchingServer, TokenizerClient, TokenizerService
+from trajectory_tokenizer import steps_to_full_text, tokenize_trajectory
+
+
+class TestTokenizerService(unittest.TestCase):
+    """Tests for sessions, stateless tokenize and errors through TokenizerClient."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "tok.sock")
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def start():
+            state = BatchingServer(TokenizerService())
+            self.server = await asyncio.start_unix_server(state.handle_connection, self.path)
+            self.batcher = asyncio.ensure_future(state.batcher())
+            ready.set()
+
+        self.thread = threading.Thread(target=lambda: (self.loop.run_until_complete(start()), self.loop.run_forever()))
+        self.thread.start()
+        ready.wait(5)
+        self.client = TokenizerClient(self.path)
+
+    def tearDown(self):
+        self.client.close()
+
+        async def stop():
+            self.server.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.tmp.cleanup()
+
+    def test_session_append_matches_tokenize(self):
+        prefix = "Q: x?\n"
+        self.client.call("open", session="s1", prefix=prefix, max_raw_steps=1)
+        steps = []
+        for i in range(1, 5):
+            step = [f"think {i}", f"Search[e{i}]", f"obs {i}"]
+            steps.append(step)
+            reply = self.client.call("append", session="s1", steps=[step])
+            expected = tokenize_trajectory(prefix + steps_to_full_text(steps), prefix, max_raw_steps=1)
+            self.assertEqual(prefix + reply["context"], expected)
+            self.assertEqual(reply["n_steps"], i)
+        full = prefix + steps_to_full_text(steps)
+        self.assertEqual(self.client.call("tokenize", full_prompt=full, prefix=prefix, max_raw_steps=1)["prompt"], expected)
+
+    def test_errors(self):
+        with self.assertRaises(RuntimeError):
+            self.client.call("append", session="missing", steps=[])
+        self.client.call("open", session="s2", prefix="")
+        self.client.call("close", session="s2")
+        with self.assertRaises(RuntimeError):
+            self.client.call("append", session="s2", steps=[])
+        with self.assertRaises(RuntimeError):
+            self.client.call("nope")
+        self.assertEqual(self.client.call("stats")["errors"], 3)
+
+    def test_malformed_requests_keep_serving(self):
+        """Non-object requests and non-string step fields get an error reply; later requests still work."""
+        self.client.call("open", session="s3", prefix="")
+        for line in (b"[1]\n", b'{"op": "append", "session": "s3", "steps": [[1, 2, 3]]}\n', b"not json\n"):
+            self.client.file.write(line)
+            self.client.file.flush()
+            reply = json.loads(self.client.file.readline())
+            self.assertFalse(reply["ok"])
+        self.assertEqual(self.client.call("append", session="s3", steps=[["t", "a", "o"]])["n_steps"], 1)
+        self.assertEqual(self.client.call("stats")["errors"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Unit test for streaming trajectory logs (no API call)."""
+import gzip
+import json
+import os
+import pickle
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+import trajlog
+from trajlog import Trajectory, TrajectoryLogWriter, iter_records
+
+
+class TestTrajectoryLog(unittest.TestCase):
+    """Tests for TrajectoryLogWriter rotation, iter_records on truncated logs and shared prompt prefixes."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_rotation_and_lazy_read(self):
+        writer = TrajectoryLogWriter(self.tmp.name, "run", compress=True, flush_every=1, max_bytes=1)
+        for i in range(3):
+            writer.write({"episode": i, "actions": ["search[Milhouse]"], "em": i % 2})
+        writer.close()
+        self.assertEqual(len(writer.paths), 3)
+        self.assertTrue(all(p.endswith(".jsonl.gz") for p in writer.paths))
+        self.assertEqual([r["episode"] for r in iter_records(self.tmp.name)], [0, 1, 2])
+
+    def test_truncated_tail_is_skipped(self):
+        writer = TrajectoryLogWriter(self.tmp.name, "run", flush_every=100)
+        writer.write({"episode": 0})
+        writer.write({"episode": 1})
+        writer.close()
+        with open(writer.paths[0], "a") as f:
+            f.write('{"episode": 2, "acti')
+        self.assertEqual([r["episode"] for r in iter_records(writer.paths[0])], [0, 1])
+
+        gz_path = os.path.join(self.tmp.name, "crash.0000.jsonl.gz")
+        records = [{"episode": i, "obs": f"observation {i}: {random.Random(i).getrandbits(256)}"} for i in range(50)]
+        data = gzip.compress("".join(json.dumps(r) + "\n" for r in records).encode("utf-8"))
+        with open(gz_path, "wb") as f:
+            f.write(data[: len(data) // 2])
+        recovered = list(iter_records(gz_path))
+        self.assertTrue(0 < len(recovered) < 50)
+        self.assertEqual(recovered, records[: len(recovered)])
+
+    def test_folder_reads_only_trajectory_logs(self):
+        """Result / profile JSON next to the logs is skipped by folder expansion and rejected when named."""
+        writer = TrajectoryLogWriter(self.tmp.name, "run")
+        writer.write({"episode": 0})
+        writer.close()
+        with open(os.path.join(self.tmp.name, "7.json"), "w") as f:
+            json.dump([{"episode": "legacy"}], f)
+        stats = os.path.join(self.tmp.name, "profile.phases.json")
+        with open(stats, "w") as f:
+            json.dump({"mode": "spans", "phases": {}}, f)
+        self.assertEqual(list(iter_records(self.tmp.name)), [{"episode": "legacy"}, {"episode": 0}])  # sorted by file name
+        self.assertEqual(len(list(iter_records(os.path.join(self.tmp.name, "*.json*")))), 2)
+        with self.assertRaises(ValueError):
+            list(iter_records(stats))
+
+    def test_shared_prefix_stored_once(self):
+        instruction = "Solve a question answering task. " * 200
+        trajs = [Trajectory(instruction + f"Question: q{i}?\nThought 1: t\n", instruction) for i in range(50)]
+        self.assertEqual(str(trajs[3]), instruction + "Question: q3?\nThought 1: t\n")
+        self.assertIn("q3?", trajs[3])
+        self.assertEqual(pickle.loads(pickle.dumps(trajs[3])), trajs[3])
+        self.assertLess(len(pickle.dumps(trajs[3])), 200)
+        self.assertEqual(str(Trajectory("no shared prefix", instruction)), "no shared prefix")
+        same = Trajectory(str(trajs[3]))  # same prompt, no shared prefix
+        self.assertEqual(same, trajs[3])
+        self.assertEqual(trajs[3], str(trajs[3]))
+        self.assertEqual(len({trajs[3], same, str(trajs[3])}), 1)  # hash agrees with == (str included)
+
+        writer = TrajectoryLogWriter(self.tmp.name, "run", flush_every=10, max_bytes=20000)
+        for i, traj in enumerate(trajs):
+            writer.write({"episode": i, "traj": traj})
+        writer.close()
+        size = sum(os.path.getsize(p) for p in writer.paths)
+        self.assertLess(size * 10, sum(len(str(t)) for t in trajs))
+        trajlog._PREFIXES.clear()  # as in a fresh reader process
+        records = list(iter_records(self.tmp.name))
+        self.assertEqual([r["episode"] for r in records], list(range(50)))
+        self.assertEqual([str(Trajectory.from_dict(r["traj"])) for r in records], [str(t) for t in trajs])
+        # Every segment defines the prefix it uses, so one segment alone is readable.
+        trajlog._PREFIXES.clear()
+        last = list(iter_records(writer.paths[-1]))[-1]
+        self.assertEqual(str(Trajectory.from_dict(last["traj"])), str(trajs[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Unit test for WikiEnv search prefetching and disambiguation (no network)."""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from page_store import PageStore
+from wikienv import WikiEnv
+
+
+def page(title):
+    return f"<p>{title} is a test page. It has two sentences</p>"
+
+
+class StubWiki(WikiEnv):
+    """WikiEnv with fetch_search stubbed: "Similar*" lists titles, "Ambiguous*" is a disambiguation page."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fetched = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def fetch_search(self, entity):
+        self.release.wait(5)
+        self.fetched.append(entity)
+        if entity.startswith("Similar"):
+            return "".join(f'<div class="mw-search-result-heading">{t}</div>' for t in ("Alpha", "Beta", "Gamma"))
+        if "Ambiguous" in entity:
+            return "<p>Ambiguous may refer to:</p><ul>Ambiguous (band), a band from somewhere</ul>"
+        if entity == "Broken":
+            raise ConnectionError("no route")
+        return page(entity)
+
+
+class TestWikiEnvPrefetch(unittest.TestCase):
+    """Tests for prefetch hits / drops, max_prefetched eviction, cancelled futures, hop limit and close()."""
+
+    def setUp(self):
+        self.env = StubWiki(prefetch_k=2, prefetch_workers=1, max_prefetched=2)
+        self.env.reset()
+
+    def tearDown(self):
+        self.env.release.set()
+        self.env.close()
+
+    def test_prefetch_hit(self):
+        obs = self.env.step("search[Similar things]")[0]
+        self.assertIn("Similar: ['Alpha', 'Beta', 'Gamma']", obs)
+        self.assertEqual(self.env.prefetch_issued, 2)
+        self.assertEqual(self.env.step("search[Beta]")[0], "Beta is a test page. It has two sentences.")
+        self.assertEqual(self.env.num_searches, 1)  # Beta came from the prefetch, not a foreground search
+        self.assertEqual(self.env.step("search[Gamma]")[0], "Gamma is a test page. It has two sentences.")
+        info = self.env.get_time_info()
+        self.assertEqual((info["prefetch_used"], info["prefetch_issued"], info["prefetch_dropped"]), (1, 2, 0))
+        self.assertEqual(info["prefetch_hit_rate"], 0.5)
+        self.assertEqual(self.env.fetched.count("Beta"), 1)
+
+    def test_eviction_and_drops(self):
+        self.env.page_store = PageStore(1 << 20)
+        self.env.release.clear()  # the single worker blocks on A; the rest stay queued
+        self.env.prefetch(["A"])
+        running = self.env._prefetched["A"]
+        while not running.running():
+            time.sleep(0.001)
+        self.env.prefetch(["B", "C", "D", "C"])
+        self.assertEqual(list(self.env._prefetched), ["C", "D"])
+        # A was evicted while running (not a drop: it still completes); queued B was cancelled
+        self.assertEqual((self.env.prefetch_issued, self.env.prefetch_dropped), (4, 1))
+        self.env.release.set()
+        running.result(5)
+        self.assertIn("A", self.env.page_store)
+        self.assertEqual(self.env._take_prefetched("C"), ("page", "C is a test page. It has two sentences\n"))
+        self.assertIsNone(self.env._take_prefetched("A"))  # evicted
+        self.assertEqual(self.env.prefetch_used, 1)
+        self.assertNotIn("B", self.env.fetched)
+
+    def test_cancelled_and_failed_futures(self):
+        self.env.release.clear()
+        self.env.prefetch(["A", "B"])
+        self.assertTrue(self.env._prefetched["B"].cancel())  # still queued behind A
+        self.assertIsNone(self.env._take_prefetched("B"))
+        self.assertNotIn("B", self.env._prefetched)
+        self.env.release.set()
+        self.env.prefetch(["Broken"])
+        self.assertIsNone(self.env._take_prefetched("Broken"))
+        self.assertEqual(self.env.prefetch_used, 0)
+        self.assertNotIn("B", self.env.fetched)
+
+    def test_disambiguation_hop_limit(self):
+        result, n_requests = self.env.resolve_search("Ambiguous")
+        self.assertEqual(result[0], "ambiguous")
+        self.assertEqual(n_requests, self.env.max_disambiguation_hops + 1)
+        self.assertEqual(self.env.fetched, ["Ambiguous", "[Ambiguous]", "[[Ambiguous]]"])
+        self.env.fetched.clear()
+        self.assertEqual(self.env.resolve_search("Plain"), (("page", "Plain is a test page. It has two sentences\n"), 1))
+
+    def test_close_shuts_down_pool(self):
+        self.env.release.clear()
+        self.env.prefetch(["A", "B"])
+        pool, queued = self.env._prefetch_pool, self.env._prefetched["B"]
+        self.env.close()
+        self.assertIsNone(self.env._prefetch_pool)
+        self.assertEqual(len(self.env._prefetched), 0)
+        self.assertTrue(queued.cancelled())
+        with self.assertRaises(RuntimeError):
+            pool.submit(print)
+
+
+if __name__ == "__main__":
+    unittest.main()
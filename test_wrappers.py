@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Unit test for env / wrapper snapshot and restore (no API call, no network)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _bootstrap
+_bootstrap.setup(__file__)
+
+from page_store import PageStore
+from wikienv import WikiEnv
+from wrappers import HotPotQAWrapper, LoggingWrapper
+
+PAGE = (
+    "Milhouse Mussolini Van Houten is a recurring character in The Simpsons.\n"
+    "Milhouse was named after Richard Nixon. Milhouse is voiced by Pamela Hayden. "
+    "Matt Groening said Milhouse was named after Nixon's middle name\n"
+)
+
+
+class TestSnapshot(unittest.TestCase):
+    """Tests for one-call reset and snapshot/restore through HotPotQAWrapper and LoggingWrapper."""
+
+    def setUp(self):
+        store = PageStore(1 << 20)
+        store.put("Milhouse", ("page", PAGE))
+        self.wiki = WikiEnv(page_store=store)
+        self.env = LoggingWrapper(HotPotQAWrapper(self.wiki, split="dev"), folder=None)
+
+    def test_reset_is_one_cheap_call(self):
+        self.wiki.steps, self.wiki.answer = 5, "x"
+        obs = self.env.reset(idx=3)
+        self.assertTrue(obs.startswith("Question: "))
+        self.assertEqual((self.wiki.steps, self.wiki.answer, self.wiki.page), (0, None, None))
+        self.assertEqual(self.env.data_idx, 3)
+        self.assertEqual(self.env.traj, {"observations": [obs], "actions": []})
+
+    def test_restore_rewinds_every_layer(self):
+        self.env.reset(idx=7)
+        self.env.step("search[Milhouse]")
+        self.env.step("lookup[named]")
+        snap = self.env.snapshot()
+        self.assertIs(snap["env"]["env"]["page"], self.wiki.page)  # pages are shared, not copied
+        branch = [self.env.step("lookup[named]")[0], self.env.step("finish[Nixon]")[2]]
+        self.assertEqual(branch, ["(Result 2 / 2) Matt Groening said Milhouse was named after Nixon's middle name.", True])
+        self.assertIsNotNone(self.env.last_record)
+
+        for _ in range(2):  # a snapshot can be restored more than once
+            self.env.restore(snap)
+            self.assertEqual((self.env.data_idx, self.wiki.steps, self.wiki.answer, self.wiki.lookup_cnt), (7, 2, None, 1))
+            self.assertEqual(self.env.traj["actions"], ["search[Milhouse]", "lookup[named]"])
+            self.assertEqual(self.env.step("lookup[named]")[0], branch[0])
+            obs, reward, done, info = self.env.step("finish[Richard Nixon]")
+            self.assertTrue(done)
+            self.assertEqual(self.env.last_record["actions"][-1], "finish[Richard Nixon]")
+            self.assertEqual(len(self.env.last_record["actions"]), 4)
+        self.assertEqual(self.wiki.num_searches, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
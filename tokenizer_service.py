@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Trajectory tokenization as a local service for agents outside this Python loop.
+Protocol: newline-delimited JSON over a Unix socket (or TCP with --port); requests on one
+connection may be pipelined and carry an "id" echoed in the reply.
+  {"op": "open", "session": S, "prefix": instruction_prefix, "max_raw_steps": 3,
+   "max_total_chars": null, "max_thought": 60, "max_obs": 100, "min_repeat_steps": 3, "fmt": "react"}
+  {"op": "append", "session": S, "steps": [[thought, action, obs], ...]}
+      -> {"context": compressed trajectory (prompt = prefix + context), "n_steps", "prompt_chars"}
+  {"op": "close", "session": S}
+  {"op": "tokenize", "full_prompt": ..., "prefix": ..., <knobs>}  -> {"prompt": ...}  (stateless)
+  {"op": "stats"}
+Replies are {"id", "ok": true, ...} or {"id", "ok": false, "error"}. Requests are served in
+micro-batches (everything ready after one event-loop pass, up to --max_batch; --max_wait_ms
+additionally waits for a batch to fill), so replies to many pipelined requests go out in one
+write per connection.
+Usage:
+  python tokenizer_service.py serve [--socket PATH | --port 8765]
+  python tokenizer_service.py bench [--socket PATH] --clients 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from trajectory_tokenizer import TrajectorySession, tokenize_trajectory
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"trajtok-tokenizer-{os.getuid()}.sock")
+KNOBS = ("max_raw_steps", "max_total_chars", "max_thought", "max_obs", "min_repeat_steps", "fmt")
+
+
+class TokenizerService:
+    """Sessions plus request dispatch; transport-independent."""
+
+    def __init__(self, max_sessions: int = 10_000) -> None:
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, TrajectorySession]" = OrderedDict()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.evicted = 0
+
+    def open(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        sid = str(req["session"])
+        self.sessions[sid] = TrajectorySession(req.get("prefix", ""), **{k: req[k] for k in KNOBS if k in req})
+        self.sessions.move_to_end(sid)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+        return {}
+
+    def append(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        sid = str(req["session"])
+        session = self.sessions.get(sid)
+        if session is None:
+            raise KeyError(f"unknown session {sid!r} (never opened, closed or evicted)")
+        steps = req.get("steps", [])
+        # Check every step before appending any, so a bad request leaves the session unchanged.
+        if not isinstance(steps, list) or not all(
+            isinstance(step, list) and len(step) == 3 and all(isinstance(field, str) for field in step) for step in steps
+        ):
+            raise TypeError("steps must be a list of [thought, action, obs] strings")
+        self.sessions.move_to_end(sid)
+        for thought, action, obs in steps:
+            session.append(thought, action, obs)
+        context = session.render_context()
+        return {
+            "context": context,
+            "n_steps": len(session.steps),
+            "prompt_chars": len(session.instruction_prefix) + len(context),
+        }
+
+    def close(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        self.sessions.pop(str(req["session"]), None)
+        return {}
+
+    def tokenize(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        knobs = {k: req[k] for k in KNOBS if k in req}
+        return {"prompt": tokenize_trajectory(req["full_prompt"], req.get("prefix", ""), **knobs)}
+
+    def stats(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            "evicted": self.evicted,
+        }
+
+    def handle(self, req: Any) -> Dict[str, Any]:
+        self.requests += 1
+        if not isinstance(req, dict):
+            self.errors += 1
+            return {"id": None, "ok": False, "error": f"request must be a JSON object, got {type(req).__name__}"}
+        op = req.get("op")
+        try:
+            if op not in ("open", "append", "close", "tokenize", "stats"):
+                raise ValueError(f"unknown op {op!r}")
+            reply = getattr(self, op)(req)
+            reply.update(id=req.get("id"), ok=True)
+        except (KeyError, TypeError, ValueError) as e:
+            self.errors += 1
+            reply = {"id": req.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"}
+        return reply
+
+
+class BatchingServer:
+    """asyncio front end: connections enqueue requests, one batcher task serves them."""
+
+    def __init__(self, service: TokenizerService, max_batch: int = 256, max_wait_ms: float = 0.0) -> None:
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "asyncio.Queue[Tuple[bytes, asyncio.StreamWriter]]" = asyncio.Queue()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self.queue.put((line, writer))
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+
+    async def batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # One event-loop pass lets every connection with data ready enqueue its lines;
+            # with max_wait > 0, also wait that long for the batch to fill.
+            await asyncio.sleep(0)
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.service.batches += 1
+            out: Dict[asyncio.StreamWriter, List[bytes]] = {}
+            for line, writer in batch:
+                try:
+                    reply = self.service.handle(json.loads(line))
+                except ValueError as e:
+                    self.service.errors += 1
+                    reply = {"id": None, "ok": False, "error": f"bad JSON: {e}"}
+                except Exception as e:  # one bad request must not stop the batcher for every client
+                    self.service.errors += 1
+                    reply = {"id": None, "ok": False, "error": f"{type(e).__name__}: {e}"}
+                out.setdefault(writer, []).append(json.dumps(reply).encode("utf-8") + b"\n")
+            for writer, lines in out.items():
+                if not writer.is_closing():
+                    writer.write(b"".join(lines))
+            for writer in out:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+
+async def _serve(socket_path: Optional[str], port: Optional[int], max_batch: int, max_wait_ms: float, max_sessions: int) -> None:
+    server_state = BatchingServer(TokenizerService(max_sessions), max_batch=max_batch, max_wait_ms=max_wait_ms)
+    limit = 64 * 1024 * 1024  # a request may carry a whole few-shot prefix
+    if port is not None:
+        server = await asyncio.start_server(server_state.handle_connection, "127.0.0.1", port, limit=limit)
+        where = f"127.0.0.1:{port}"
+    else:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(server_state.handle_connection, socket_path, limit=limit)
+        where = socket_path
+    batcher = asyncio.ensure_future(server_state.batcher())
+    print(f"Tokenizer service listening on {where}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+        if port is None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class TokenizerClient:
+    """Blocking client (one request at a time) for Python callers and tests."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, port: Optional[int] = None) -> None:
+        if port is not None:
+            self.sock = socket.create_connection(("127.0.0.1", port))
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        self.file = self.sock.makefile("rwb")
+        self._next_id = 0
+
+    def call(self, op: str, **fields: Any) -> Dict[str, Any]:
+        self._next_id += 1
+        self.file.write(json.dumps({"op": op, "id": self._next_id, **fields}).encode("utf-8") + b"\n")
+        self.file.flush()
+        reply = json.loads(self.file.readline())
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+
+def _synthetic_step(rng: random.Random, k: int) -> List[str]:
+    words = ["film", "director", "born", "river", "album", "county", "released", "American", "the", "of"]
+    obs_words = rng.randint(20, 120)
+    return [
+        f"I need to find step {k} " + " ".join(rng.choice(words) for _ in range(rng.randint(5, 25))),
+        f"Search[{rng.choice(words).title()} {rng.randint(1, 999)}]",
+        " ".join(rng.choice(words) for _ in range(obs_words)) + ".",
+    ]
+
+
+async def _bench_client(
+    connect, cid: int, args, prefix: str, latencies: List[float], stop_at: float
+) -> int:
+    """One connection running sessions back to back with up to args.pipeline requests in flight."""
+    reader, writer = await connect()
+    rng = random.Random(cid)
+    sent: Dict[int, float] = {}
+    n_done = 0
+    next_id = 0
+    window = asyncio.Semaphore(args.pipeline)
+
+    async def read_replies() -> None:
+        nonlocal n_done
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            reply = json.loads(line)
+            latencies.append(time.perf_counter() - sent.pop(reply["id"]))
+            if not reply["ok"]:
+                raise RuntimeError(reply["error"])
+            n_done += 1
+            window.release()
+
+    async def send(req: Dict[str, Any]) -> None:
+        nonlocal next_id
+        await window.acquire()
+        next_id += 1
+        req["id"] = next_id
+        sent[next_id] = time.perf_counter()
+        writer.write(json.dumps(req).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    reading = asyncio.ensure_future(read_replies())
+    n_sessions = 0
+    while time.perf_counter() < stop_at:
+        sid = f"c{cid}-s{n_sessions}"
+        n_sessions += 1
+        await send({"op": "open", "session": sid, "prefix": prefix, "max_raw_steps": 3})
+        for k in range(1, args.steps + 1):
+            await send({"op": "append", "session": sid, "steps": [_synthetic_step(rng, k)]})
+        await send({"op": "close", "session": sid})
+    for _ in range(args.pipeline):
+        await window.acquire()
+    writer.close()
+    reading.cancel()
+    return n_done
+
+
+async def _bench(args) -> None:
+    if args.port is not None:
+        connect = lambda: asyncio.open_connection("127.0.0.1", args.port, limit=64 * 1024 * 1024)
+    else:
+        connect = lambda: asyncio.open_unix_connection(args.socket, limit=64 * 1024 * 1024)
+    prefix = "Solve a question answering task with interleaving Thought, Action, Observation steps.\n" * 40
+    latencies: List[float] = []
+    t0 = time.perf_counter()
+    counts = await asyncio.gather(
+        *[_bench_client(connect, c, args, prefix, latencies, t0 + args.duration) for c in range(args.clients)]
+    )
+    elapsed = time.perf_counter() - t0
+    lat = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return lat[min(len(lat) - 1, int(p / 100 * len(lat)))] * 1000 if lat else 0.0
+
+    print(f"{sum(counts)} requests in {elapsed:.1f}s = {sum(counts) / elapsed:.0f} req/s "
+          f"({args.clients} clients x {args.pipeline} in flight, {args.steps} steps/session)")
+    print(f"latency ms: p50 {pct(50):.2f} | p90 {pct(90):.2f} | p99 {pct(99):.2f} | max {pct(100):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trajectory tokenization service")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument("--port", type=int, default=None, help="Use TCP on 127.0.0.1:PORT instead of the Unix socket")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--max_batch", type=int, default=256)
+    p_serve.add_argument("--max_wait_ms", type=float, default=0.0, help="Extra time to wait for a batch to fill (0 = only what is ready)")
+    p_serve.add_argument("--max_sessions", type=int, default=10_000, help="Least recently used sessions beyond this are dropped")
+    p_bench = sub.add_parser("bench", help="Load test a running service")
+    p_bench.add_argument("--clients", type=int, default=32)
+    p_bench.add_argument("--pipeline", type=int, default=4, help="Requests in flight per client")
+    p_bench.add_argument("--steps", type=int, default=12, help="Steps appended per session")
+    p_bench.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        try:
+            asyncio.run(_serve(args.socket, args.port, args.max_batch, args.max_wait_ms, args.max_sessions))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    main()
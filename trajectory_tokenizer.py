@@ -1,9 +1,15 @@
 """
 Trajectory Tokenization for ReAct: compress (Thought, Action, Observation) history
 into short tokens to reduce context length while preserving structure.
+Trajectory layouts are pluggable (TrajectoryFormat): "react" for HotpotQA / FEVER
+("Thought i: / Action i: / Observation i:"), "react_compact" (the same layout with denser
+"#k thought|S:entity|obs" summaries under a one-line legend) and "alfworld"
+("> think: ..." / "> go to ...").
 """
 import re
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
+
+from profiling import profiled, span
 
 
 def _truncate(s: str, max_len: int, suffix: str = "...") -> str:
@@ -14,6 +20,7 @@ def _truncate(s: str, max_len: int, suffix: str = "...") -> str:
     return s[: max_len - len(suffix)].rstrip() + suffix
 
 
+@profiled("parse_react_steps")
 def parse_react_steps(trajectory_text: str) -> List[Tuple[str, str, str]]:
     """
     Parse ReAct trajectory string into list of (thought, action, obs).
@@ -58,6 +65,18 @@ def summarize_step(
     return f"[{t} | {action} | {o}]"
 
 
+def format_step_token(
+    k: int,
+    thought: str,
+    action: str,
+    obs: str,
+    max_thought: int = 60,
+    max_obs: int = 100,
+) -> str:
+    """Summary token for step k, e.g. "[Step 2] [thought | action | obs]"."""
+    return f"[Step {k}] {summarize_step(thought, action, obs, max_thought=max_thought, max_obs=max_obs)}"
+
+
 def steps_to_full_text(steps: List[Tuple[str, str, str]], start_idx: int = 1) -> str:
     """Convert list of (thought, action, obs) back to ReAct format string."""
     lines = []
@@ -69,6 +88,284 @@ def steps_to_full_text(steps: List[Tuple[str, str, str]], start_idx: int = 1) ->
     return "\n".join(lines) + "\n"
 
 
+_ALFWORLD_COMMAND = re.compile(r"^>[ \t]?", re.MULTILINE)
+
+
+@profiled("parse_alfworld_steps")
+def parse_alfworld_steps(trajectory_text: str) -> List[Tuple[str, str, str]]:
+    """
+    Parse an ALFWorld transcript ("> command\nobservation\n" repeated) into (thought, action, obs).
+    A "> think: ..." answered with "OK." becomes the thought of the next command; a think
+    that is not followed by a command is kept as a step with an empty action.
+    """
+    steps = []
+    thought = ""
+    for block in _ALFWORLD_COMMAND.split(trajectory_text)[1:]:
+        command, _, obs = block.partition("\n")
+        command, obs = command.strip(), obs.strip()
+        if command.startswith("think:") and obs in ("OK.", ""):
+            if thought:
+                steps.append((thought, "", ""))
+            thought = command[len("think:") :].strip()
+            continue
+        steps.append((thought, command, obs))
+        thought = ""
+    if thought:
+        steps.append((thought, "", ""))
+    return steps
+
+
+def alfworld_steps_to_text(steps: List[Tuple[str, str, str]], start_idx: int = 1) -> str:
+    """Render (thought, action, obs) steps back to ALFWorld "> ..." lines (start_idx is unused)."""
+    lines = []
+    for thought, action, obs in steps:
+        if thought:
+            lines += [f"> think: {thought}", "OK."]
+        if action:
+            lines += [f"> {action}", obs]
+    return "\n".join(lines) + "\n"
+
+
+_SUMMARY_TOKEN = re.compile(r"^(?:\[Steps? |#)(?:\d+-)?(\d+)\]? ", re.MULTILINE)
+
+
+@profiled("find_repeats")
+def find_repeats(keys: List[Optional[Tuple]], min_steps: int = 3, max_period: int = 3) -> List[Tuple[int, int, int]]:
+    """
+    Runs of repeated steps in keys (one key per step, None = never repeats): returns
+    (start, end, period) for each run where a block of `period` consecutive keys repeats
+    back to back at least twice, covering at least min_steps steps (whole blocks only).
+    Longest run wins; ties go to the shorter period. min_steps <= 0 disables collapsing.
+    """
+    runs: List[Tuple[int, int, int]] = []
+    if min_steps <= 0:
+        return runs
+    i, n = 0, len(keys)
+    while i < n:
+        best = (i + 1, 1)
+        for p in range(1, max_period + 1):
+            j = i + p
+            while j < n and keys[j] is not None and keys[j] == keys[j - p]:
+                j += 1
+            end = i + (j - i) // p * p
+            if keys[i] is not None and end - i >= max(2 * p, min_steps) and end > best[0]:
+                best = (end, p)
+        if best[0] > i + 1:
+            runs.append((i, best[0], best[1]))
+        i = best[0]
+    return runs
+
+
+class TrajectoryFormat:
+    """How a trajectory is laid out in the prompt: parse() text into steps, render() steps back."""
+
+    name = "react"
+    step_start = re.compile(r"Thought\s+\d+:")
+    # True when a step's summary depends on the other summarized steps (no per-step caching).
+    contextual = False
+
+    def parse(self, trajectory_text: str) -> List[Tuple[str, str, str]]:
+        return parse_react_steps(trajectory_text)
+
+    def render(self, steps: List[Tuple[str, str, str]], start_idx: int = 1) -> str:
+        return steps_to_full_text(steps, start_idx=start_idx)
+
+    def summarize(self, k: int, thought: str, action: str, obs: str, max_thought: int = 60, max_obs: int = 100) -> str:
+        return format_step_token(k, thought, action, obs, max_thought=max_thought, max_obs=max_obs)
+
+    def repeat_key(self, thought: str, action: str, obs: str, max_obs: int = 100) -> Optional[Tuple[str, str]]:
+        """Steps with equal keys read the same once summarized (thought aside); None = not collapsible."""
+        if not action:
+            return None
+        return " ".join(action.lower().split()), _truncate(obs, max_obs)
+
+    def summarize_repeat(self, first: int, last: int, block: List[Tuple[str, str, str]], reps: int, max_obs: int = 100) -> str:
+        """One token for steps first..last: `block` (one period of the loop) repeated reps times."""
+        body = "; ".join(f"{action} -> {_truncate(obs, max_obs)}" for _, action, obs in block)
+        return f"[Steps {first}-{last}] [repeated {reps}x: {body}]"
+
+    def summarize_block(
+        self,
+        steps: List[Tuple[str, str, str]],
+        earlier: str = "",
+        offset: int = 0,
+        max_thought: int = 60,
+        max_obs: int = 100,
+        min_repeat_steps: int = 3,
+    ) -> List[str]:
+        """Summary lines for steps (numbered from offset + 1), after the summary text `earlier` of a previous pass."""
+        with span("summarize_steps"):
+            tokens = [self.summarize(offset + i + 1, *step, max_thought=max_thought, max_obs=max_obs) for i, step in enumerate(steps)]
+        keys = [self.repeat_key(*step, max_obs=max_obs) for step in steps]
+        lines = summary_lines(self, steps, tokens, keys, min_repeat_steps=min_repeat_steps, max_obs=max_obs, offset=offset)
+        return ([earlier] if earlier else []) + lines
+
+
+def summary_lines(
+    trajectory_format: TrajectoryFormat,
+    steps: List[Tuple[str, str, str]],
+    tokens: List[str],
+    keys: List[Optional[Tuple]],
+    min_repeat_steps: int = 3,
+    max_obs: int = 100,
+    offset: int = 0,
+) -> List[str]:
+    """Summary tokens for steps (numbered from offset + 1) with repeated runs collapsed into one token."""
+    runs = find_repeats(keys, min_steps=min_repeat_steps)
+    if not runs:
+        return tokens
+    lines: List[str] = []
+    i = 0
+    for start, end, period in runs:
+        lines.extend(tokens[i:start])
+        lines.append(
+            trajectory_format.summarize_repeat(
+                offset + start + 1, offset + end, steps[start : start + period], (end - start) // period, max_obs=max_obs
+            )
+        )
+        i = end
+    lines.extend(tokens[i:])
+    return lines
+
+
+class AlfworldFormat(TrajectoryFormat):
+    name = "alfworld"
+    step_start = _ALFWORLD_COMMAND
+
+    def parse(self, trajectory_text: str) -> List[Tuple[str, str, str]]:
+        return parse_alfworld_steps(trajectory_text)
+
+    def render(self, steps: List[Tuple[str, str, str]], start_idx: int = 1) -> str:
+        return alfworld_steps_to_text(steps, start_idx=start_idx)
+
+    def summarize(self, k: int, thought: str, action: str, obs: str, max_thought: int = 60, max_obs: int = 100) -> str:
+        """Most ALFWorld commands have no thought; drop the empty field instead of printing "[ | ...]"."""
+        if thought:
+            return format_step_token(k, thought, action, obs, max_thought=max_thought, max_obs=max_obs)
+        return f"[Step {k}] [{action} | {_truncate(obs, max_obs)}]"
+
+
+_ACTION_CALL = re.compile(r"^(\w+)\[(.*)\]$", re.DOTALL)
+_LEGEND = "Legend: "
+_LEGEND_ALIAS = re.compile(r"; (@\d+)=(.*?)(?=; @\d+=|$)")
+_LOOKUP_RESULT = re.compile(r"^\(Result (\d+) / (\d+)\) ")
+
+
+def _entity_pattern(entity: str) -> "re.Pattern[str]":
+    return re.compile(rf"(?<!\w){re.escape(entity)}(?!\w)")
+
+
+class CompactFormat(TrajectoryFormat):
+    """
+    ReAct layout with denser summaries: one "#k thought|S:entity|obs" line per step,
+    "#a-b x3: L:kw>obs" for loops, one-letter action codes, '"' for a thought or
+    observation that reads the same as the step before, "(2/5)" for lookup result
+    counters, a one-char ellipsis, and @n aliases for search entities that recur in the
+    summarized steps. A legend line in front of the summaries defines the codes and
+    aliases; later passes keep its aliases and add new ones.
+    """
+
+    name = "react_compact"
+    contextual = True
+    action_codes = {"search": "S", "lookup": "L", "finish": "F"}
+
+    def _action(self, action: str) -> str:
+        m = _ACTION_CALL.match(action.strip())
+        code = self.action_codes.get(m.group(1).lower()) if m else None
+        return f"{code}:{m.group(2)}" if code else action
+
+    @staticmethod
+    def _obs(obs: str, max_obs: int) -> str:
+        return _truncate(_LOOKUP_RESULT.sub(r"(\1/\2) ", obs.strip()), max_obs, suffix="…")
+
+    def summarize(self, k: int, thought: str, action: str, obs: str, max_thought: int = 60, max_obs: int = 100) -> str:
+        return f"#{k} {_truncate(thought, max_thought, suffix='…')}|{self._action(action)}|{self._obs(obs, max_obs)}"
+
+    def repeat_key(self, thought: str, action: str, obs: str, max_obs: int = 100) -> Optional[Tuple[str, str]]:
+        if not action:
+            return None
+        return " ".join(action.lower().split()), self._obs(obs, max_obs)
+
+    def summarize_repeat(self, first: int, last: int, block: List[Tuple[str, str, str]], reps: int, max_obs: int = 100) -> str:
+        body = "; ".join(f"{self._action(action)}>{self._obs(obs, max_obs)}" for _, action, obs in block)
+        return f"#{first}-{last} x{reps}: {body}"
+
+    def aliases(self, steps: List[Tuple[str, str, str]], known: Dict[str, str]) -> Dict[str, str]:
+        """Entity -> alias: the known ones, plus each searched entity whose repeats save more than its legend entry costs."""
+        entities = dict((entity, alias) for alias, entity in known.items())
+        n = max((int(alias[1:]) for alias in known), default=0)
+        texts = [text for step in steps for text in step]
+        for _, action, _ in steps:
+            m = _ACTION_CALL.match(action.strip())
+            if not m or m.group(1).lower() != "search" or m.group(2) in entities:
+                continue
+            entity, alias = m.group(2), f"@{n + 1}"
+            pattern = _entity_pattern(entity)
+            count = sum(len(pattern.findall(text)) for text in texts)
+            if count * (len(entity) - len(alias)) > len(entity) + len(alias) + 3:
+                entities[entity] = alias
+                n += 1
+        return entities
+
+    def legend(self, entities: Dict[str, str]) -> str:
+        aliases = "".join(f"; {alias}={entity}" for entity, alias in entities.items())
+        return _LEGEND + '#k thought|action|observation of step k; S=Search L=Lookup F=Finish; " same as previous step; #a-b xN: N repeats' + aliases
+
+    def summarize_block(
+        self,
+        steps: List[Tuple[str, str, str]],
+        earlier: str = "",
+        offset: int = 0,
+        max_thought: int = 60,
+        max_obs: int = 100,
+        min_repeat_steps: int = 3,
+    ) -> List[str]:
+        known: Dict[str, str] = {}
+        if earlier.startswith(_LEGEND):
+            legend, _, earlier = earlier.partition("\n")
+            known = dict(_LEGEND_ALIAS.findall(legend))
+        entities = self.aliases(steps, known)
+        if entities:
+            # Longest first, so an entity inside a longer one is not replaced in it.
+            ordered = [(_entity_pattern(entity), alias) for entity, alias in sorted(entities.items(), key=lambda kv: -len(kv[0]))]
+
+            def replace(text: str) -> str:
+                for pattern, alias in ordered:
+                    text = pattern.sub(alias, text)
+                return text
+
+            steps = [(replace(t), replace(a), replace(o)) for t, a, o in steps]
+        keys = [self.repeat_key(*step, max_obs=max_obs) for step in steps]
+        in_run = {i for start, end, _ in find_repeats(keys, min_steps=min_repeat_steps) for i in range(start, end)}
+        tokens: List[str] = []
+        previous: Optional[Tuple[str, str]] = None
+        with span("summarize_steps"):
+            for i, (thought, action, obs) in enumerate(steps):
+                if i in in_run:  # replaced by its run's token below
+                    tokens.append("")
+                    previous = None
+                    continue
+                fields = (_truncate(thought, max_thought, suffix="…"), self._obs(obs, max_obs))
+                shown = ['"' if previous and field and field == previous[j] else field for j, field in enumerate(fields)]
+                tokens.append(f"#{offset + i + 1} {shown[0]}|{self._action(action)}|{shown[1]}")
+                previous = fields
+        lines = summary_lines(self, steps, tokens, keys, min_repeat_steps=min_repeat_steps, max_obs=max_obs, offset=offset)
+        return [self.legend(entities)] + ([earlier] if earlier else []) + lines
+
+
+FORMATS: Dict[str, TrajectoryFormat] = {"react": TrajectoryFormat(), "react_compact": CompactFormat(), "alfworld": AlfworldFormat()}
+
+
+def get_format(fmt: Union[str, TrajectoryFormat]) -> TrajectoryFormat:
+    """A registered format by name, or fmt itself if it already is a TrajectoryFormat."""
+    if isinstance(fmt, TrajectoryFormat):
+        return fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown trajectory format {fmt!r}; known: {sorted(FORMATS)}")
+    return FORMATS[fmt]
+
+
+@profiled("tokenize")
 def tokenize_trajectory(
     full_prompt: str,
     instruction_prefix: str,
@@ -76,6 +373,8 @@ def tokenize_trajectory(
     max_total_chars: Optional[int] = None,
     max_thought: int = 60,
     max_obs: int = 100,
+    fmt: Union[str, TrajectoryFormat] = "react",
+    min_repeat_steps: int = 3,
 ) -> str:
     """
     Compress trajectory by summarizing older steps into tokens; keep last max_raw_steps in full.
@@ -83,36 +382,156 @@ def tokenize_trajectory(
     - instruction_prefix: instruction + few-shot + question (so we know where trajectory starts).
     - max_raw_steps: number of most recent steps to keep in full.
     - max_total_chars: if set, try to keep total prompt under this (by increasing summarization).
+    - fmt: trajectory layout, "react" (default), "alfworld" or a TrajectoryFormat.
+    - min_repeat_steps: summarized steps stuck in a loop (the same action and observation,
+      or a short cycle of them, repeated back to back over at least this many steps) become
+      one "[Steps a-b] [repeated Nx: ...]" token; 0 keeps one token per step.
     Returns rebuilt prompt with compressed history when applicable.
     """
     if not full_prompt.startswith(instruction_prefix):
         return full_prompt
+    trajectory_format = get_format(fmt)
     trajectory_part = full_prompt[len(instruction_prefix) :].lstrip()
-    steps = parse_react_steps(trajectory_part)
+    # A prompt compressed before starts with earlier summary tokens; keep them and number on.
+    first = trajectory_format.step_start.search(trajectory_part)
+    head = trajectory_part[: first.start() if first else len(trajectory_part)]
+    earlier = head.strip() if _SUMMARY_TOKEN.match(head) or head.startswith(_LEGEND) else ""
+    tokens = _SUMMARY_TOKEN.findall(earlier)  # a legend may come without any step token yet
+    n_earlier = int(tokens[-1]) if tokens else 0
+    steps = trajectory_format.parse(trajectory_part[len(head) :])
     if len(steps) <= max_raw_steps:
         return full_prompt
     n_summarize = len(steps) - max_raw_steps
-    summarized_tokens = []
-    for i in range(n_summarize):
-        thought, action, obs = steps[i]
-        tok = summarize_step(thought, action, obs, max_thought=max_thought, max_obs=max_obs)
-        summarized_tokens.append(f"[Step {i + 1}] {tok}")
+    summarized_tokens = trajectory_format.summarize_block(
+        steps[:n_summarize], earlier, n_earlier, max_thought=max_thought, max_obs=max_obs, min_repeat_steps=min_repeat_steps
+    )
     summary_block = "\n".join(summarized_tokens) + "\n\n"
     raw_steps = steps[n_summarize:]
-    raw_text = steps_to_full_text(raw_steps, start_idx=n_summarize + 1)
+    with span("render_steps"):
+        raw_text = trajectory_format.render(raw_steps, start_idx=n_earlier + n_summarize + 1)
     out = instruction_prefix + summary_block + raw_text
+    if len(out) >= len(full_prompt):
+        # Short steps (e.g. ALFWorld "> go to ..." lines) can be shorter raw than as tokens.
+        out = full_prompt
     if max_total_chars and len(out) > max_total_chars:
-        return tokenize_trajectory(
-            full_prompt,
-            instruction_prefix,
-            max_raw_steps=max(1, max_raw_steps - 1),
-            max_total_chars=max_total_chars,
-            max_thought=max(max_thought - 10, 30),
-            max_obs=max(max_obs - 20, 50),
-        )
+        tighter = (max(1, max_raw_steps - 1), max(max_thought - 10, 30), max(max_obs - 20, 50))
+        # Stop once every knob is at its floor; the budget may simply be unreachable.
+        if tighter != (max_raw_steps, max_thought, max_obs):
+            return tokenize_trajectory(
+                full_prompt,
+                instruction_prefix,
+                max_raw_steps=tighter[0],
+                max_total_chars=max_total_chars,
+                max_thought=tighter[1],
+                max_obs=tighter[2],
+                fmt=trajectory_format,
+                min_repeat_steps=min_repeat_steps,
+            )
     return out
 
 
+class TrajectorySession:
+    """
+    Incremental tokenize_trajectory for one episode: steps are appended as they happen and
+    each summary token is formatted once, so render() costs O(new steps + output) instead
+    of re-parsing the whole prompt. render() returns the same text as
+    tokenize_trajectory(instruction_prefix + fmt.render(steps), instruction_prefix, ..., fmt=fmt).
+    """
+
+    def __init__(
+        self,
+        instruction_prefix: str,
+        max_raw_steps: int = 3,
+        max_total_chars: Optional[int] = None,
+        max_thought: int = 60,
+        max_obs: int = 100,
+        fmt: Union[str, TrajectoryFormat] = "react",
+        min_repeat_steps: int = 3,
+    ) -> None:
+        self.instruction_prefix = instruction_prefix
+        self.fmt = get_format(fmt)
+        self.max_raw_steps = max_raw_steps
+        self.max_total_chars = max_total_chars
+        self.max_thought = max_thought
+        self.max_obs = max_obs
+        self.min_repeat_steps = min_repeat_steps
+        self.steps: List[Tuple[str, str, str]] = []
+        self._full_chars = 0  # len(fmt.render(steps)), kept up to date by append()
+        # (max_thought, max_obs) -> (summary tokens so far, the same tokens "\n"-joined, their repeat keys)
+        self._summaries: Dict[Tuple[int, int], Tuple[List[str], str, List[Optional[Tuple]]]] = {}
+
+    def append(self, thought: str, action: str, obs: str) -> None:
+        step = (thought.strip(), action.strip(), obs.strip())
+        self.steps.append(step)
+        self._full_chars += len(self.fmt.render([step], start_idx=len(self.steps)))
+
+    def _summary(self, n: int, max_thought: int, max_obs: int) -> str:
+        if self.fmt.contextual:
+            return "\n".join(self.fmt.summarize_block(self.steps[:n], max_thought=max_thought, max_obs=max_obs,
+                                                        min_repeat_steps=self.min_repeat_steps))
+        tokens, text, keys = self._summaries.get((max_thought, max_obs), ([], "", []))
+        if len(tokens) < n:
+            new = range(len(tokens), n)
+            new_tokens = [self.fmt.summarize(i + 1, *self.steps[i], max_thought=max_thought, max_obs=max_obs) for i in new]
+            text = "\n".join([text] + new_tokens) if tokens else "\n".join(new_tokens)
+            tokens.extend(new_tokens)
+            keys.extend(self.fmt.repeat_key(*self.steps[i], max_obs=max_obs) for i in new)
+            self._summaries[(max_thought, max_obs)] = (tokens, text, keys)
+        # A run can grow with every new step, so repeats are looked for again on the (cheap) keys each time.
+        if find_repeats(keys[:n], min_steps=self.min_repeat_steps):
+            return "\n".join(summary_lines(self.fmt, self.steps[:n], tokens[:n], keys[:n], self.min_repeat_steps, max_obs))
+        # Summaries only grow with the episode; fewer are needed only when the budget loop drops max_raw_steps.
+        return text if len(tokens) == n else "\n".join(tokens[:n])
+
+    @profiled("session_render")
+    def render_context(self) -> str:
+        """Trajectory part of the prompt (everything after instruction_prefix)."""
+        knobs = (self.max_raw_steps, self.max_thought, self.max_obs)
+        if len(self.steps) <= knobs[0]:
+            return self.fmt.render(self.steps) if self.steps else ""
+        while True:
+            n_summarize = len(self.steps) - knobs[0]
+            out = (
+                self._summary(n_summarize, knobs[1], knobs[2])
+                + "\n\n"
+                + self.fmt.render(self.steps[n_summarize:], start_idx=n_summarize + 1)
+            )
+            if len(out) >= self._full_chars:
+                out = self.fmt.render(self.steps)
+            if not self.max_total_chars or len(self.instruction_prefix) + len(out) <= self.max_total_chars:
+                return out
+            tighter = (max(1, knobs[0] - 1), max(knobs[1] - 10, 30), max(knobs[2] - 20, 50))
+            if tighter == knobs:
+                return out
+            knobs = tighter
+
+    def render(self) -> str:
+        return self.instruction_prefix + self.render_context()
+
+
+_EXPAND_ACTION = re.compile(r"^expand\[\s*steps?\s*(\d+)(?:\s*-\s*(\d+))?\s*\]$", re.IGNORECASE)
+
+
+def expand_steps(store: Dict[int, Tuple[str, str, str]], action: str, max_steps: int = 5) -> Optional[str]:
+    """
+    Observation for an "expand[Step k]" / "expand[Steps a-b]" action: the full (thought,
+    action, obs) of those steps from store (step number -> step), at most max_steps of them.
+    Returns None if action is not an expand action. The text has no "Thought k:" lines, so
+    a later tokenize_trajectory pass still sees it as one observation.
+    """
+    m = _EXPAND_ACTION.match(action.strip())
+    if m is None:
+        return None
+    first = int(m.group(1))
+    last = min(int(m.group(2) or first), first + max_steps - 1)
+    found = [k for k in range(first, last + 1) if k in store]
+    if not found:
+        return f"No step {first} to expand; steps 1-{max(store, default=0)} are available."
+    return " ".join(
+        f"[Step {k} in full] Thought: {store[k][0]} Action: {store[k][1]} Observation: {store[k][2]}" for k in found
+    )
+
+
 def count_steps_in_prompt(prompt: str) -> int:
     """Count number of Thought/Action/Observation steps in prompt."""
     return len(re.findall(r"Thought\s+\d+:", prompt))
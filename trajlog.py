@@ -0,0 +1,239 @@
+"""
+Append-only, crash-safe trajectory logs: one JSON record per episode in JSONL
+segments (optionally gzip), buffered with periodic flushes and rotated by size.
+Segments are named <folder>/<file_id>.<seq>.jsonl[.gz]; iter_records reads them lazily.
+Prompts shared by many episodes (instruction + few-shot examples) are kept once per
+process by content hash (intern_prefix); a Trajectory holds a reference plus the episode's
+own text. A record carrying one ("traj": {"prefix": hash, "suffix": ...}) is preceded
+in its segment by a single {"_prefix": hash, "text": ...} line, which iter_records
+registers instead of yielding.
+"""
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+_PREFIXES: Dict[str, str] = {}
+# What folder / glob expansion reads: writer segments <id>.<seq>.jsonl[.gz] and legacy <id>.json lists.
+_LOG_NAME = re.compile(r"(.+\.\d{4}\.jsonl(\.gz)?|\d+\.json)$")
+_prefix_lock = threading.Lock()
+
+
+def intern_prefix(text: str) -> str:
+    """Register a shared prompt prefix once per process; returns its content hash."""
+    h = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    with _prefix_lock:
+        _PREFIXES.setdefault(h, text)
+    return h
+
+
+def prefix_text(h: str) -> str:
+    try:
+        return _PREFIXES[h]
+    except KeyError:
+        raise KeyError(f"Prompt prefix {h} is not registered in this process (read its log or call intern_prefix)") from None
+
+
+class Trajectory:
+    """
+    An episode's full prompt as (shared prefix by hash, episode suffix). The prefix string is
+    shared by every Trajectory of the process and only the hash is pickled, so keeping or
+    shipping hundreds of episodes costs their own steps only. str(traj) rebuilds the prompt.
+    """
+
+    __slots__ = ("prefix_hash", "suffix")
+
+    def __init__(self, full_prompt: str, prefix: str = "") -> None:
+        if not full_prompt.startswith(prefix):
+            prefix = ""
+        self.prefix_hash = intern_prefix(prefix)
+        self.suffix = full_prompt[len(prefix) :]
+
+    @property
+    def prefix(self) -> str:
+        return prefix_text(self.prefix_hash)
+
+    @property
+    def full_prompt(self) -> str:
+        return self.prefix + self.suffix
+
+    def __str__(self) -> str:
+        return self.full_prompt
+
+    def __len__(self) -> int:
+        return len(self.prefix) + len(self.suffix)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self.suffix or text in self.full_prompt
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Trajectory) and self.prefix_hash == other.prefix_hash:
+            return self.suffix == other.suffix
+        if isinstance(other, Trajectory):
+            other = other.full_prompt
+        return isinstance(other, str) and self.full_prompt == other
+
+    def __hash__(self) -> int:
+        # equal to hash(str(self)), since a Trajectory compares equal to its prompt string
+        return hash(self.full_prompt)
+
+    def __repr__(self) -> str:
+        return f"Trajectory(prefix={self.prefix_hash}, suffix_chars={len(self.suffix)})"
+
+    def __getstate__(self) -> Dict[str, str]:
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict[str, str]) -> None:
+        self.prefix_hash, self.suffix = state["prefix"], state["suffix"]
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"prefix": self.prefix_hash, "suffix": self.suffix}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, str]) -> "Trajectory":
+        traj = cls.__new__(cls)
+        traj.__setstate__(d)
+        return traj
+
+
+class TrajectoryLogWriter:
+    """
+    - compress: gzip each segment (each flush is a sync point, so a crash loses at most the buffer).
+    - flush_every / flush_interval: flush after this many buffered records or seconds, whichever first.
+    - max_bytes: start a new segment once the current one reaches this size on disk (None = never).
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        file_id: Union[int, str],
+        compress: bool = False,
+        flush_every: int = 10,
+        flush_interval: float = 30.0,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.folder = folder
+        self.file_id = file_id
+        self.compress = compress
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.paths: List[str] = []
+        self.n_records = 0
+        self._buffer: List[str] = []
+        self._last_flush = time.time()
+        self._raw = None
+        self._fh = None
+        self._segment_prefixes: set = set()  # prefix hashes already defined in the current segment
+        os.makedirs(folder, exist_ok=True)
+        atexit.register(self.close)
+
+    @property
+    def path(self) -> str:
+        """Path of the current (or next) segment."""
+        ext = ".jsonl.gz" if self.compress else ".jsonl"
+        return os.path.join(self.folder, f"{self.file_id}.{len(self.paths):04d}{ext}")
+
+    def _open(self) -> None:
+        path = self.path
+        self._raw = open(path, "ab")
+        self._fh = gzip.GzipFile(fileobj=self._raw, mode="ab") if self.compress else self._raw
+        self.paths.append(path)
+
+    def _close_segment(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            if self._fh is not self._raw:
+                self._raw.close()
+        self._fh = self._raw = None
+        self._segment_prefixes = set()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        traj = record.get("traj")
+        if isinstance(traj, Trajectory):
+            record = {**record, "traj": traj.to_dict()}
+            traj = record["traj"]
+        if isinstance(traj, dict) and traj.get("prefix") not in self._segment_prefixes:
+            # Buffered lines always land in one segment, so the definition precedes its first use.
+            self._buffer.append(json.dumps({"_prefix": traj["prefix"], "text": prefix_text(traj["prefix"])}, ensure_ascii=False) + "\n")
+            self._segment_prefixes.add(traj["prefix"])
+        self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self.n_records += 1
+        if len(self._buffer) >= self.flush_every or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+        if self._fh is None:
+            self._open()
+        self._fh.write("".join(self._buffer).encode("utf-8"))
+        self._buffer = []
+        self._fh.flush()
+        if self._fh is not self._raw:
+            self._raw.flush()
+        if self.max_bytes is not None and self._raw.tell() >= self.max_bytes:
+            self._close_segment()
+
+    def close(self) -> None:
+        self.flush()
+        self._close_segment()
+        atexit.unregister(self.close)  # do not keep closed writers alive until exit
+
+
+def _open_text(path: str):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+
+def log_paths(path: str) -> List[str]:
+    """
+    Expand a log file, folder or glob pattern into sorted log file paths. Folders and patterns
+    only match writer segments and legacy <id>.json logs, so result / profile JSON files kept
+    next to the logs are left alone; a file named explicitly is always returned.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "*")
+    if not any(c in path for c in "*?["):
+        return [path]
+    return sorted(p for p in glob.glob(path) if _LOG_NAME.match(os.path.basename(p)))
+
+
+def iter_records(paths: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield episode records from JSONL / JSONL.gz segments (or legacy .json lists).
+    A truncated final line or gzip member, as left by a crash, ends that file quietly.
+    Shared prompt prefix lines are registered (intern_prefix) rather than yielded; a
+    record's "traj" stays a {"prefix", "suffix"} dict (Trajectory.from_dict rebuilds it).
+    """
+    if isinstance(paths, str):
+        paths = log_paths(paths)
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path) as f:
+                records = json.load(f)
+            if not (isinstance(records, list) and all(isinstance(r, dict) for r in records)):
+                raise ValueError(f"{path} is not a trajectory log (expected a JSON list of episode records)")
+            yield from records
+            continue
+        with _open_text(path) as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if "_prefix" in record:
+                        intern_prefix(record["text"])
+                        continue
+                    yield record
+            except (EOFError, gzip.BadGzipFile):
+                pass
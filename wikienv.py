@@ -1,9 +1,15 @@
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import gym
-import requests
-from bs4 import BeautifulSoup
+
+from cassette import Cassette
+from deadline import DeadlineExceeded, HedgedCaller
+from page_store import PageStore
+from profiling import profiled, span
 
 
 def clean_str(p: str) -> str:
@@ -15,8 +21,38 @@ class textSpace(gym.spaces.Space):
         return isinstance(x, str)
 
 
+# Parsed search outcome: ("similar", titles), ("page", text) or ("ambiguous", text).
+SearchResult = Tuple[str, Any]
+
+
 class WikiEnv(gym.Env):
-    def __init__(self) -> None:
+    # How many times a "may refer to:" page is re-queried as "[entity]" before
+    # its text is used as the page itself.
+    max_disambiguation_hops = 2
+    search_url = "https://en.wikipedia.org/w/index.php?search={}"
+
+    def __init__(
+        self,
+        prefetch_k: int = 0,
+        prefetch_workers: int = 2,
+        max_prefetched: int = 32,
+        page_store: Optional[PageStore] = None,
+        cassette: Optional[Cassette] = None,
+        search_timeout: Optional[float] = None,
+        search_caller: Optional[HedgedCaller] = None,
+        owns_cassette: bool = True,
+    ) -> None:
+        """
+        - prefetch_k: on a search miss, fetch the top-k "Similar:" titles in the background (0 = off).
+        - prefetch_workers: max concurrent background fetches.
+        - max_prefetched: max prefetched results held at once; oldest are dropped first.
+        - page_store: optional compressed cache of search results, kept across episodes (may be shared).
+        - cassette: optional Cassette to record search results to, or replay them from without network.
+        - search_timeout: per-request HTTP timeout and, unless search_caller is given, the deadline
+          of a whole search; a search that misses it is reported to the agent as an observation.
+        - search_caller: optional deadline / hedging policy for searches (may be shared across envs).
+        - owns_cassette: close() also closes the cassette; False for a cassette shared with another env.
+        """
         super().__init__()
         self.page: Optional[str] = None
         self.obs: Optional[str] = None
@@ -28,6 +64,24 @@ class WikiEnv(gym.Env):
         self.observation_space = self.action_space = textSpace()
         self.search_time: float = 0.0
         self.num_searches: int = 0
+        self.page_store = page_store
+        self.cassette = cassette
+        self.owns_cassette = owns_cassette
+        self.search_timeout = search_timeout
+        if search_caller is None and search_timeout:
+            search_caller = HedgedCaller("search", timeout=search_timeout)
+        self.search_caller = search_caller
+        self.search_timeouts: int = 0
+        self.prefetch_k = prefetch_k
+        self.prefetch_workers = prefetch_workers
+        self.max_prefetched = max_prefetched
+        self.prefetch_issued: int = 0
+        self.prefetch_used: int = 0
+        self.prefetch_dropped: int = 0
+        self.prefetch_time: float = 0.0
+        self._prefetched: "OrderedDict[str, Future]" = OrderedDict()
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
 
     def _get_obs(self) -> Optional[str]:
         return self.obs
@@ -52,6 +106,18 @@ class WikiEnv(gym.Env):
         info = self._get_info()
         return (observation, info) if return_info else observation
 
+    # Per-episode state captured by snapshot(); page text and lookup lists are never mutated
+    # in place, so snapshots share them by reference. The wrappers (wrappers.SnapshotWrapper)
+    # add their own state on top.
+    state_attrs = ("page", "obs", "lookup_keyword", "lookup_list", "lookup_cnt", "steps", "answer")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.state_attrs}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        for k, v in state.items():
+            setattr(self, k, v)
+
     def construct_lookup_list(self, keyword: str) -> List[str]:
         if self.page is None:
             return []
@@ -73,31 +139,118 @@ class WikiEnv(gym.Env):
         sentences = [s.strip() + "." for s in sentences if s.strip()]
         return " ".join(sentences[:5])
 
-    def search_step(self, entity: str) -> None:
-        entity_ = entity.replace(" ", "+")
-        search_url = f"https://en.wikipedia.org/w/index.php?search={entity_}"
-        old_time = time.time()
-        response_text = requests.get(search_url).text
-        self.search_time += time.time() - old_time
-        self.num_searches += 1
+    @staticmethod
+    @profiled("html_parse")
+    def parse_search_response(response_text: str) -> SearchResult:
+        from bs4 import BeautifulSoup  # imported on first parse: replayed / cached runs never need it
+
         soup = BeautifulSoup(response_text, features="html.parser")
         result_divs = soup.find_all("div", {"class": "mw-search-result-heading"})
         if result_divs:
-            self.result_titles = [clean_str(div.get_text().strip()) for div in result_divs]
+            return "similar", [clean_str(div.get_text().strip()) for div in result_divs]
+        paragraphs = [p.get_text().strip() for p in soup.find_all("p") + soup.find_all("ul")]
+        page = ""
+        for p in paragraphs:
+            if len(p.split(" ")) > 2:
+                page += clean_str(p)
+                if not p.endswith("\n"):
+                    page += "\n"
+        if any("may refer to:" in p for p in paragraphs):
+            return "ambiguous", page
+        return "page", page
+
+    def fetch_search(self, entity: str) -> str:
+        import requests
+
+        try:
+            with span("search_http"):
+                return requests.get(self.search_url.format(entity.replace(" ", "+")), timeout=self.search_timeout).text
+        except requests.Timeout as e:
+            raise DeadlineExceeded(f"search for {entity!r} timed out after {self.search_timeout:g}s") from e
+
+    def resolve_search(self, entity: str) -> Tuple[SearchResult, int]:
+        """Fetch and parse entity, following disambiguation pages iteratively. Returns (result, n_requests)."""
+        query = entity
+        for hop in range(self.max_disambiguation_hops + 1):
+            result = self.parse_search_response(self.fetch_search(query))
+            if result[0] != "ambiguous":
+                break
+            query = "[" + query + "]"
+        return result, hop + 1
+
+    def _prefetch_task(self, entity: str) -> SearchResult:
+        old_time = time.time()
+        result, _ = self.resolve_search(entity)
+        with self._lock:
+            self.prefetch_time += time.time() - old_time
+        if self.page_store is not None:
+            self.page_store.put(entity, result)
+        return result
+
+    def prefetch(self, entities: List[str]) -> None:
+        """Schedule background searches for entities not already prefetched."""
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(max_workers=max(1, self.prefetch_workers))
+        with self._lock:
+            for entity in entities:
+                if entity in self._prefetched or (self.page_store is not None and entity in self.page_store):
+                    continue
+                self._prefetched[entity] = self._prefetch_pool.submit(self._prefetch_task, entity)
+                self.prefetch_issued += 1
+                while len(self._prefetched) > self.max_prefetched:
+                    _, dropped = self._prefetched.popitem(last=False)
+                    # a fetch already running cannot be cancelled; it still finishes into the page store
+                    if dropped.cancel():
+                        self.prefetch_dropped += 1
+
+    def _take_prefetched(self, entity: str) -> Optional[SearchResult]:
+        with self._lock:
+            future = self._prefetched.pop(entity, None)
+        if future is None or future.cancelled():
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            return None
+        with self._lock:
+            self.prefetch_used += 1
+        return result
+
+    def search_step(self, entity: str) -> None:
+        old_time = time.time()
+        result = self.cassette.get(entity) if self.cassette is not None and self.cassette.replaying else None
+        if result is None:
+            result = self._take_prefetched(entity)
+        if result is None and self.page_store is not None:
+            result = self.page_store.get(entity)
+        if result is None:
+            try:
+                if self.search_caller is not None:
+                    result, n_requests = self.search_caller(self.resolve_search, entity)
+                else:
+                    result, n_requests = self.resolve_search(entity)
+            except DeadlineExceeded:
+                # Nothing is cached or recorded; the agent may simply search again.
+                self.search_timeouts += 1
+                self.search_time += time.time() - old_time
+                self.obs = f"Search for {entity} timed out. Try again or search something else."
+                return
+            self.num_searches += n_requests
+            if self.page_store is not None:
+                self.page_store.put(entity, result)
+        if self.cassette is not None:
+            self.cassette.record(entity, result)
+        self.search_time += time.time() - old_time
+        kind, payload = result
+        if kind == "similar":
+            self.result_titles = payload
             self.obs = f"Could not find {entity}. Similar: {self.result_titles[:5]}."
+            if self.prefetch_k > 0 and not (self.cassette is not None and self.cassette.replaying):
+                self.prefetch(self.result_titles[: self.prefetch_k])
         else:
-            page = [p.get_text().strip() for p in soup.find_all("p") + soup.find_all("ul")]
-            if any("may refer to:" in p for p in page):
-                self.search_step("[" + entity + "]")
-            else:
-                self.page = ""
-                for p in page:
-                    if len(p.split(" ")) > 2:
-                        self.page += clean_str(p)
-                        if not p.endswith("\n"):
-                            self.page += "\n"
-                self.obs = self.get_page_obs(self.page)
-                self.lookup_keyword = self.lookup_list = self.lookup_cnt = None
+            self.page = payload
+            self.obs = self.get_page_obs(self.page)
+            self.lookup_keyword = self.lookup_list = self.lookup_cnt = None
 
     def step(self, action: Any) -> Tuple[str, float, bool, Dict[str, Any]]:
         reward = 0.0
@@ -134,4 +287,28 @@ class WikiEnv(gym.Env):
 
     def get_time_info(self) -> Dict[str, Any]:
         speed = self.search_time / self.num_searches if self.num_searches else 0.0
-        return {"call_speed": speed, "call_time": self.search_time, "num_calls": self.num_searches}
+        info = {
+            "call_speed": speed,
+            "call_time": self.search_time,
+            "num_calls": self.num_searches,
+            "prefetch_issued": self.prefetch_issued,
+            "prefetch_used": self.prefetch_used,
+            "prefetch_dropped": self.prefetch_dropped,
+            "prefetch_hit_rate": self.prefetch_used / self.prefetch_issued if self.prefetch_issued else 0.0,
+            "prefetch_time": self.prefetch_time,
+            "search_timeouts": self.search_timeouts,
+        }
+        if self.page_store is not None:
+            info["page_store"] = self.page_store.stats()
+        if self.cassette is not None:
+            info["cassette"] = self.cassette.stats()
+        return info
+
+    def close(self) -> None:
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+            self._prefetch_pool = None
+        with self._lock:
+            self._prefetched.clear()
+        if self.cassette is not None and self.owns_cassette:
+            self.cassette.close()
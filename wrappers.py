@@ -1,13 +1,15 @@
-import json
 import os
-import re
-import string
-from collections import Counter
-from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
 
 import gym
 import numpy as np
 
+from dataset_index import load_dataset
+from scoring import f1_normalized, f1_score, normalize_answer
+from trajectory_tokenizer import format_step_token
+from trajlog import TrajectoryLogWriter
+
 DATA_DIR = "data"
 HOTPOTQA_SPLIT_FILE = {
   "train": "hotpot_train_v1.1_simplified.json",
@@ -22,68 +24,99 @@ FEVER_SPLIT_FILE = {
 
 
 class HistoryWrapper(gym.ObservationWrapper):
-    def __init__(self, env: gym.Env, obs_format: str, prompt: Optional[str] = None) -> None:
+    """
+    obs_format="history" renders "Action i / Observation i" for the whole episode.
+    Rendering is incremental: each call formats only steps not seen yet and appends them to
+    cached segments. With max_raw_steps set, steps older than the last max_raw_steps are
+    compressed into trajectory_tokenizer step tokens in the same pass.
+    """
+
+    def __init__(
+        self,
+        env: gym.Env,
+        obs_format: str,
+        prompt: Optional[str] = None,
+        max_raw_steps: Optional[int] = None,
+        max_thought: int = 60,
+        max_obs: int = 100,
+    ) -> None:
         super().__init__(env)
         assert obs_format in ["obs", "history"]
         if obs_format == "history":
             assert hasattr(self.env, "traj")
         self.obs_format = obs_format
         self.prompt = prompt if prompt is not None else ""
+        self.max_raw_steps = max_raw_steps
+        self.max_thought = max_thought
+        self.max_obs = max_obs
+        self._observations: Optional[List[Any]] = None
+        self._n_rendered = 0
+        self._tokens = ""
+        self._raw: Deque[Tuple[int, Any, Any, str]] = deque()
+
+    def _start(self, observations: List[Any]) -> None:
+        self._observations = observations
+        self._n_rendered = 0
+        self._tokens = ""
+        self._raw.clear()
+
+    def _append_step(self, i: int, a: Any, o: Any) -> None:
+        self._raw.append((i, a, o, f"Action {i}: {a}\nObservation {i}: {o}\n\n"))
+        if self.max_raw_steps is not None:
+            while len(self._raw) > self.max_raw_steps:
+                k, old_a, old_o, _ = self._raw.popleft()
+                self._tokens += format_step_token(
+                    k, "", str(old_a), str(old_o), max_thought=self.max_thought, max_obs=self.max_obs
+                ) + "\n"
 
     def observation(self, obs: Any) -> str:
         if self.obs_format == "obs":
             return obs
-        observation = self.env.traj["observations"][0] + "\n"
-        for i, (o, a) in enumerate(zip(self.env.traj["observations"][1:], self.env.traj["actions"]), 1):
-            observation += f"Action {i}: {a}\nObservation {i}: {o}\n\n"
-        return self.prompt + observation
-
+        observations, actions = self.env.traj["observations"], self.env.traj["actions"]
+        if observations is not self._observations or len(actions) < self._n_rendered:
+            self._start(observations)
+        for i in range(self._n_rendered, len(actions)):
+            self._append_step(i + 1, actions[i], observations[i + 1])
+        self._n_rendered = len(actions)
+        tokens = self._tokens + "\n" if self._tokens else ""
+        return self.prompt + observations[0] + "\n" + tokens + "".join(seg for _, _, _, seg in self._raw)
 
-def normalize_answer(s: str) -> str:
-    def remove_articles(text: str) -> str:
-        return re.sub(r"\b(a|an|the)\b", " ", text)
 
-    def white_space_fix(text: str) -> str:
-        return " ".join(text.split())
+def _copy_state(value: Any) -> Any:
+    """Copy a per-episode value just deep enough that later in-place appends don't reach it."""
+    if isinstance(value, dict):
+        return {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+    return value
 
-    def remove_punc(text: str) -> str:
-        exclude = set(string.punctuation)
-        return "".join(ch for ch in text if ch not in exclude)
 
-    def lower(text: str) -> str:
-        return text.lower()
+class SnapshotWrapper(gym.Wrapper):
+    """
+    Wrapper with cheap snapshot() / restore(): its own per-episode state_attrs on top of the
+    inner env's snapshot (down to WikiEnv). Pages, lookup lists and observation strings are
+    shared by reference and only the lists a wrapper appends to are copied, so forking,
+    backtracking or tree search never refetch a page. A snapshot can be restored many times.
+    """
 
-    return white_space_fix(remove_articles(remove_punc(lower(s))))
+    state_attrs: Tuple[str, ...] = ()
 
+    def snapshot(self) -> Dict[str, Any]:
+        state = {k: _copy_state(getattr(self, k)) for k in self.state_attrs}
+        state["env"] = self.env.snapshot()
+        return state
 
-def f1_score(prediction: str, ground_truth: str) -> Tuple[float, float, float]:
-  normalized_prediction = normalize_answer(prediction)
-  normalized_ground_truth = normalize_answer(ground_truth)
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.env.restore(state["env"])
+        for k in self.state_attrs:
+            setattr(self, k, _copy_state(state[k]))
 
-    ZERO_METRIC = (0.0, 0.0, 0.0)
-    if normalized_prediction in ("yes", "no", "noanswer") and normalized_prediction != normalized_ground_truth:
-        return ZERO_METRIC
-    if normalized_ground_truth in ("yes", "no", "noanswer") and normalized_prediction != normalized_ground_truth:
-        return ZERO_METRIC
-    prediction_tokens = normalized_prediction.split()
-    ground_truth_tokens = normalized_ground_truth.split()
-    common = Counter(prediction_tokens) & Counter(ground_truth_tokens)
-    num_same = sum(common.values())
-    if num_same == 0:
-        return ZERO_METRIC
-    precision = 1.0 * num_same / len(prediction_tokens)
-    recall = 1.0 * num_same / len(ground_truth_tokens)
-    f1 = (2 * precision * recall) / (precision + recall)
-    return f1, precision, recall
 
+class HotPotQAWrapper(SnapshotWrapper):
+    state_attrs = ("data_idx",)
 
-class HotPotQAWrapper(gym.Wrapper):
     def __init__(self, env: gym.Env, split: str) -> None:
         super().__init__(env)
         data_file = os.path.join(DATA_DIR, HOTPOTQA_SPLIT_FILE[split])
-        with open(data_file) as f:
-            raw = json.load(f)
-        self.data: List[Tuple[str, str]] = [(d["question"], d["answer"]) for d in raw]
+        self.data: Sequence[Tuple[str, str]] = load_dataset(data_file, fields=("question", "answer"))
         self.data_idx = 0
         self.split = split
 
@@ -94,12 +127,7 @@ class HotPotQAWrapper(gym.Wrapper):
         options: Optional[Dict] = None,
         idx: Optional[int] = None,
     ) -> Any:
-        self.env.reset(seed=seed, return_info=return_info, options=options)
-        try:
-            self.env.step("")
-        except Exception:
-            pass
-        self.env.reset(seed=seed, return_info=return_info, options=options)
+        self.env.reset(seed=seed, options=options)
         self.data_idx = int(np.random.randint(len(self.data))) if idx is None else idx
         observation = f"Question: {self.data[self.data_idx][0]}"
         info = self._get_info()
@@ -125,34 +153,33 @@ class HotPotQAWrapper(gym.Wrapper):
             gt = normalize_answer(self.data[self.data_idx][1])
             pred = normalize_answer(info["answer"])
             em = pred == gt
-            f1 = f1_score(pred, gt)[0]
+            f1 = f1_normalized(pred, gt)[0]
             return {"reward": int(em), "em": em, "f1": f1}
         return {"reward": 0, "em": 0, "f1": 0.0}
 
     def step(self, action: Any) -> Tuple[Any, float, bool, Dict[str, Any]]:
         obs, _, done, info = self.env.step(action)
-        reward = self.get_reward(info)
         if done:
+            metrics = self.get_metrics(info)
+            reward = metrics["reward"]
             obs = f"Episode finished, reward = {reward}\n"
             info.update({"gt_answer": self.data[self.data_idx][1], "question_idx": self.data_idx})
-            info.update(self.get_metrics(info))
+            info.update(metrics)
+        else:
+            reward = self.get_reward(info)
         return obs, float(reward), done, info
 
     def __len__(self) -> int:
         return len(self.data)
 
 
-class FeverWrapper(gym.Wrapper):
+class FeverWrapper(SnapshotWrapper):
+    state_attrs = ("data_idx",)
+
     def __init__(self, env: gym.Env, split: str) -> None:
         super().__init__(env)
         data_path = os.path.join(DATA_DIR, FEVER_SPLIT_FILE[split])
-        with open(data_path) as f:
-            json_list = list(f)
-        data: List[Tuple[str, str]] = []
-        for line in json_list:
-            row = json.loads(line)
-            data.append((row["claim"], row["label"]))
-        self.data = data
+        self.data: Sequence[Tuple[str, str]] = load_dataset(data_path, fields=("claim", "label"))
         self.data_idx = 0
         self.split = split
 
@@ -163,12 +190,7 @@ class FeverWrapper(gym.Wrapper):
         options: Optional[Dict] = None,
         idx: Optional[int] = None,
     ) -> Any:
-        self.env.reset(seed=seed, return_info=return_info, options=options)
-        try:
-            self.env.step("")
-        except Exception:
-            pass
-        self.env.reset(seed=seed, return_info=return_info, options=options)
+        self.env.reset(seed=seed, options=options)
         self.data_idx = int(np.random.randint(len(self.data))) if idx is None else idx
         observation = f"Claim: {self.data[self.data_idx][0]}"
         info = self._get_info()
@@ -202,15 +224,52 @@ class FeverWrapper(gym.Wrapper):
         return len(self.data)
 
 
-class LoggingWrapper(gym.Wrapper):
-    def __init__(self, env: gym.Env, folder: str = "trajs", file_id: Optional[int] = None) -> None:
+class LoggingWrapper(SnapshotWrapper):
+    """
+    Streams one JSON record per episode (observations, actions, final info) to
+    append-only JSONL segments via TrajectoryLogWriter; nothing accumulates in memory.
+    Read the logs back with trajlog.iter_records(folder). With folder=None nothing is
+    written and the latest record is only kept in last_record (e.g. for parallel workers).
+    With record_on_done=False a finished episode is recorded by the next update_record()
+    / reset() / write() instead, so the caller can add fields (e.g. the prompt) to traj first.
+    restore() rewinds traj too, so a restored branch is recorded on its own when it finishes.
+    """
+
+    state_attrs = ("traj", "_recorded")
+
+    def __init__(
+        self,
+        env: gym.Env,
+        folder: Optional[str] = "trajs",
+        file_id: Optional[int] = None,
+        compress: bool = False,
+        flush_every: int = 10,
+        flush_interval: float = 30.0,
+        max_bytes: Optional[int] = None,
+        record_on_done: bool = True,
+    ) -> None:
         super().__init__(env)
-        self.trajs: List[Dict[str, Any]] = []
         self.traj: Dict[str, Any] = {"observations": [], "actions": []}
+        self.record_on_done = record_on_done
         self.folder = folder
         self.file_id = int(np.random.randint(0, 10000000)) if file_id is None else file_id
-        self.file_path = os.path.join(self.folder, f"{self.file_id}.json")
-        os.makedirs(self.folder, exist_ok=True)
+        self.writer: Optional[TrajectoryLogWriter] = None
+        if folder is not None:
+            self.writer = TrajectoryLogWriter(
+                folder,
+                self.file_id,
+                compress=compress,
+                flush_every=flush_every,
+                flush_interval=flush_interval,
+                max_bytes=max_bytes,
+            )
+        self.last_record: Optional[Dict[str, Any]] = None
+        self.n_episodes = 0
+        self._recorded = False
+
+    @property
+    def file_path(self) -> Optional[str]:
+        return self.writer.path if self.writer is not None else None
 
     def __len__(self) -> int:
         return len(self.env.data)
@@ -222,9 +281,12 @@ class LoggingWrapper(gym.Wrapper):
         options: Optional[Dict] = None,
         idx: Optional[int] = None,
     ) -> Any:
+        self.update_record()
+        self.last_record = None
         output = self.env.reset(seed=seed, return_info=return_info, options=options, idx=idx)
         observation = output[0] if return_info else output
         self.traj = {"observations": [observation], "actions": []}
+        self._recorded = False
         return output
 
     def step(self, action: Any) -> Tuple[Any, float, bool, Dict[str, Any]]:
@@ -233,18 +295,32 @@ class LoggingWrapper(gym.Wrapper):
         self.traj["actions"].append(action)
         if done:
             self.traj.update(info)
+            if self.record_on_done:
+                self.update_record()
         return obs, reward, done, info
 
     def update_record(self) -> None:
-        if self.traj.get("observations"):
-            self.trajs.append(self.traj)
-            self.traj = {"observations": [], "actions": []}
+        """Write the current episode (finished or not) as one record, once. self.traj is kept until reset."""
+        if self.traj.get("actions") and not self._recorded:
+            self.last_record = dict(self.traj)
+            self.log_record(self.last_record)
+            self._recorded = True
+
+    def log_record(self, record: Dict[str, Any]) -> None:
+        """Write an episode record (from this env or a worker env) under the next episode number."""
+        if self.writer is not None:
+            self.writer.write({"episode": self.n_episodes, **record})
+        self.n_episodes += 1
 
     def write(self) -> None:
         self.update_record()
-        with open(self.file_path, "w") as f:
-            json.dump(self.trajs, f)
-        print(f"Saved trajs to {self.file_path}")
+        if self.writer is not None:
+            self.writer.flush()
 
     def close(self) -> None:
         self.write()
+        if self.writer is not None:
+            self.writer.close()
+            if self.writer.paths:
+                print(f"Saved {self.n_episodes} trajs to {', '.join(self.writer.paths)}")
+        super().close()